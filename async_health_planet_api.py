@@ -0,0 +1,209 @@
+import asyncio
+import random
+from datetime import datetime, timedelta
+from urllib.parse import urlencode
+
+import aiohttp
+
+from health_planet_api import (
+    AUTH_URL, DEFAULT_BACKOFF, DEFAULT_MAX_RETRIES, DEFAULT_RATE_LIMIT, DEFAULT_TAGS,
+    INNERSCAN_URL, MAX_WINDOW_DAYS, REDIRECT_URI, RETRY_STATUS_CODES, TOKEN_URL,
+    get_rate_limiter, load_credentials, merge_innerscan_data, split_date_range, to_datetime,
+)
+from innerscan_tags import format_tags
+
+# 全アカウント合計の同時リクエスト数
+DEFAULT_CONCURRENCY = 16
+DEFAULT_POOL_SIZE = 32
+DEFAULT_TIMEOUT = 30  # 秒
+
+
+class AsyncHealthPlanetAPI:
+    """複数アカウントのデータを並行して取得する非同期クライアント
+
+    接続プールは全アカウントで共有し、同時リクエスト数は max_concurrency で
+    全体として制限する。アクセストークンはアカウントごとに self.tokens に保持する。
+
+        async with AsyncHealthPlanetAPI() as api:
+            api.tokens = {'alice': token_a, 'bob': token_b}
+            results = await api.fetch_accounts(from_date, to_date)
+    """
+
+    def __init__(self, client_id=None, client_secret=None, max_concurrency=DEFAULT_CONCURRENCY,
+                 pool_size=DEFAULT_POOL_SIZE, timeout=DEFAULT_TIMEOUT,
+                 max_retries=DEFAULT_MAX_RETRIES, backoff=DEFAULT_BACKOFF,
+                 rate_limit=DEFAULT_RATE_LIMIT, tags=None):
+        if client_id and client_secret:
+            self.client_id = client_id
+            self.client_secret = client_secret
+        else:
+            # 保存済みトークンでの取得のみなら認証情報は不要
+            try:
+                self.client_id, self.client_secret = load_credentials()
+            except ValueError:
+                print("認証情報が見つかりません（トークンの取得はできません）")
+                self.client_id = self.client_secret = None
+
+        # アカウント名 → アクセストークン
+        self.tokens = {}
+        self.tags = format_tags(tags) if tags else DEFAULT_TAGS
+        self.date_mode = '1'
+
+        self.auth_url = AUTH_URL
+        self.token_url = TOKEN_URL
+        self.innerscan_url = INNERSCAN_URL
+        self.redirect_uri = REDIRECT_URI
+
+        self.max_concurrency = max_concurrency
+        self.pool_size = pool_size
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.rate_limit = rate_limit
+
+        self.session = None
+        self.semaphore = None
+
+    async def __aenter__(self):
+        await self.open()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
+
+    async def open(self):
+        """共有の接続プールを作成"""
+        if self.session is None:
+            connector = aiohttp.TCPConnector(limit=self.pool_size)
+            self.session = aiohttp.ClientSession(
+                connector=connector, timeout=aiohttp.ClientTimeout(total=self.timeout))
+            self.semaphore = asyncio.Semaphore(self.max_concurrency)
+
+    async def close(self):
+        if self.session is not None:
+            await self.session.close()
+            self.session = None
+
+    def get_authorization_url(self):
+        """認証URLを生成"""
+        params = {
+            'client_id': self.client_id,
+            'redirect_uri': self.redirect_uri,
+            'scope': 'innerscan',
+            'response_type': 'code'
+        }
+        return f"{self.auth_url}?{urlencode(params)}"
+
+    async def get_access_token(self, code, account):
+        """認証コードからアクセストークンを取得し、アカウントに登録"""
+        data = {
+            'client_id': self.client_id,
+            'client_secret': self.client_secret,
+            'redirect_uri': self.redirect_uri,
+            'code': code,
+            'grant_type': 'authorization_code'
+        }
+
+        try:
+            # 認証コードは1回しか使えないため、失敗しても再試行しない
+            token_data = await self._request('POST', self.token_url, account, retry=False, data=data)
+            self.tokens[account] = token_data['access_token']
+            return self.tokens[account]
+        except (aiohttp.ClientError, asyncio.TimeoutError, KeyError, ValueError) as e:
+            # ValueError: 200でもJSONでない本文（メンテナンス画面など）が返った場合
+            print(f"[{account}] アクセストークンの取得に失敗しました: {e}")
+            return None
+
+    async def get_body_composition_data(self, account, days_back=7, from_date=None, to_date=None):
+        """体組成データを取得（from_date/to_date指定時はその期間）"""
+        if from_date is not None or to_date is not None:
+            to_dt = to_datetime(to_date, end_of_day=True) if to_date else datetime.now()
+            from_dt = to_datetime(from_date) if from_date else to_dt - timedelta(days=days_back)
+        else:
+            to_dt = datetime.now()
+            from_dt = to_dt - timedelta(days=days_back)
+
+        if to_dt - from_dt > timedelta(days=MAX_WINDOW_DAYS):
+            return await self.get_body_composition_data_range(account, from_dt, to_dt)
+
+        return await self._fetch_window(account, from_dt, to_dt)
+
+    async def get_body_composition_data_range(self, account, from_date, to_date):
+        """長期間のデータをウィンドウに分割して並行取得し、結合して返す"""
+        from_dt = to_datetime(from_date)
+        to_dt = to_datetime(to_date, end_of_day=True)
+        if from_dt > to_dt:
+            print("エラー: 開始日が終了日より後になっています")
+            return None
+
+        windows = split_date_range(from_dt, to_dt)
+        results = await asyncio.gather(*(self._fetch_window(account, *w) for w in windows))
+
+        if any(result is None for result in results):
+            print(f"[{account}] 一部の期間のデータ取得に失敗しました")
+            return None
+
+        return merge_innerscan_data(results)
+
+    async def fetch_accounts(self, from_date, to_date, accounts=None):
+        """複数アカウントの期間データを並行取得し、{アカウント: データ} を返す"""
+        accounts = list(accounts or self.tokens)
+        results = await asyncio.gather(*(
+            self.get_body_composition_data_range(account, from_date, to_date)
+            for account in accounts
+        ))
+        return dict(zip(accounts, results))
+
+    async def _fetch_window(self, account, from_date, to_date):
+        """1ウィンドウ分の体組成データを取得"""
+        token = self.tokens.get(account)
+        if not token:
+            print(f"[{account}] エラー: アクセストークンが設定されていません")
+            return None
+
+        params = {
+            'access_token': token,
+            'date': self.date_mode,
+            'from': from_date.strftime("%Y%m%d%H%M%S"),
+            'to': to_date.strftime("%Y%m%d%H%M%S"),
+            'tag': self.tags
+        }
+
+        try:
+            return await self._request('GET', self.innerscan_url, account, params=params)
+        except (aiohttp.ClientError, asyncio.TimeoutError, ValueError) as e:
+            # ValueError: 200でもJSONでない本文（メンテナンス画面など）が返った場合
+            print(f"[{account}] データ取得に失敗しました: {e}")
+            return None
+
+    async def _request(self, method, url, account, retry=True, **kwargs):
+        """レート制限・リトライ付きでリクエストを送信し、JSONを返す（retry=Falseなら再試行しない）"""
+        max_retries = self.max_retries if retry else 0
+        await self.open()
+        rate_limiter = get_rate_limiter(account, self.rate_limit) if self.rate_limit else None
+        retries = 0
+
+        while True:
+            if rate_limiter:
+                wait = rate_limiter.reserve()
+                if wait:
+                    await asyncio.sleep(wait)
+
+            retry_after = None
+            try:
+                async with self.semaphore:
+                    async with self.session.request(method, url, **kwargs) as response:
+                        if response.status not in RETRY_STATUS_CODES or retries >= max_retries:
+                            response.raise_for_status()
+                            return await response.json(content_type=None)
+                        retry_after = response.headers.get('Retry-After', '')
+            except (aiohttp.ClientConnectionError, asyncio.TimeoutError):
+                if retries >= max_retries:
+                    raise
+
+            # 指数バックオフ（ジッター付き）。429の場合はRetry-Afterを優先
+            delay = self.backoff * (2 ** retries) * random.uniform(0.5, 1.5)
+            if retry_after and retry_after.isdigit():
+                delay = max(delay, int(retry_after))
+            retries += 1
+            await asyncio.sleep(delay)
@@ -0,0 +1,212 @@
+"""複数アカウントのデータを一括で同期・保存するコマンドラインツール
+
+使い方:
+    python batch_runner.py manifest.json --report report.json
+
+manifest.json の例:
+    {
+        "days_back": 30,
+        "output_dir": "data/batch",
+        "formats": ["csv", "xlsx"],
+        "tags": ["6021", "6022", "6023"],
+        "accounts": [
+            {"name": "alice", "access_token": "..."},
+            {"name": "bob", "access_token": "..."}
+        ]
+    }
+
+期間は "days_back" の代わりに "from_date" / "to_date"（YYYY-MM-DD）でも指定できる。
+"tags" を省略した場合は体重・体脂肪率のみ取得する。
+"access_token" を省略したアカウントは保存済みのトークン（TokenStore）を使い、
+有効期限が近ければ更新してから取得する。
+"""
+import argparse
+import asyncio
+import contextlib
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta
+
+from async_health_planet_api import DEFAULT_CONCURRENCY, AsyncHealthPlanetAPI
+from data_exporter import HealthDataExporter
+from health_dataset import HealthDataset
+from health_planet_api import HealthPlanetAPI
+from token_store import TokenStore
+
+DEFAULT_DAYS_BACK = 30
+DEFAULT_FORMATS = ['csv']
+
+
+def load_manifest(path):
+    """マニフェストを読み込み、期間を解決して返す"""
+    with open(path, 'r', encoding='utf-8') as f:
+        manifest = json.load(f)
+
+    if not manifest.get('accounts'):
+        raise ValueError("マニフェストにアカウントがありません")
+
+    if not manifest.get('from_date'):
+        days_back = int(manifest.get('days_back', DEFAULT_DAYS_BACK))
+        manifest['from_date'] = (datetime.now() - timedelta(days=days_back)).strftime("%Y-%m-%d")
+    if not manifest.get('to_date'):
+        manifest['to_date'] = datetime.now().strftime("%Y-%m-%d")
+
+    return manifest
+
+
+def resolve_tokens(manifest):
+    """アカウントごとのアクセストークンを返す（未指定なら保存済みトークンを使用）
+
+    (トークン, エラー) を返す。トークンを用意できなかったアカウントは
+    エラーに理由を記録し、ほかのアカウントの処理は続ける。
+    """
+    tokens = {}
+    errors = {}
+    token_store = None
+    for account in manifest['accounts']:
+        name = account['name']
+        if account.get('access_token'):
+            tokens[name] = account['access_token']
+            continue
+
+        try:
+            if token_store is None:
+                token_store = TokenStore()
+            api = HealthPlanetAPI(manifest.get('client_id'), manifest.get('client_secret'),
+                                  account=name, token_store=token_store)
+            token = api.load_saved_token()
+        except Exception as e:
+            errors[name] = f"トークンを用意できませんでした: {e}"
+            continue
+        if not token:
+            errors[name] = "保存済みのトークンがありません"
+            continue
+        tokens[name] = token
+    return tokens, errors
+
+
+def export_account(name, raw_data, output_dir, formats):
+    """1アカウント分の解析と保存（プロセスプールで実行）"""
+    start = time.perf_counter()
+    dataset = HealthDataset.from_raw(raw_data)
+    if dataset is None:
+        raise ValueError("データの形式が正しくありません")
+
+    exporter = HealthDataExporter()
+    exporter.data_dir = os.path.join(output_dir, name)
+    os.makedirs(exporter.data_dir, exist_ok=True)
+
+    with contextlib.redirect_stdout(sys.stderr):
+        results = exporter.export(dataset, formats, account=name)
+
+    files = []
+    for fmt in formats:
+        if results is None or results[fmt]['path'] is None:
+            raise RuntimeError(f"{fmt}形式での保存に失敗しました")
+        files.append(results[fmt]['path'])
+
+    return {'rows': len(dataset), 'files': files, 'export_seconds': time.perf_counter() - start}
+
+
+async def fetch_all(api, accounts, from_date, to_date):
+    """全アカウントを並行取得し、{アカウント: (データ, 所要秒数, エラー)} を返す
+
+    1アカウントで予期しない例外が起きても、ほかのアカウントの取得は続ける。
+    """
+    async def fetch_one(name):
+        start = time.perf_counter()
+        try:
+            data = await api.get_body_composition_data_range(name, from_date, to_date)
+            error = None if data is not None else "データ取得に失敗しました"
+        except Exception as e:
+            print(f"[{name}] データ取得に失敗しました: {e!r}")
+            data, error = None, f"データ取得に失敗しました: {e!r}"
+        return name, data, time.perf_counter() - start, error
+
+    async with api:
+        results = await asyncio.gather(*(fetch_one(account['name']) for account in accounts))
+    return {name: (data, elapsed, error) for name, data, elapsed, error in results}
+
+
+def run(manifest, workers=None, concurrency=DEFAULT_CONCURRENCY):
+    """マニフェストに従って同期・保存を行い、実行レポートを返す"""
+    started_at = datetime.now()
+    start = time.perf_counter()
+    accounts = manifest['accounts']
+    output_dir = manifest.get('output_dir', os.path.join('data', 'batch'))
+    formats = manifest.get('formats', DEFAULT_FORMATS)
+
+    api = AsyncHealthPlanetAPI(manifest.get('client_id'), manifest.get('client_secret'),
+                               max_concurrency=concurrency, tags=manifest.get('tags'))
+    api.tokens, token_errors = resolve_tokens(manifest)
+
+    report = {account['name']: {'name': account['name'], 'status': 'ok'} for account in accounts}
+    for name, error in token_errors.items():
+        report[name].update(status='error', error=error)
+
+    ready = [account for account in accounts if account['name'] not in token_errors]
+    try:
+        fetched = asyncio.run(fetch_all(api, ready, manifest['from_date'], manifest['to_date']))
+    except Exception as e:
+        # 接続プールの作成などアカウント共通の失敗も、レポートに残す
+        print(f"データ取得に失敗しました: {e!r}")
+        fetched = {account['name']: (None, 0.0, f"データ取得に失敗しました: {e!r}") for account in ready}
+
+    futures = {}
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        for name, (data, elapsed, error) in fetched.items():
+            report[name]['fetch_seconds'] = round(elapsed, 3)
+            if data is None:
+                report[name].update(status='error', error=error)
+                continue
+            futures[name] = executor.submit(export_account, name, data, output_dir, formats)
+
+        for name, future in futures.items():
+            try:
+                result = future.result()
+                result['export_seconds'] = round(result['export_seconds'], 3)
+                report[name].update(result)
+            except Exception as e:
+                report[name].update(status='error', error=str(e))
+
+    results = list(report.values())
+    return {
+        'started_at': started_at.isoformat(timespec='seconds'),
+        'elapsed_seconds': round(time.perf_counter() - start, 3),
+        'from_date': manifest['from_date'],
+        'to_date': manifest['to_date'],
+        'succeeded': sum(1 for r in results if r['status'] == 'ok'),
+        'failed': sum(1 for r in results if r['status'] != 'ok'),
+        'accounts': results,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Health Planetのデータを複数アカウント分一括で同期・保存します")
+    parser.add_argument('manifest', help="アカウントとアクセストークンを記載したJSONファイル")
+    parser.add_argument('--report', help="実行レポートの出力先（省略時は標準出力）")
+    parser.add_argument('--workers', type=int, default=None, help="解析・保存に使うプロセス数")
+    parser.add_argument('--concurrency', type=int, default=DEFAULT_CONCURRENCY,
+                        help="全アカウント合計の同時リクエスト数")
+    args = parser.parse_args(argv)
+
+    manifest = load_manifest(args.manifest)
+    # ログは標準エラーへ出し、標準出力はレポート専用にする
+    with contextlib.redirect_stdout(sys.stderr):
+        report = run(manifest, workers=args.workers, concurrency=args.concurrency)
+
+    output = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.report:
+        with open(args.report, 'w', encoding='utf-8') as f:
+            f.write(output)
+    else:
+        print(output)
+
+    return 1 if report['failed'] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
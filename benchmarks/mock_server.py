@@ -0,0 +1,135 @@
+"""Health Planet の OAuth・innerscan エンドポイントを模したローカルHTTPサーバー
+
+レイテンシとエラー率（503）を指定でき、innerscan は事前に生成した
+レスポンスから from/to/tag で絞り込んで返す。
+"""
+import bisect
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlencode, urlparse
+
+ACCESS_TOKEN = "bench-access-token"
+REFRESH_TOKEN = "bench-refresh-token"
+
+
+class MockHealthPlanet(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, payload, latency=0.0, jitter=0.0, error_rate=0.0, port=0, seed=0):
+        super().__init__(("127.0.0.1", port), MockHandler)
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.rng = random.Random(seed)
+        self.rng_lock = threading.Lock()
+        self.stats_lock = threading.Lock()
+        self.requests = 0
+        self.errors = 0
+
+        self.user_info = {key: payload.get(key) for key in ('birth_date', 'height', 'sex')}
+        self.items = sorted(payload['data'], key=lambda item: item['date'])
+        self.dates = [item['date'] for item in self.items]
+        self.thread = None
+
+    @property
+    def base_url(self):
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+    def start(self):
+        self.thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def configure_api(self, api):
+        """APIクライアントの接続先をこのサーバーに向ける"""
+        api.auth_url = f"{self.base_url}/oauth/auth"
+        api.token_url = f"{self.base_url}/oauth/token"
+        api.innerscan_url = f"{self.base_url}/status/innerscan.json"
+
+    def next_delay(self):
+        """レイテンシと、エラーを返すかどうかを決める"""
+        with self.rng_lock:
+            delay = max(0.0, self.latency + self.rng.uniform(-self.jitter, self.jitter))
+            failed = self.rng.random() < self.error_rate
+        with self.stats_lock:
+            self.requests += 1
+            self.errors += failed
+        return delay, failed
+
+    def query(self, from_str, to_str, tags):
+        """期間（YYYYMMDDHHMMSS）とタグで絞り込んだ測定"""
+        start = bisect.bisect_left(self.dates, from_str[:12])
+        end = bisect.bisect_right(self.dates, to_str[:12])
+        tags = set(tags.split(',')) if tags else {'6021', '6022'}
+        return [item for item in self.items[start:end] if item['tag'] in tags]
+
+
+class MockHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        self.handle_request(parse_qs(urlparse(self.path).query))
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        body = self.rfile.read(length).decode('utf-8')
+        params = parse_qs(urlparse(self.path).query)
+        params.update(parse_qs(body))
+        self.handle_request(params)
+
+    def handle_request(self, params):
+        params = {key: values[0] for key, values in params.items()}
+        path = urlparse(self.path).path
+
+        delay, failed = self.server.next_delay()
+        if delay:
+            time.sleep(delay)
+        if failed:
+            self.send_json({'error': 'service unavailable'}, status=503)
+            return
+
+        if path == "/oauth/auth":
+            query = urlencode({'code': 'bench-code'})
+            self.send_response(302)
+            self.send_header('Location', f"{params.get('redirect_uri', '')}?{query}")
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+        elif path == "/oauth/token":
+            self.send_json({
+                'access_token': ACCESS_TOKEN,
+                'refresh_token': REFRESH_TOKEN,
+                'expires_in': 30 * 24 * 3600,
+            })
+        elif path == "/status/innerscan.json":
+            if params.get('access_token') != ACCESS_TOKEN:
+                self.send_json({'error': 'invalid token'}, status=401)
+                return
+            data = self.server.query(params.get('from', ''), params.get('to', '99999999999999'),
+                                     params.get('tag'))
+            self.send_json(dict(self.server.user_info, data=data))
+        else:
+            self.send_json({'error': 'not found'}, status=404)
+
+    def send_json(self, body, status=200):
+        content = json.dumps(body).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
@@ -0,0 +1,66 @@
+"""ベンチマーク用の innerscan.json レスポンスを生成する"""
+import random
+from datetime import datetime, timedelta
+
+from innerscan_tags import ALL_TAGS
+
+# 機器ごとの型番（体組成計の実機の型番と同じ形式）
+DEFAULT_MODELS = ('01000144', '01000117', '00000000')
+
+# タグごとの初期値・1日あたりの変動幅・小数点以下の桁数
+TAG_PROFILES = {
+    '6021': (68.0, 0.15, 2),   # 体重
+    '6022': (24.0, 0.2, 1),    # 体脂肪率
+    '6023': (48.0, 0.1, 2),    # 筋肉量
+    '6024': (0.0, 0.3, 0),     # 筋肉スコア
+    '6025': (9.0, 0.1, 1),     # 内臓脂肪レベル2
+    '6026': (9.0, 0.1, 0),     # 内臓脂肪レベル
+    '6027': (1500.0, 5.0, 0),  # 基礎代謝量
+    '6028': (40.0, 0.2, 0),    # 体内年齢
+    '6029': (2.8, 0.01, 1),    # 推定骨量
+}
+
+
+def generate_payload(years=3, readings_per_day=2, tags=ALL_TAGS, models=DEFAULT_MODELS,
+                     end=None, skip_rate=0.1, seed=0):
+    """数年分の測定を含むAPIレスポンスを生成
+
+    1日に readings_per_day 回（朝・夜など）測定し、機器は測定ごとに
+    models から選ぶ。skip_rate の割合で測定しない日を作る。
+    測定値は前日からのランダムウォークにする。
+    """
+    rng = random.Random(seed)
+    end = end or datetime(2025, 1, 1)
+    start = end - timedelta(days=int(365 * years))
+    levels = {tag: TAG_PROFILES[tag][0] for tag in tags}
+
+    data = []
+    day = start
+    while day < end:
+        for tag in tags:
+            base, step, _ = TAG_PROFILES[tag]
+            levels[tag] += rng.gauss(0, step)
+            # 長期間でも現実的な範囲に収める
+            levels[tag] += (base - levels[tag]) * 0.01
+
+        if rng.random() >= skip_rate:
+            for reading in range(readings_per_day):
+                hour = 6 + reading * (16 // max(1, readings_per_day)) + rng.randint(0, 1)
+                stamp = day.replace(hour=min(hour, 23), minute=rng.randint(0, 59))
+                date = stamp.strftime("%Y%m%d%H%M")
+                model = models[rng.randrange(len(models))]
+                for tag in tags:
+                    _, step, digits = TAG_PROFILES[tag]
+                    value = max(0.0, levels[tag] + rng.gauss(0, step / 2))
+                    keydata = f"{value:.{digits}f}" if digits else str(int(round(value)))
+                    data.append({'date': date, 'keydata': keydata, 'model': model, 'tag': tag})
+        day += timedelta(days=1)
+
+    return {'birth_date': '19850401', 'height': '170.0', 'sex': 'male', 'data': data}
+
+
+def payload_period(payload):
+    """レスポンスに含まれる測定の最初と最後の日時"""
+    dates = [item['date'] for item in payload['data']]
+    return (datetime.strptime(min(dates), "%Y%m%d%H%M"),
+            datetime.strptime(max(dates), "%Y%m%d%H%M"))
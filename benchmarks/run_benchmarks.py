@@ -0,0 +1,233 @@
+"""取得・解析・保存の各処理のベンチマーク
+
+ローカルのモックサーバーと生成したレスポンスを使うので、ネットワークや
+Health Planetのアカウントなしで実行できる。
+
+使い方（リポジトリのルートで実行）:
+    python -m benchmarks.run_benchmarks --years 5 --readings-per-day 3
+    python -m benchmarks.run_benchmarks --json results.json
+    python -m benchmarks.run_benchmarks --baseline results.json   # 遅くなった処理があれば終了コード1
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from benchmarks.mock_server import MockHealthPlanet
+from benchmarks.payloads import DEFAULT_MODELS, generate_payload, payload_period
+from data_exporter import HealthDataExporter
+from health_dataset import HealthDataset
+from health_planet_api import HealthPlanetAPI, split_date_range
+from innerscan_tags import ALL_TAGS, DEFAULT_TAGS, format_tags
+
+STAGES = ('fetch', 'parse', 'summary', 'save_csv', 'stream_csv', 'save_excel', 'export')
+# export で並行に書き出す形式（Parquetは追記になるため含めない）
+EXPORT_FORMATS = ('csv', 'xlsx', 'jsonl')
+
+
+def percentile(values, q):
+    values = sorted(values)
+    if not values:
+        return 0.0
+    index = min(len(values) - 1, max(0, int(round(q / 100 * (len(values) - 1)))))
+    return values[index]
+
+
+def measure(func, repeat):
+    """funcをrepeat回計測し、最後に1回だけメモリのピークを計測する
+
+    初回の遅延インポートを含めないよう、計測前に1回実行しておく。
+    tracemallocは処理を遅くするため、時間の計測とは別に実行する。
+    """
+    func()
+    timings = []
+    items = 0
+    for _ in range(repeat):
+        start = time.perf_counter()
+        items = func()
+        timings.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+    try:
+        func()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return timings, items, peak
+
+
+def report(name, timings, items, peak, latencies=None):
+    median = statistics.median(timings)
+    latencies = latencies or timings
+    return {
+        'stage': name,
+        'items': items,
+        'runs': len(timings),
+        'median': median,
+        'throughput': items / median if median else 0.0,
+        'p50': percentile(latencies, 50),
+        'p95': percentile(latencies, 95),
+        'p99': percentile(latencies, 99),
+        'max': max(latencies),
+        'peak_mb': peak / 1024 / 1024,
+    }
+
+
+def run(options):
+    payload = generate_payload(options.years, options.readings_per_day,
+                               ALL_TAGS if options.all_tags else DEFAULT_TAGS,
+                               DEFAULT_MODELS[:options.models], seed=options.seed)
+    records = len(payload['data'])
+    print(f"生成したレスポンス: {records}件（{options.years}年分）", file=sys.stderr)
+
+    results = []
+    output_dir = tempfile.mkdtemp(prefix="healthplanet-bench-")
+    exporter = HealthDataExporter()
+    exporter.data_dir = output_dir
+    quiet = contextlib.redirect_stdout(io.StringIO())
+
+    if 'fetch' in options.stages:
+        server = MockHealthPlanet(payload, latency=options.latency / 1000, jitter=options.jitter / 1000,
+                                  error_rate=options.error_rate, seed=options.seed)
+        with server:
+            api = HealthPlanetAPI("bench", "bench", account="bench", rate_limit=None,
+                                  backoff=0.01, tags=format_tags(ALL_TAGS if options.all_tags else DEFAULT_TAGS))
+            server.configure_api(api)
+            with quiet:
+                api.get_access_token("bench-code")
+            from_dt, to_dt = payload_period(payload)
+
+            def fetch():
+                with contextlib.redirect_stdout(io.StringIO()):
+                    raw = api.get_body_composition_data_range(from_dt, to_dt, max_workers=options.workers)
+                return len(raw['data']) if raw else 0
+
+            api.request_stats.clear()
+            timings, items, peak = measure(fetch, options.repeat)
+            latencies = [s['elapsed'] for s in api.request_stats if s['url'] == api.innerscan_url]
+            result = report('fetch', timings, items, peak, latencies)
+            result['requests'] = len(split_date_range(from_dt, to_dt))
+            result['server_errors'] = server.errors
+            results.append(result)
+
+    # 件数はすべての処理でレスポンスの測定件数（タグ単位）にそろえる
+    def parse():
+        exporter.parse_health_data(payload)
+        return records
+
+    def summary():
+        HealthDataset.from_raw(payload).summary
+        return records
+
+    def save_csv():
+        with contextlib.redirect_stdout(io.StringIO()):
+            exporter.save_to_csv(payload, "bench.csv")
+        return records
+
+    def stream_csv():
+        # 90日ごとのレスポンスを順に書き出す場合
+        from_dt, to_dt = payload_period(payload)
+        windows = []
+        items = payload['data']
+        for start, end in split_date_range(from_dt, to_dt):
+            low, high = start.strftime("%Y%m%d%H%M"), end.strftime("%Y%m%d%H%M")
+            windows.append({'data': [item for item in items if low <= item['date'] <= high]})
+        with contextlib.redirect_stdout(io.StringIO()):
+            exporter.stream_to_csv(iter(windows), "bench_stream.csv",
+                                   tags=ALL_TAGS if options.all_tags else DEFAULT_TAGS)
+        return records
+
+    def save_excel():
+        with contextlib.redirect_stdout(io.StringIO()):
+            exporter.save_to_excel(payload, "bench.xlsx")
+        return records
+
+    def export():
+        # 1回の解析で複数の形式へ並行に書き出す場合
+        with contextlib.redirect_stdout(io.StringIO()):
+            exporter.export(payload, EXPORT_FORMATS, "bench_export")
+        return records
+
+    stages = {'parse': parse, 'summary': summary, 'save_csv': save_csv,
+              'stream_csv': stream_csv, 'save_excel': save_excel, 'export': export}
+    for name, func in stages.items():
+        if name in options.stages:
+            timings, items, peak = measure(func, options.repeat)
+            results.append(report(name, timings, items, peak))
+
+    return {
+        'options': {key: value for key, value in vars(options).items() if key not in ('json', 'baseline')},
+        'records': records,
+        'output_dir': output_dir,
+        'results': results,
+    }
+
+
+def print_results(summary):
+    print(f"{'処理':<12}{'件数':>10}{'件/秒':>12}{'中央値':>10}{'p50':>10}{'p95':>10}{'p99':>10}{'最大':>10}{'メモリ':>10}")
+    for r in summary['results']:
+        print(f"{r['stage']:<12}{r['items']:>10}{r['throughput']:>12.0f}"
+              f"{r['median'] * 1000:>8.1f}ms{r['p50'] * 1000:>8.1f}ms{r['p95'] * 1000:>8.1f}ms"
+              f"{r['p99'] * 1000:>8.1f}ms{r['max'] * 1000:>8.1f}ms{r['peak_mb']:>8.1f}MB")
+        if r['stage'] == 'fetch':
+            print(f"{'':<12}リクエスト数: {r['requests']}/回, サーバーエラー: {r['server_errors']}件"
+                  "（p50以降はリクエスト単位のレイテンシ）")
+
+
+def compare(summary, baseline_path, tolerance):
+    """基準の結果より中央値が tolerance 以上遅くなった処理を返す"""
+    with open(baseline_path, encoding='utf-8') as f:
+        baseline = {r['stage']: r for r in json.load(f)['results']}
+
+    regressions = []
+    for r in summary['results']:
+        base = baseline.get(r['stage'])
+        if base and r['median'] > base['median'] * (1 + tolerance):
+            regressions.append((r['stage'], base['median'], r['median']))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Health Planetデータ処理のベンチマーク")
+    parser.add_argument("--years", type=float, default=3, help="生成する期間（年）")
+    parser.add_argument("--readings-per-day", type=int, default=2, help="1日あたりの測定回数")
+    parser.add_argument("--models", type=int, default=2, choices=range(1, len(DEFAULT_MODELS) + 1),
+                        help="測定に使う機器の数")
+    parser.add_argument("--all-tags", action="store_true", help="全測定項目を含める")
+    parser.add_argument("--latency", type=float, default=20, help="モックサーバーの平均レイテンシ（ミリ秒）")
+    parser.add_argument("--jitter", type=float, default=5, help="レイテンシのばらつき（ミリ秒）")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="503を返す割合（0～1）")
+    parser.add_argument("--workers", type=int, default=4, help="取得の並列数")
+    parser.add_argument("--repeat", type=int, default=5, help="各処理の実行回数")
+    parser.add_argument("--stages", nargs="+", default=list(STAGES), choices=STAGES)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", help="結果をJSONで保存するファイル")
+    parser.add_argument("--baseline", help="比較する以前の結果（JSON）")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="遅くなったとみなす割合")
+    options = parser.parse_args(argv)
+
+    summary = run(options)
+    print_results(summary)
+
+    if options.json:
+        with open(options.json, 'w', encoding='utf-8') as f:
+            json.dump(summary, f, ensure_ascii=False, indent=2)
+        print(f"結果を保存しました: {os.path.abspath(options.json)}")
+
+    if options.baseline:
+        regressions = compare(summary, options.baseline, options.tolerance)
+        for stage, before, after in regressions:
+            print(f"遅くなりました: {stage} {before * 1000:.1f}ms → {after * 1000:.1f}ms")
+        if regressions:
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
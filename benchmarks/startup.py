@@ -0,0 +1,88 @@
+"""GUIの起動時間のベンチマーク
+
+新しいプロセスで gui_app を起動し、モジュールの読み込み・最初の描画・
+API初期化の完了までの時間を計測する。起動時に重いモジュールを読み込んで
+いないかも確認する。
+
+使い方（リポジトリのルートで実行）:
+    python -m benchmarks.startup
+    python -m benchmarks.startup --repeat 10 --budget 0.5   # 超えたら終了コード1
+
+ディスプレイがない環境では描画を計測できないため、モジュールの読み込みのみ計測する。
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+# 起動時に読み込まれていてはいけないモジュール
+HEAVY_MODULES = ('pandas', 'openpyxl', 'pyarrow', 'matplotlib', 'tkcalendar', 'requests')
+
+CHILD_SCRIPT = r"""
+import json, sys, time
+start = time.perf_counter()
+import gui_app
+result = {'import': time.perf_counter() - start,
+          'heavy_modules': [m for m in %(heavy)r if m in sys.modules]}
+try:
+    root = gui_app.tk.Tk()
+except gui_app.tk.TclError as e:
+    result['error'] = str(e)
+else:
+    app = gui_app.HealthPlanetGUI(root)
+    root.update()
+    result['first_paint'] = time.perf_counter() - start
+    deadline = time.perf_counter() + 10
+    while app.api is None and time.perf_counter() < deadline:
+        root.update()
+        time.sleep(0.001)
+    result['backend_ready'] = time.perf_counter() - start if app.api is not None else None
+    root.destroy()
+print(json.dumps(result))
+"""
+
+
+def measure_once():
+    root_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    output = subprocess.run(
+        [sys.executable, "-c", CHILD_SCRIPT % {'heavy': HEAVY_MODULES}],
+        cwd=root_dir, capture_output=True, text=True, check=True,
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="GUIの起動時間のベンチマーク")
+    parser.add_argument("--repeat", type=int, default=5, help="起動する回数")
+    parser.add_argument("--budget", type=float, default=1.0, help="最初の描画までの上限（秒）")
+    options = parser.parse_args(argv)
+
+    runs = [measure_once() for _ in range(options.repeat)]
+    failed = False
+
+    for key, label in (('import', 'モジュール読み込み'), ('first_paint', '最初の描画'),
+                       ('backend_ready', 'API初期化完了')):
+        values = [run[key] for run in runs if run.get(key) is not None]
+        if values:
+            print(f"{label:<12} 中央値 {statistics.median(values) * 1000:7.1f}ms  最大 {max(values) * 1000:7.1f}ms")
+
+    if 'error' in runs[0]:
+        print(f"描画は計測できませんでした（{runs[0]['error']}）。モジュール読み込みのみ判定します")
+
+    measured = [run.get('first_paint', run['import']) for run in runs]
+    if statistics.median(measured) > options.budget:
+        print(f"上限の{options.budget:.2f}秒を超えています")
+        failed = True
+
+    heavy = sorted({m for run in runs for m in run['heavy_modules']})
+    if heavy:
+        print(f"起動時に読み込まれた重いモジュール: {', '.join(heavy)}")
+        failed = True
+
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,286 @@
+"""data/ に溜まったエクスポートファイルを1つの履歴にまとめる
+
+health_data_YYYYMMDD_HHMMSS.csv / .xlsx をすべて読み込み、測定日時・機器ごとに
+重複を除いた履歴（data/consolidated/health_history.csv）を作成する。
+各ファイルのサイズ・更新日時・フィンガープリントと測定期間をインデックス
+（data/consolidated/index.json）に記録し、次回以降は追加・変更された
+ファイルだけを読み込んで既存の履歴に反映する。削除されたファイルの測定も
+履歴には残る。
+
+使い方:
+    python consolidate.py
+    python consolidate.py --data-dir data --rebuild   # すべて読み直す
+"""
+import argparse
+import csv
+import glob
+import hashlib
+import json
+import mmap
+import os
+import re
+import time
+from datetime import date, datetime, timedelta
+
+from innerscan_tags import TAG_REGISTRY
+
+INDEX_VERSION = 1
+SNAPSHOT_PATTERN = re.compile(r"health_data_(\d{8}_\d{6})")
+KEY_COLUMNS = ('date', 'datetime', 'model')
+# 旧バージョンのCSVは秒が欠けている（例: "2025-08-30 06:24:"）
+TRUNCATED_SECONDS = re.compile(r"^(\d{4}-\d{2}-\d{2} \d{2}:\d{2}):?$")
+
+
+def normalize_datetime(value):
+    """測定日時を 'YYYY-MM-DD HH:MM:SS' にそろえる"""
+    if isinstance(value, datetime):
+        return value.strftime("%Y-%m-%d %H:%M:%S")
+    value = str(value).strip()
+    match = TRUNCATED_SECONDS.match(value)
+    if match:
+        return f"{match.group(1)}:00"
+    return value
+
+
+def format_value(value):
+    """セルの値をCSVの文字列に変換（数値は余分な桁を付けない）"""
+    if value is None:
+        return ''
+    if isinstance(value, float):
+        return format(round(value, 2), 'g')
+    if isinstance(value, datetime):
+        return value.strftime("%Y-%m-%d")
+    if isinstance(value, date):
+        return value.isoformat()
+    return str(value).strip()
+
+
+def file_fingerprint(path):
+    """ファイル内容のハッシュ（メモリマップで読み込む）"""
+    digest = hashlib.blake2b(digest_size=16)
+    with open(path, 'rb') as f:
+        if os.fstat(f.fileno()).st_size:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                digest.update(mm)
+    return digest.hexdigest()
+
+
+def read_csv_rows(path):
+    """CSVをメモリマップで読み込み、列名 → 値の辞書を順に返す"""
+    with open(path, 'rb') as f:
+        if not os.fstat(f.fileno()).st_size:
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            lines = (line.decode('utf-8-sig') for line in iter(mm.readline, b''))
+            yield from csv.DictReader(lines)
+
+
+def read_excel_rows(path):
+    """Excelの測定データシート（年ごとのシートを含む）を読み込む"""
+    from openpyxl import load_workbook
+
+    workbook = load_workbook(path, read_only=True, data_only=True)
+    try:
+        for sheet in workbook.worksheets:
+            if sheet.title == 'ユーザー情報':
+                continue
+            rows = sheet.iter_rows(values_only=True)
+            header = next(rows, None)
+            if not header or 'datetime' not in header:
+                continue
+            header = [str(name) for name in header]
+            for row in rows:
+                yield {name: value for name, value in zip(header, row)}
+    finally:
+        workbook.close()
+
+
+def snapshot_time(path):
+    """ファイル名の日時（なければ更新日時）を 'YYYYMMDD_HHMMSS' で返す"""
+    match = SNAPSHOT_PATTERN.search(os.path.basename(path))
+    if match:
+        return match.group(1)
+    return datetime.fromtimestamp(os.path.getmtime(path)).strftime("%Y%m%d_%H%M%S")
+
+
+def next_day(day):
+    """'YYYY-MM-DD' の翌日"""
+    return (date.fromisoformat(day) + timedelta(days=1)).isoformat()
+
+
+def merge_ranges(ranges):
+    """期間（開始日, 終了日）のリストを重なり・隣接を結合して返す
+
+    日付は 'YYYY-MM-DD'。前の期間の終了日の翌日から始まる期間も隣接として結合する。
+    """
+    merged = []
+    for first, last in sorted(ranges):
+        if merged and first <= next_day(merged[-1][1]):
+            merged[-1][1] = max(merged[-1][1], last)
+        else:
+            merged.append([first, last])
+    return merged
+
+
+class HistoryConsolidator:
+    """エクスポートファイルを測定日時・機器ごとに重複を除いて統合する"""
+
+    def __init__(self, data_dir="data", output_dir=None):
+        self.data_dir = data_dir
+        self.output_dir = output_dir or os.path.join(data_dir, "consolidated")
+        self.output_path = os.path.join(self.output_dir, "health_history.csv")
+        self.index_path = os.path.join(self.output_dir, "index.json")
+
+    def find_exports(self):
+        paths = glob.glob(os.path.join(self.data_dir, "health_data_*.csv"))
+        paths += glob.glob(os.path.join(self.data_dir, "health_data_*.xlsx"))
+        return sorted(paths, key=lambda path: (snapshot_time(path), path))
+
+    def load_index(self):
+        if not os.path.exists(self.index_path) or not os.path.exists(self.output_path):
+            return None
+        try:
+            with open(self.index_path, encoding='utf-8') as f:
+                index = json.load(f)
+        except (OSError, ValueError):
+            return None
+        return index if index.get('version') == INDEX_VERSION else None
+
+    def load_history(self):
+        """統合済みの履歴を (日時, 機器) → 行 の辞書で読み込む"""
+        return {(row['datetime'], row['model']): row for row in read_csv_rows(self.output_path)}
+
+    def read_export(self, path):
+        """エクスポートファイルの行を、測定日時をそろえた辞書として返す"""
+        if path.endswith('.xlsx'):
+            for row in read_excel_rows(path):
+                if not row.get('datetime'):
+                    continue
+                record = {name: format_value(value) for name, value in row.items() if name}
+                record['datetime'] = normalize_datetime(row['datetime'])
+                record['date'] = record['datetime'][:10]
+                record.setdefault('model', '')
+                yield record
+            return
+
+        # CSVの値は文字列のまま使い、日時の形式が異なる行だけ変換する
+        for row in read_csv_rows(path):
+            stamp = row.get('datetime')
+            if not stamp:
+                continue
+            if len(stamp) != 19:
+                stamp = row['datetime'] = normalize_datetime(stamp)
+            row['date'] = stamp[:10]
+            row.pop(None, None)
+            if row.get('model') is None:
+                row['model'] = ''
+            yield row
+
+    def run(self, rebuild=False):
+        """統合を実行し、処理内容の概要を返す"""
+        start = time.perf_counter()
+        index = None if rebuild else self.load_index()
+        if index is None:
+            index = {'version': INDEX_VERSION, 'newest_snapshot': '', 'files': {}}
+            history = {}
+        else:
+            history = self.load_history()
+
+        known = index['files']
+        current = {}
+        changed = []
+        for path in self.find_exports():
+            name = os.path.basename(path)
+            stat = os.stat(path)
+            entry = known.get(name)
+            # サイズと更新日時が同じなら読み直さない
+            if entry and entry['size'] == stat.st_size and entry['mtime_ns'] == stat.st_mtime_ns:
+                current[name] = entry
+                continue
+
+            fingerprint = file_fingerprint(path)
+            if entry and entry['fingerprint'] == fingerprint:
+                current[name] = dict(entry, size=stat.st_size, mtime_ns=stat.st_mtime_ns)
+                continue
+            current[name] = {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns,
+                             'fingerprint': fingerprint, 'snapshot': snapshot_time(path)}
+            changed.append(path)
+
+        newest = index['newest_snapshot']
+        for path in changed:
+            entry = current[os.path.basename(path)]
+            # 統合済みより古いスナップショットは、未登録の測定を補うだけにする
+            overwrite = entry['snapshot'] >= newest
+            rows = 0
+            first = last = None
+            for record in self.read_export(path):
+                key = (record['datetime'], record['model'])
+                if overwrite or key not in history:
+                    history[key] = record
+                rows += 1
+                first = record['date'] if first is None else min(first, record['date'])
+                last = record['date'] if last is None else max(last, record['date'])
+            entry.update(rows=rows, first=first, last=last)
+            newest = max(newest, entry['snapshot'])
+
+        if changed or rebuild or not os.path.exists(self.output_path):
+            self.write_history(history)
+
+        index = {
+            'version': INDEX_VERSION,
+            'newest_snapshot': newest,
+            'rows': len(history),
+            'coverage': merge_ranges((entry['first'], entry['last']) for entry in current.values()
+                                     if entry.get('first')),
+            'files': current,
+        }
+        self.write_json(index)
+
+        return {
+            'files': len(current),
+            'changed': len(changed),
+            'rows': len(history),
+            'coverage': index['coverage'],
+            'output': self.output_path,
+            'seconds': time.perf_counter() - start,
+        }
+
+    def write_history(self, history):
+        """新しい順に並べて書き出す（一時ファイルに書いてから置き換え）"""
+        value_columns = {name for row in history.values() for name in row} - set(KEY_COLUMNS)
+        ordered = [info['name'] for info in TAG_REGISTRY.values() if info['name'] in value_columns]
+        ordered += sorted(value_columns - set(ordered))
+        fieldnames = ['date', 'datetime'] + ordered + ['model']
+
+        os.makedirs(self.output_dir, exist_ok=True)
+        tmp_path = f"{self.output_path}.tmp"
+        with open(tmp_path, 'w', newline='', encoding='utf-8') as f:
+            writer = csv.DictWriter(f, fieldnames=fieldnames, restval='', extrasaction='ignore')
+            writer.writeheader()
+            writer.writerows(row for _, row in sorted(history.items(), reverse=True))
+        os.replace(tmp_path, self.output_path)
+
+    def write_json(self, index):
+        tmp_path = f"{self.index_path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(index, f, ensure_ascii=False, indent=1)
+        os.replace(tmp_path, self.index_path)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="エクスポートファイルを1つの履歴に統合")
+    parser.add_argument("--data-dir", default="data", help="エクスポートファイルのあるディレクトリ")
+    parser.add_argument("--output-dir", help="統合した履歴の保存先（既定: <data-dir>/consolidated）")
+    parser.add_argument("--rebuild", action="store_true", help="インデックスを使わずすべて読み直す")
+    options = parser.parse_args(argv)
+
+    result = HistoryConsolidator(options.data_dir, options.output_dir).run(rebuild=options.rebuild)
+    print(f"ファイル数: {result['files']}（読み込み: {result['changed']}）")
+    print(f"統合後の測定数: {result['rows']}件")
+    for first, last in result['coverage']:
+        print(f"  期間: {first} ～ {last}")
+    print(f"保存しました: {result['output']}（{result['seconds']:.2f}秒）")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,8 +1,60 @@
 import csv
-import pandas as pd
+import heapq
+import json
 import os
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 from datetime import datetime
-from collections import defaultdict
+
+import numpy as np
+
+import tracing
+from health_dataset import HealthDataset
+from health_stats import DEFAULT_WINDOWS
+from innerscan_tags import DEFAULT_TAGS, TAG_REGISTRY, tag_info_by_name, tag_names
+
+# Excelに書き出す際に一度にセルへ変換する行数
+EXCEL_CHUNK_ROWS = 5000
+# 集計のCSVに書き出す統計
+ROLLUP_STATS = ('count', 'mean', 'min', 'max', 'last')
+# export() で指定できる形式と拡張子（Parquetはディレクトリに保存）
+EXPORT_FORMATS = {'csv': '.csv', 'xlsx': '.xlsx', 'jsonl': '.jsonl', 'parquet': ''}
+
+
+def parquet_schema():
+    """Parquetの列（登録済みの全項目。未測定の項目も列を持たせ、パーティション間で揃える）"""
+    import pyarrow as pa
+    
+    fields = [pa.field('timestamp', pa.timestamp('s')), pa.field('model', pa.string())]
+    for info in TAG_REGISTRY.values():
+        fields.append(pa.field(info['name'], pa.float32() if info['dtype'] == 'float32' else pa.int16()))
+    return pa.schema(fields)
+
+
+def csv_fieldnames(value_names):
+    """CSVの列名（測定項目は取得した項目に応じて増える）"""
+    return ['date', 'datetime'] + list(value_names) + ['model']
+
+
+@contextmanager
+def atomic_output(filepath):
+    """同じディレクトリの一時ファイルに書き、完了後にfilepathへ置き換える
+
+    途中で失敗した場合は一時ファイルを削除するので、書きかけのファイルは残らない。
+    """
+    fd, tmp_path = tempfile.mkstemp(prefix=f".{os.path.basename(filepath)}.",
+                                    suffix=".tmp", dir=os.path.dirname(filepath) or ".")
+    os.close(fd)
+    try:
+        yield tmp_path
+        os.replace(tmp_path, filepath)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
 
 class HealthDataExporter:
     def __init__(self):
@@ -11,52 +63,25 @@ class HealthDataExporter:
         if not os.path.exists(self.data_dir):
             os.makedirs(self.data_dir)
     
+    def to_dataset(self, data):
+        """APIレスポンスまたはHealthDatasetをHealthDatasetとして返す"""
+        if isinstance(data, HealthDataset):
+            return data
+        return HealthDataset.from_raw(data)
+    
     def parse_health_data(self, raw_data):
         """APIから取得した生データを整理"""
-        if not raw_data or 'data' not in raw_data:
+        dataset = self.to_dataset(raw_data)
+        if dataset is None:
             return None
         
-        # 日付ごとにデータをグループ化
-        grouped_data = defaultdict(dict)
-        
-        for item in raw_data['data']:
-            date_str = item['date']
-            # 日付をフォーマット（YYYY-MM-DD HH:MM:SS）
-            formatted_date = f"{date_str[:4]}-{date_str[4:6]}-{date_str[6:8]}"
-            formatted_datetime = f"{date_str[:4]}-{date_str[4:6]}-{date_str[6:8]} {date_str[8:10]}:{date_str[10:12]}:{date_str[12:14]}"
-            
-            tag = item['tag']
-            keydata = float(item['keydata'])
-            model = item['model']
-            
-            # 日付をキーとして、体重と体脂肪率を格納
-            if formatted_date not in grouped_data:
-                grouped_data[formatted_date] = {
-                    'date': formatted_date,
-                    'datetime': formatted_datetime,
-                    'model': model
-                }
-            
-            if tag == '6021':  # 体重
-                grouped_data[formatted_date]['weight'] = keydata
-            elif tag == '6022':  # 体脂肪率
-                grouped_data[formatted_date]['body_fat'] = keydata
-        
-        # 日付順でソート
-        sorted_data = sorted(grouped_data.values(), key=lambda x: x['date'], reverse=True)
-        
-        return {
-            'measurements': sorted_data,
-            'user_info': {
-                'birth_date': raw_data.get('birth_date'),
-                'height': raw_data.get('height'),
-                'sex': raw_data.get('sex')
-            }
-        }
+        # 測定日時・機器ごとに1行（同日の複数回測定も保持）、新しい順
+        return dataset.to_parsed()
     
-    def save_to_csv(self, raw_data, filename=None):
-        """データをCSVファイルに保存"""
-        parsed_data = self.parse_health_data(raw_data)
+    def save_to_csv(self, data, filename=None):
+        """データをCSVファイルに保存（APIレスポンスまたはHealthDataset）"""
+        dataset = self.to_dataset(data)
+        parsed_data = dataset.to_parsed() if dataset is not None else None
         if not parsed_data:
             print("保存するデータがありません")
             return None
@@ -69,22 +94,17 @@ class HealthDataExporter:
         filepath = os.path.join(self.data_dir, filename)
         
         try:
-            with open(filepath, 'w', newline='', encoding='utf-8') as csvfile:
-                fieldnames = ['date', 'datetime', 'weight', 'body_fat', 'model']
-                writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
+            with tracing.span('write_csv', rows=len(parsed_data['measurements'])) as span, \
+                    atomic_output(filepath) as tmp_path, \
+                    open(tmp_path, 'w', newline='', encoding='utf-8') as csvfile:
+                writer = csv.DictWriter(csvfile, fieldnames=csv_fieldnames(dataset.value_names), restval='')
                 
                 # ヘッダー行を書き込み
                 writer.writeheader()
                 
-                # データ行を書き込み
-                for measurement in parsed_data['measurements']:
-                    writer.writerow({
-                        'date': measurement['date'],
-                        'datetime': measurement['datetime'],
-                        'weight': measurement.get('weight', ''),
-                        'body_fat': measurement.get('body_fat', ''),
-                        'model': measurement.get('model', '')
-                    })
+                # データ行を書き込み（未測定の項目は空欄）
+                writer.writerows(parsed_data['measurements'])
+                span.set(bytes=csvfile.tell())
             
             print(f"CSVファイルに保存しました: {filepath}")
             print(f"保存されたデータ数: {len(parsed_data['measurements'])}件")
@@ -102,13 +122,131 @@ class HealthDataExporter:
             print(f"CSVファイルの保存に失敗しました: {e}")
             return None
     
-    def save_to_excel(self, raw_data, filename=None):
-        """データをExcelファイルに保存（オプション）"""
-        parsed_data = self.parse_health_data(raw_data)
-        if not parsed_data:
+    def save_rollups_to_csv(self, store, granularity='week', filename=None, account="default",
+                            from_date=None, to_date=None):
+        """ストアの集計（日・週・月ごとの件数・平均・最小・最大・最新値）をCSVに保存
+        
+        集計はストアへの保存時に更新済みのため、測定データを読み直さない。
+        """
+        rollups = store.get_rollups(granularity, account, from_date, to_date)
+        if not rollups:
+            print("保存する集計がありません")
+            return None
+        
+        if filename is None:
+            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+            filename = f"health_{granularity}_{timestamp}.csv"
+        
+        filepath = os.path.join(self.data_dir, filename)
+        
+        # 期間ごとに1行、項目ごとに 項目名_統計 の列
+        rows = {}
+        names = {}
+        for rollup in rollups:
+            row = rows.setdefault(rollup['bucket'], {'bucket': rollup['bucket']})
+            names[rollup['tag']] = rollup['name']
+            for stat in ROLLUP_STATS:
+                value = rollup[stat]
+                row[f"{rollup['name']}_{stat}"] = round(value, 2) if isinstance(value, float) else value
+        fieldnames = ['bucket'] + [f"{name}_{stat}" for _, name in sorted(names.items()) for stat in ROLLUP_STATS]
+        
+        try:
+            with tracing.span('write_rollups', rows=len(rows)) as span, \
+                    atomic_output(filepath) as tmp_path, \
+                    open(tmp_path, 'w', newline='', encoding='utf-8') as csvfile:
+                writer = csv.DictWriter(csvfile, fieldnames=fieldnames, restval='')
+                writer.writeheader()
+                writer.writerows(rows[bucket] for bucket in sorted(rows, reverse=True))
+                span.set(bytes=csvfile.tell())
+            
+            print(f"集計を保存しました: {filepath}（{len(rows)}期間）")
+            return filepath
+            
+        except Exception as e:
+            print(f"集計の保存に失敗しました: {e}")
+            return None
+    
+    def stream_to_csv(self, payloads, filename=None, ordered=True, tags=DEFAULT_TAGS):
+        """ウィンドウごとのレスポンスを逐次CSVに書き出す
+        
+        payloadsには HealthPlanetAPI.iter_body_composition_data() などの
+        イテレータを渡す。ordered=Trueの場合はウィンドウごとに並べ替えた
+        一時ファイルを外部マージし、save_to_csvと同じく新しい順で出力する。
+        列はウィンドウによらず揃えるため、出力する測定項目をtagsで指定する。
+        """
+        fieldnames = csv_fieldnames(tag_names(tags).values())
+        if filename is None:
+            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+            filename = f"health_data_{timestamp}.csv"
+        
+        filepath = os.path.join(self.data_dir, filename)
+        row_count = 0
+        
+        try:
+            with tracing.span('stream_csv') as span, tempfile.TemporaryDirectory() as run_dir, \
+                    atomic_output(filepath) as tmp_path, \
+                    open(tmp_path, 'w', newline='', encoding='utf-8') as csvfile:
+                writer = csv.writer(csvfile)
+                writer.writerow(fieldnames)
+                run_paths = []
+                
+                for payload in payloads:
+                    if payload is None:
+                        raise RuntimeError("一部の期間のデータ取得に失敗しました")
+                    
+                    dataset = HealthDataset.from_raw(payload, tags)
+                    if dataset is None or not len(dataset):
+                        continue
+                    rows = [[m.get(field, '') for field in fieldnames] for m in dataset.measurements]
+                    
+                    if ordered:
+                        # ウィンドウ内は新しい順に並んでいるので、そのまま一時ファイルへ
+                        run_path = os.path.join(run_dir, f"run_{len(run_paths)}.csv")
+                        with open(run_path, 'w', newline='', encoding='utf-8') as run_file:
+                            csv.writer(run_file).writerows(rows)
+                        run_paths.append(run_path)
+                    else:
+                        writer.writerows(rows)
+                        csvfile.flush()
+                    row_count += len(rows)
+                
+                if run_paths:
+                    run_files = [open(path, newline='', encoding='utf-8') for path in run_paths]
+                    try:
+                        readers = [csv.reader(f) for f in run_files]
+                        writer.writerows(heapq.merge(*readers, key=lambda row: row[1], reverse=True))
+                    finally:
+                        for f in run_files:
+                            f.close()
+                span.set(rows=row_count, windows=len(run_paths), bytes=csvfile.tell())
+            
+            print(f"CSVファイルに保存しました: {filepath}")
+            print(f"保存されたデータ数: {row_count}件")
+            
+            return filepath
+            
+        except Exception as e:
+            print(f"CSVファイルの保存に失敗しました: {e}")
+            return None
+    
+    def save_to_excel(self, data, filename=None, sheet_per_year=False, chunk_size=EXCEL_CHUNK_ROWS):
+        """データをExcelファイルに保存（openpyxlの書き込み専用モード）
+        
+        解析済みの表からchunk_size行ずつセルの値に変換して書き出すので、
+        ブック全体をメモリに持たない。日時は日付型、測定値は数値型のセルになる。
+        sheet_per_year=Trueの場合は測定年ごとにシートを分ける。
+        """
+        dataset = self.to_dataset(data)
+        if dataset is None or not len(dataset):
             print("保存するデータがありません")
             return None
         
+        try:
+            from openpyxl import Workbook
+        except ImportError:
+            print("Excel保存にはopenpyxlが必要です: pip install openpyxl")
+            return None
+        
         # ファイル名を生成
         if filename is None:
             timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
@@ -117,21 +255,52 @@ class HealthDataExporter:
         filepath = os.path.join(self.data_dir, filename)
         
         try:
-            # DataFrameを作成
-            df = pd.DataFrame(parsed_data['measurements'])
+            wide = dataset.wide
+            names = dataset.value_names
+            header = csv_fieldnames(names)
+            timestamps = wide['timestamp'].to_numpy().astype('datetime64[s]')
+            years = timestamps.astype('datetime64[Y]').astype(np.int64) + 1970
+            columns = [(wide[name].to_numpy(dtype=np.float64, na_value=np.nan),
+                        tag_info_by_name(name)['dtype'] != 'float32') for name in names]
+            models = wide['model'].to_numpy(dtype=object)
+            
+            workbook = Workbook(write_only=True)
+            sheet = None
+            sheet_year = None
             
-            # Excelファイルに保存
-            with pd.ExcelWriter(filepath, engine='openpyxl') as writer:
-                df.to_excel(writer, sheet_name='測定データ', index=False)
+            with tracing.span('write_excel', rows=len(wide)):
+                for start in range(0, len(wide), chunk_size):
+                    end = min(start + chunk_size, len(wide))
+                    stamps = timestamps[start:end].astype(object).tolist()
+                    # float32の誤差を持ち込まないよう小数第2位で丸め、未測定は空セル
+                    values = []
+                    for column, is_int in columns:
+                        chunk = np.round(column[start:end], 2).tolist()
+                        if is_int:
+                            values.append([int(v) if v == v else None for v in chunk])
+                        else:
+                            values.append([v if v == v else None for v in chunk])
+                    
+                    for i, stamp in enumerate(stamps):
+                        if sheet is None or (sheet_per_year and years[start + i] != sheet_year):
+                            sheet_year = years[start + i]
+                            sheet = workbook.create_sheet(str(sheet_year) if sheet_per_year else '測定データ')
+                            sheet.append(header)
+                        sheet.append([stamp.date(), stamp] + [column[i] for column in values]
+                                     + [models[start + i]])
                 
                 # ユーザー情報シートを作成
-                user_info = parsed_data['user_info']
+                user_info = dataset.user_info
                 if user_info['birth_date']:
-                    user_df = pd.DataFrame([user_info])
-                    user_df.to_excel(writer, sheet_name='ユーザー情報', index=False)
+                    user_sheet = workbook.create_sheet('ユーザー情報')
+                    user_sheet.append(list(user_info))
+                    user_sheet.append(list(user_info.values()))
+                
+                with atomic_output(filepath) as tmp_path:
+                    workbook.save(tmp_path)
             
             print(f"Excelファイルに保存しました: {filepath}")
-            print(f"保存されたデータ数: {len(parsed_data['measurements'])}件")
+            print(f"保存されたデータ数: {len(wide)}件")
             
             return filepath
             
@@ -139,25 +308,221 @@ class HealthDataExporter:
             print(f"Excelファイルの保存に失敗しました: {e}")
             return None
     
-    def display_summary(self, raw_data):
+    def save_to_jsonl(self, data, filename=None):
+        """データをJSON Lines（1行に1回の測定）で保存"""
+        dataset = self.to_dataset(data)
+        if dataset is None or not len(dataset):
+            print("保存するデータがありません")
+            return None
+        
+        if filename is None:
+            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+            filename = f"health_data_{timestamp}.jsonl"
+        
+        filepath = os.path.join(self.data_dir, filename)
+        
+        try:
+            measurements = dataset.measurements
+            with tracing.span('write_jsonl', rows=len(measurements)) as span, \
+                    atomic_output(filepath) as tmp_path, \
+                    open(tmp_path, 'w', encoding='utf-8') as f:
+                encode = json.JSONEncoder(ensure_ascii=False).encode
+                f.writelines(f"{encode(m)}\n" for m in measurements)
+                span.set(bytes=f.tell())
+            
+            print(f"JSON Linesで保存しました: {filepath}")
+            print(f"保存されたデータ数: {len(measurements)}件")
+            
+            return filepath
+            
+        except Exception as e:
+            print(f"JSON Linesの保存に失敗しました: {e}")
+            return None
+    
+    def export(self, data, formats=('csv',), basename=None, account="default", max_workers=None):
+        """複数の形式へまとめて保存
+        
+        データの解析は1回だけ行い、各形式の書き出しをスレッドで並行して実行する。
+        形式ごとに {'path', 'seconds', 'bytes'} を返す（失敗した形式はpathがNone）。
+        Parquetは data_dir/parquet のデータセットに追記し、bytesは今回書いたパーティションの合計。
+        """
+        unknown = [fmt for fmt in formats if fmt not in EXPORT_FORMATS]
+        if unknown:
+            raise ValueError(f"未対応の形式です: {', '.join(unknown)}")
+        
+        dataset = self.to_dataset(data)
+        if dataset is None or not len(dataset):
+            print("保存するデータがありません")
+            return None
+        
+        if basename is None:
+            basename = f"health_data_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+        
+        # 各形式で共有する表を先に作っておく（スレッドごとに重複して作らない）
+        with tracing.span('prepare_export', rows=len(dataset)):
+            dataset.measurements
+        
+        parquet_files = []
+        writers = {
+            'csv': lambda: self.save_to_csv(dataset, basename + EXPORT_FORMATS['csv']),
+            'xlsx': lambda: self.save_to_excel(dataset, basename + EXPORT_FORMATS['xlsx']),
+            'jsonl': lambda: self.save_to_jsonl(dataset, basename + EXPORT_FORMATS['jsonl']),
+            'parquet': lambda: self.save_to_parquet(dataset, account=account, written=parquet_files),
+        }
+        
+        def size(fmt, path):
+            if not path:
+                return 0
+            if fmt == 'parquet':
+                return sum(os.path.getsize(part_path) for part_path in parquet_files)
+            return os.path.getsize(path)
+        
+        def run(fmt):
+            start = time.perf_counter()
+            with tracing.span(f"export_{fmt}"):
+                path = writers[fmt]()
+            return {'path': path, 'seconds': time.perf_counter() - start, 'bytes': size(fmt, path)}
+        
+        formats = list(dict.fromkeys(formats))
+        with ThreadPoolExecutor(max_workers=max_workers or len(formats)) as executor:
+            results = dict(zip(formats, executor.map(run, formats)))
+        
+        for fmt, result in results.items():
+            if result['path']:
+                print(f"{fmt}: {result['seconds']:.2f}秒, {result['bytes'] / 1024:.0f}KB")
+        
+        return results
+    
+    def save_to_parquet(self, data, dataset_dir=None, account="default", written=None):
+        """データをParquetに保存（アカウント・年月ごとのパーティション）
+        
+        新しいデータを含むパーティションだけを既存データと結合して書き直す。
+        writtenにリストを渡すと、書き込んだパーティションのファイルを追加する。
+        """
+        dataset = self.to_dataset(data)
+        if dataset is None or not len(dataset):
+            print("保存するデータがありません")
+            return None
+        
+        try:
+            import pandas as pd
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            print("Parquet保存にはpyarrowが必要です: pip install pyarrow")
+            return None
+        
+        if dataset_dir is None:
+            dataset_dir = os.path.join(self.data_dir, "parquet")
+        
+        try:
+            schema = parquet_schema()
+            frame = dataset.wide.reindex(columns=schema.names)
+            frame['timestamp'] = frame['timestamp'].to_numpy().astype('datetime64[s]')
+            year_months = frame['timestamp'].dt.strftime('%Y-%m')
+            
+            for year_month, part in frame.groupby(year_months, sort=False):
+                part_dir = os.path.join(dataset_dir, f"account={account}", f"year_month={year_month}")
+                part_path = os.path.join(part_dir, "part-0.parquet")
+                os.makedirs(part_dir, exist_ok=True)
+                
+                # 既存パーティションと結合し、同じ日時・機器は項目ごとに新しい値を優先
+                # （新しいデータにない項目は既存の値を残す）
+                if os.path.exists(part_path):
+                    existing = pq.read_table(part_path).to_pandas().reindex(columns=schema.names)
+                    part = pd.concat([existing, part], ignore_index=True)
+                    part = part.groupby(['timestamp', 'model'], as_index=False, sort=False, dropna=False).last()
+                part = part.sort_values('timestamp', kind='stable')
+                
+                with tracing.span('write_parquet', rows=len(part), partition=year_month) as span:
+                    table = pa.Table.from_pandas(part[schema.names], schema=schema, preserve_index=False)
+                    tmp_path = f"{part_path}.tmp"
+                    pq.write_table(table, tmp_path)
+                    os.replace(tmp_path, part_path)
+                    span.set(bytes=os.path.getsize(part_path))
+                if written is not None:
+                    written.append(part_path)
+            
+            print(f"Parquetに保存しました: {dataset_dir}")
+            print(f"保存されたデータ数: {len(frame)}件（{year_months.nunique()}パーティション）")
+            
+            return dataset_dir
+            
+        except Exception as e:
+            print(f"Parquetの保存に失敗しました: {e}")
+            return None
+    
+    def load_from_parquet(self, dataset_dir=None, account=None, from_date=None, to_date=None):
+        """Parquetから期間を指定して読み込み（必要な年月のパーティションのみ読む）"""
+        import pandas as pd
+        import pyarrow as pa
+        import pyarrow.dataset as ds
+        
+        from health_planet_api import to_datetime
+        
+        if dataset_dir is None:
+            dataset_dir = os.path.join(self.data_dir, "parquet")
+        
+        # 以前のバージョンは取得した項目の列だけを書いていたため、全パーティションの列を合わせる
+        source = ds.dataset(dataset_dir, format="parquet", partitioning="hive")
+        schema = pa.unify_schemas([source.schema] + [fragment.physical_schema
+                                                      for fragment in source.get_fragments()])
+        source = ds.dataset(dataset_dir, schema=schema, format="parquet", partitioning="hive")
+        
+        conditions = []
+        if account is not None:
+            conditions.append(ds.field('account') == account)
+        if from_date is not None:
+            from_dt = to_datetime(from_date)
+            conditions.append(ds.field('year_month') >= from_dt.strftime('%Y-%m'))
+            conditions.append(ds.field('timestamp') >= pd.Timestamp(from_dt))
+        if to_date is not None:
+            to_dt = to_datetime(to_date, end_of_day=True)
+            conditions.append(ds.field('year_month') <= to_dt.strftime('%Y-%m'))
+            conditions.append(ds.field('timestamp') <= pd.Timestamp(to_dt))
+        
+        predicate = None
+        for condition in conditions:
+            predicate = condition if predicate is None else predicate & condition
+        
+        frame = source.to_table(filter=predicate).to_pandas()
+        return frame.sort_values('timestamp', kind='stable').reset_index(drop=True)
+    
+    def summary_lines(self, dataset):
+        """項目ごとの統計を1項目2行の文字列にする"""
+        summary = dataset.summary
+        lines = []
+        for name in dataset.value_names:
+            stats = summary.get(name)
+            if not stats:
+                continue
+            info = tag_info_by_name(name)
+            unit = info['unit']
+            lines.append(f"{info['label']} - 最新: {stats['latest']:.1f}{unit}, 平均: {stats['mean']:.1f}{unit}, 範囲: {stats['min']:.1f}-{stats['max']:.1f}{unit}")
+            
+            recent = ", ".join(
+                f"{days}日: {stats[f'mean_{days}d']:.1f}{unit}" for days in DEFAULT_WINDOWS
+                if stats.get(f'mean_{days}d') is not None
+            )
+            trend = f"  直近の平均 {recent}, 平滑値: {stats['ewma']:.1f}{unit}"
+            if stats['weekly_rate'] is not None:
+                trend += f", 変化: {stats['weekly_rate']:+.2f}{unit}/週"
+            lines.append(trend)
+        return lines
+    
+    def display_summary(self, data):
         """データの概要を表示"""
-        parsed_data = self.parse_health_data(raw_data)
-        if not parsed_data:
+        dataset = self.to_dataset(data)
+        if dataset is None:
             return
         
-        measurements = parsed_data['measurements']
+        summary = dataset.summary
         
         print("=== データ概要 ===")
-        print(f"測定データ数: {len(measurements)}日分")
+        print(f"測定データ数: {summary['count']}件")
         
-        if measurements:
-            weights = [m.get('weight') for m in measurements if m.get('weight')]
-            body_fats = [m.get('body_fat') for m in measurements if m.get('body_fat')]
-            
-            if weights:
-                print(f"体重 - 最新: {weights[0]:.1f}kg, 平均: {sum(weights)/len(weights):.1f}kg, 範囲: {min(weights):.1f}-{max(weights):.1f}kg")
-            
-            if body_fats:
-                print(f"体脂肪率 - 最新: {body_fats[0]:.1f}%, 平均: {sum(body_fats)/len(body_fats):.1f}%, 範囲: {min(body_fats):.1f}-{max(body_fats):.1f}%")
+        if summary['count']:
+            for line in self.summary_lines(dataset):
+                print(line)
             
-            print(f"測定期間: {measurements[-1]['date']} ～ {measurements[0]['date']}")
+            print(f"測定期間: {summary['period'][0]} ～ {summary['period'][1]}")
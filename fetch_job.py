@@ -0,0 +1,134 @@
+import threading
+import time
+
+import tracing
+from innerscan_tags import DEFAULT_TAGS
+
+# 途中までのデータセットを作り直す最短の間隔（秒）
+PARTIAL_INTERVAL = 0.5
+# 途中までのデータセットを作り直すのは、読み込み済みの行数に対してこの割合以上増えたときだけ
+# （長期間の取得でも作り直しの回数は行数の対数程度になり、合計の処理量は行数に比例する）
+PARTIAL_GROWTH = 0.25
+
+
+class FetchJob:
+    """データ取得1回分のジョブ（ワーカースレッドで実行し、途中で中止できる）
+
+    ローカルストアへの同期をウィンドウごとに進め、進捗と途中までのデータセットを
+    コールバックで通知する。コールバックはワーカースレッドから呼ばれるので、
+    GUIでは post() でメインスレッドに渡す。
+
+        on_progress(job, 完了したウィンドウ数, ウィンドウ数)
+        on_partial(job, データセット)   # 保存済みの分と届いた分
+        on_done(job)                     # job.result / job.error / job.cancelled を参照
+    """
+
+    def __init__(self, api, store, from_date, to_date, tags=DEFAULT_TAGS, dataset_tags=DEFAULT_TAGS,
+                 previous=None, on_progress=None, on_partial=None, on_done=None,
+                 partial_interval=PARTIAL_INTERVAL, partial_growth=PARTIAL_GROWTH):
+        self.api = api
+        self.store = store
+        self.from_date = from_date
+        self.to_date = to_date
+        self.tags = tags
+        # データセットに展開する項目（Noneならデータに含まれる項目すべて）
+        self.dataset_tags = dataset_tags
+        self.on_progress = on_progress
+        self.on_partial = on_partial
+        self.on_done = on_done
+        self.partial_interval = partial_interval
+        self.partial_growth = partial_growth
+
+        self.cancel_event = threading.Event()
+        self.thread = None
+        self.result = None
+        self.error = None
+        self.changed = None
+        self.done_windows = 0
+        self.total_windows = 0
+        # 統計を増分更新するための直前のデータセット
+        self._previous = previous
+        self._partial_at = 0.0
+        # 前回データセットを作ってから保存された行数と、そのとき読み込んだ行数
+        self._pending_rows = 0
+        self._loaded_rows = 0
+
+    def start(self):
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+        return self
+
+    def cancel(self):
+        """中止を依頼（実行中のリクエストの完了を待たずに戻る）"""
+        self.cancel_event.set()
+
+    @property
+    def cancelled(self):
+        return self.cancel_event.is_set()
+
+    @property
+    def running(self):
+        return self.thread is not None and self.thread.is_alive()
+
+    def join(self, timeout=None):
+        if self.thread is not None:
+            self.thread.join(timeout)
+        return not self.running
+
+    def run(self):
+        with tracing.operation('fetch'):
+            try:
+                # 保存済みの分をすぐに表示
+                self.emit_partial()
+
+                # 選択された項目をまとめて1回のリクエストで取得（共有のapiは変更しない）
+                self.changed = self.store.sync(self.api, self.from_date, self.to_date,
+                                               progress=self.window_done, cancel=self.cancel_event,
+                                               tags=self.tags)
+                if self.changed is not None:
+                    self.result = self.load_dataset()
+                elif self._pending_rows and not self.cancelled:
+                    # 失敗した場合も保存できた分は表示しておく
+                    self.emit_partial()
+            except Exception as e:
+                self.error = e
+            finally:
+                if self.on_done:
+                    self.on_done(self)
+
+    def window_done(self, done, total, rows):
+        """1ウィンドウを保存するたびにストアから呼ばれる"""
+        self.done_windows = done
+        self.total_windows = total
+        if self.on_progress:
+            self.on_progress(self, done, total)
+
+        self._pending_rows += rows
+        # 新しい測定が十分に届いていれば、一定間隔で途中までのデータセットを通知（最後は完了時に通知）
+        if (self._pending_rows and done < total and not self.cancelled
+                and self._pending_rows >= self.partial_growth * self._loaded_rows
+                and time.monotonic() - self._partial_at >= self.partial_interval):
+            self.emit_partial()
+
+    def emit_partial(self):
+        self._pending_rows = 0
+        self._partial_at = time.monotonic()
+        if not self.on_partial:
+            return
+        dataset = self.load_dataset()
+        if dataset is not None and len(dataset):
+            self.on_partial(self, dataset)
+
+    def load_dataset(self):
+        """ストアから期間のデータを読み出し、データセットにする（データがなければNone）"""
+        from health_dataset import HealthDataset
+
+        data = self.store.to_raw_data(self.from_date, self.to_date)
+        self._loaded_rows = len(data['data'])
+        dataset = HealthDataset.from_raw(data, self.dataset_tags)
+        if dataset is None or not len(dataset):
+            return None
+        # 前回と同じ履歴に追加されただけなら統計は増分のみ更新
+        dataset.adopt_stats(self._previous)
+        self._previous = dataset
+        return dataset
@@ -1,16 +1,30 @@
 import tkinter as tk
 from tkinter import ttk, messagebox, filedialog
-# この行を削除 → from tkinter.ttk import DateEntry
-import tkcalendar  # 正しいインポート
-from tkcalendar import DateEntry  # DateEntryはtkcalendarから
 from datetime import datetime, timedelta
 import threading
+import queue
 import os
 import webbrowser
-from urllib.parse import parse_qs, urlparse
 
-from health_planet_api import HealthPlanetAPI
-from data_exporter import HealthDataExporter
+from innerscan_tags import ALL_TAGS, DEFAULT_TAGS
+from fetch_job import FetchJob
+import tracing
+
+# pandas・requests・tkcalendar・matplotlibなどの重いモジュールは、
+# ウィンドウを表示してから（または初めて使うときに）読み込む
+
+# ワーカースレッドからのイベントを処理する間隔（ミリ秒、約60fps）
+EVENT_POLL_MS = 16
+# 1回の処理で取り出すイベントの上限
+MAX_EVENTS_PER_POLL = 1000
+# ログに残す最大行数（古い行から削除）
+LOG_MAX_LINES = 1000
+# 処理時間の内訳を更新する間隔（ミリ秒）
+TRACE_REFRESH_MS = 500
+# 「過去N日分」で指定できる最大日数
+MAX_DAYS_BACK = 3650
+# 保存できる形式と表示名
+SAVE_FORMATS = (('csv', 'CSV'), ('xlsx', 'Excel'), ('jsonl', 'JSON Lines'), ('parquet', 'Parquet'))
 
 class HealthPlanetGUI:
     def __init__(self, root):
@@ -19,14 +33,15 @@ class HealthPlanetGUI:
         self.root.geometry("600x500")
         self.root.resizable(True, True)
         
-        # APIとエクスポーターの初期化
-        try:
-            self.api = HealthPlanetAPI()
-            self.exporter = HealthDataExporter()
-            self.api_ready = True
-        except Exception as e:
-            self.api_ready = False
-            messagebox.showerror("設定エラー", f"認証情報の読み込みに失敗しました：\n{str(e)}")
+        # ワーカースレッドからUIへのイベントキュー（メインループで一括処理）
+        self.events = queue.Queue()
+        self.pending_log_lines = []
+        
+        # APIとエクスポーターはウィンドウの表示後にバックグラウンドで初期化
+        self.api = None
+        self.exporter = None
+        self.store = None
+        self.api_ready = False
         
         # GUIを構築
         self.create_widgets()
@@ -35,6 +50,73 @@ class HealthPlanetGUI:
         self.auth_code = None
         self.access_token = None
         
+        self.root.after(EVENT_POLL_MS, self.process_events)
+        threading.Thread(target=self.initialize_backend, daemon=True).start()
+        
+    def initialize_backend(self):
+        """API・エクスポーター・ストアを作成（ワーカースレッドで実行）"""
+        try:
+            from data_exporter import HealthDataExporter
+            from health_planet_api import HealthPlanetAPI
+            from measurement_store import MeasurementStore
+            from raw_archive import RawArchive
+            from response_cache import ResponseCache
+            
+            api = HealthPlanetAPI(cache=ResponseCache(), token_store=self.create_token_store(),
+                                  archive=RawArchive())
+            exporter = HealthDataExporter()
+            store = MeasurementStore()
+        except Exception as e:
+            self.post(self.backend_failed, e)
+            return
+        
+        self.post(self.backend_ready, api, exporter, store)
+        
+        # 保存済みのトークンがあれば認証を省略
+        self.restore_saved_token(api)
+    
+    def backend_ready(self, api, exporter, store):
+        """初期化の完了をUIに反映（メインスレッドで呼ぶ）"""
+        self.api = api
+        self.exporter = exporter
+        self.store = store
+        self.api_ready = True
+        self.auth_button.config(state="normal")
+        self.token_button.config(state="normal")
+    
+    def backend_failed(self, error):
+        """初期化の失敗を表示（メインスレッドで呼ぶ）"""
+        self.auth_status_var.set("設定エラー")
+        messagebox.showerror("設定エラー", f"認証情報の読み込みに失敗しました：\n{str(error)}")
+    
+    def create_token_store(self):
+        """トークンの保存先を作成（cryptographyがなければ保存しない）"""
+        try:
+            from token_store import TokenStore
+            return TokenStore()
+        except ImportError as e:
+            print(e)
+            return None
+    
+    def restore_saved_token(self, api):
+        """保存済みのトークンを読み込み、必要なら更新する（ワーカースレッドで実行）"""
+        try:
+            token = api.load_saved_token()
+        except Exception as e:
+            self.log_message(f"保存済みトークンの読み込みに失敗しました: {str(e)}")
+            return
+        
+        if token:
+            self.post(self.set_authenticated, token, "認証完了（保存済みトークン）")
+            self.log_message("保存済みのアクセストークンを使用します")
+    
+    def set_authenticated(self, token, status="認証完了"):
+        """認証済みの状態に切り替え（メインスレッドで呼ぶ）"""
+        self.access_token = token
+        self.auth_status_var.set(status)
+        self.auth_status_label.config(foreground="green")
+        self.fetch_button.config(state="normal")
+    
     def create_widgets(self):
         """GUIコンポーネントを作成"""
         
@@ -53,7 +135,7 @@ class HealthPlanetGUI:
         
         # 認証URL生成ボタン
         self.auth_button = ttk.Button(auth_frame, text="認証URLを開く", 
-                                     command=self.open_auth_url)
+                                     command=self.open_auth_url, state="disabled")
         self.auth_button.grid(row=0, column=0, pady=(0, 10))
         
         # 認証コード入力
@@ -64,13 +146,14 @@ class HealthPlanetGUI:
         
         # 認証実行ボタン
         self.token_button = ttk.Button(auth_frame, text="アクセストークン取得", 
-                                      command=self.get_access_token)
+                                      command=self.get_access_token, state="disabled")
         self.token_button.grid(row=2, column=0, columnspan=2)
         
         # 認証状態表示
-        self.auth_status_var = tk.StringVar(value="未認証")
-        ttk.Label(auth_frame, textvariable=self.auth_status_var, 
-                 foreground="red").grid(row=3, column=0, columnspan=2, pady=(10, 0))
+        self.auth_status_var = tk.StringVar(value="未認証（初期化中...）")
+        self.auth_status_label = ttk.Label(auth_frame, textvariable=self.auth_status_var, 
+                                          foreground="red")
+        self.auth_status_label.grid(row=3, column=0, columnspan=2, pady=(10, 0))
         
         # データ取得セクション
         data_frame = ttk.LabelFrame(main_frame, text="2. データ取得", padding="10")
@@ -92,7 +175,7 @@ class HealthPlanetGUI:
         
         ttk.Label(self.days_frame, text="過去").grid(row=0, column=0)
         self.days_var = tk.StringVar(value="30")
-        days_spinbox = ttk.Spinbox(self.days_frame, from_=1, to=90, textvariable=self.days_var, width=5)
+        days_spinbox = ttk.Spinbox(self.days_frame, from_=1, to=MAX_DAYS_BACK, textvariable=self.days_var, width=5)
         days_spinbox.grid(row=0, column=1, padx=(5, 5))
         ttk.Label(self.days_frame, text="日分").grid(row=0, column=2)
         
@@ -100,25 +183,41 @@ class HealthPlanetGUI:
         self.range_frame = ttk.Frame(data_frame)
         self.range_frame.grid(row=2, column=0, columnspan=2, sticky=(tk.W, tk.E), pady=(10, 0))
         
+        # カレンダー（tkcalendar）は期間指定を選んだときに作成
         ttk.Label(self.range_frame, text="開始日:").grid(row=0, column=0, sticky=tk.W)
-        self.from_date = tkcalendar.DateEntry(self.range_frame, width=12, 
-                                             background='darkblue', foreground='white', 
-                                             borderwidth=2, date_pattern='yyyy-mm-dd')
-        self.from_date.grid(row=0, column=1, padx=(10, 20))
-        
         ttk.Label(self.range_frame, text="終了日:").grid(row=0, column=2, sticky=tk.W)
-        self.to_date = tkcalendar.DateEntry(self.range_frame, width=12, 
-                                           background='darkblue', foreground='white', 
-                                           borderwidth=2, date_pattern='yyyy-mm-dd')
-        self.to_date.grid(row=0, column=3, padx=(10, 0))
+        self.from_date = None
+        self.to_date = None
         
         # 初期状態の設定
         self.toggle_period_widgets()
         
+        # 取得項目（体重・体脂肪率以外は2020年6月29日までの測定分のみ）
+        self.all_tags_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(data_frame, text="全測定項目を取得（筋肉量・基礎代謝量など）",
+                        variable=self.all_tags_var).grid(row=3, column=0, columnspan=2, sticky=tk.W, pady=(10, 0))
+        
         # データ取得ボタン
         self.fetch_button = ttk.Button(data_frame, text="データ取得", 
                                       command=self.fetch_data, state="disabled")
-        self.fetch_button.grid(row=3, column=0, columnspan=2, pady=(20, 0))
+        self.fetch_button.grid(row=4, column=0, pady=(20, 0))
+        
+        # プレビューボタン
+        self.preview_button = ttk.Button(data_frame, text="データプレビュー", 
+                                        command=self.show_preview, state="disabled")
+        self.preview_button.grid(row=4, column=1, pady=(20, 0))
+        
+        # グラフ表示ボタン
+        self.chart_button = ttk.Button(data_frame, text="グラフ表示", 
+                                      command=self.show_chart, state="disabled")
+        self.chart_button.grid(row=4, column=2, pady=(20, 0), padx=(10, 0))
+        
+        # 取得の進捗（期間ごと）
+        self.fetch_progress = ttk.Progressbar(data_frame, mode="determinate")
+        self.fetch_progress.grid(row=5, column=0, columnspan=2, sticky=(tk.W, tk.E), pady=(10, 0))
+        self.fetch_progress_var = tk.StringVar(value="")
+        ttk.Label(data_frame, textvariable=self.fetch_progress_var).grid(row=5, column=2, sticky=tk.W,
+                                                                         padx=(10, 0), pady=(10, 0))
         
         # 保存セクション
         save_frame = ttk.LabelFrame(main_frame, text="3. データ保存", padding="10")
@@ -146,7 +245,7 @@ class HealthPlanetGUI:
         self.filename_var = tk.StringVar()
         filename_entry = ttk.Entry(filename_frame, textvariable=self.filename_var, width=30)
         filename_entry.grid(row=0, column=1, padx=(10, 5))
-        ttk.Label(filename_frame, text=".csv").grid(row=0, column=2)
+        ttk.Label(filename_frame, text="（拡張子は形式ごと）").grid(row=0, column=2)
         
         self.auto_filename_var = tk.BooleanVar(value=True)
         auto_check = ttk.Checkbutton(filename_frame, text="自動生成", 
@@ -156,10 +255,27 @@ class HealthPlanetGUI:
         
         self.toggle_filename_entry()
         
+        # 保存形式（選択した形式をまとめて並行に書き出す）
+        format_frame = ttk.Frame(save_frame)
+        format_frame.grid(row=2, column=0, columnspan=2, sticky=tk.W, pady=(10, 0))
+        
+        ttk.Label(format_frame, text="形式:").grid(row=0, column=0, sticky=tk.W)
+        self.format_vars = {}
+        for column, (fmt, label) in enumerate(SAVE_FORMATS, start=1):
+            self.format_vars[fmt] = tk.BooleanVar(value=fmt == 'csv')
+            ttk.Checkbutton(format_frame, text=label,
+                           variable=self.format_vars[fmt]).grid(row=0, column=column, padx=(10, 0))
+        
+        # 週・月ごとの集計（ローカルストアで更新済み）
+        self.save_rollups_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(save_frame, text="週・月ごとの集計も保存（CSV）",
+                       variable=self.save_rollups_var).grid(row=3, column=0, columnspan=2,
+                                                            sticky=tk.W, pady=(10, 0))
+        
         # 保存ボタン
-        self.save_button = ttk.Button(save_frame, text="CSVファイルに保存", 
+        self.save_button = ttk.Button(save_frame, text="ファイルに保存", 
                                      command=self.save_data, state="disabled")
-        self.save_button.grid(row=2, column=0, columnspan=2, pady=(20, 0))
+        self.save_button.grid(row=4, column=0, columnspan=2, pady=(20, 0))
         
         # ログ表示エリア
         log_frame = ttk.LabelFrame(main_frame, text="ログ", padding="10")
@@ -183,6 +299,19 @@ class HealthPlanetGUI:
         clear_button = ttk.Button(log_frame, text="ログクリア", command=self.clear_log)
         clear_button.grid(row=1, column=0, pady=(10, 0))
         
+        # 処理時間の内訳（有効にしたときだけ計測する）
+        trace_frame = ttk.Frame(log_frame)
+        trace_frame.grid(row=2, column=0, sticky=tk.W, pady=(10, 0))
+        self.trace_var = tk.BooleanVar(value=tracing.is_enabled())
+        ttk.Checkbutton(trace_frame, text="処理時間の内訳を表示", variable=self.trace_var,
+                        command=self.toggle_trace).grid(row=0, column=0)
+        ttk.Button(trace_frame, text="トレース保存", command=self.save_trace).grid(row=0, column=1, padx=(10, 0))
+        
+        self.trace_label = ttk.Label(log_frame, font=("Courier", 9), justify=tk.LEFT)
+        self.trace_label.grid(row=3, column=0, sticky=tk.W, pady=(5, 0))
+        self.trace_refresh_id = None
+        self.toggle_trace()
+        
         # ウィンドウのリサイズ設定
         main_frame.columnconfigure(0, weight=1)
         main_frame.rowconfigure(4, weight=1)
@@ -192,24 +321,118 @@ class HealthPlanetGUI:
         self.root.columnconfigure(0, weight=1)
         self.root.rowconfigure(0, weight=1)
         
-        # 初期状態設定
-        if not self.api_ready:
-            self.auth_button.config(state="disabled")
-        
         # 取得したデータを保存
         self.current_data = None
+        self.fetch_job = None
+        self.preview_window = None
+        self.preview = None
+        self.chart_window = None
+        self.chart = None
+    
+    def post(self, callback, *args):
+        """UIの操作をメインスレッドで実行するよう依頼（どのスレッドからでも呼べる）"""
+        self.events.put((callback, args))
+    
+    def process_events(self):
+        """キューに溜まったイベントをまとめて処理し、ログを一括で描画"""
+        try:
+            if not self.events.empty():
+                with tracing.span('ui_update') as span:
+                    span.set(rows=self.handle_events())
+                    self.flush_log()
+        finally:
+            self.root.after(EVENT_POLL_MS, self.process_events)
+    
+    def handle_events(self):
+        """イベントを上限件数まで処理し、処理した件数を返す"""
+        count = 0
+        for _ in range(MAX_EVENTS_PER_POLL):
+            try:
+                callback, args = self.events.get_nowait()
+            except queue.Empty:
+                break
+            try:
+                callback(*args)
+            except Exception as e:
+                self.pending_log_lines.append(f"UI更新エラー: {str(e)}")
+            count += 1
+        return count
     
     def log_message(self, message):
-        """ログメッセージを表示"""
+        """ログメッセージを表示（どのスレッドからでも呼べる）"""
         timestamp = datetime.now().strftime("%H:%M:%S")
-        self.log_text.insert(tk.END, f"[{timestamp}] {message}\n")
+        self.post(self.append_log_line, f"[{timestamp}] {message}")
+    
+    def append_log_line(self, line):
+        """描画待ちのログに1行追加（メインスレッドで呼ぶ）
+        
+        flush_logで入れ替えた後のリストに追加するよう、実行時に参照する。
+        """
+        self.pending_log_lines.append(line)
+    
+    def flush_log(self):
+        """溜まったログを1回の挿入で描画し、古い行を削除"""
+        if not self.pending_log_lines:
+            return
+        
+        lines = self.pending_log_lines[-LOG_MAX_LINES:]
+        self.pending_log_lines = []
+        self.log_text.insert(tk.END, "\n".join(lines) + "\n")
+        
+        line_count = int(self.log_text.index('end-1c').split('.')[0]) - 1
+        if line_count > LOG_MAX_LINES:
+            self.log_text.delete('1.0', f"{line_count - LOG_MAX_LINES + 1}.0")
         self.log_text.see(tk.END)
-        self.root.update()
     
     def clear_log(self):
         """ログをクリア"""
         self.log_text.delete(1.0, tk.END)
     
+    def toggle_trace(self):
+        """処理時間の計測と内訳の表示を切り替え"""
+        if self.trace_var.get():
+            tracing.enable()
+            self.trace_label.grid()
+            if self.trace_refresh_id is None:
+                self.refresh_trace()
+        else:
+            self.trace_label.grid_remove()
+            if self.trace_refresh_id is not None:
+                self.root.after_cancel(self.trace_refresh_id)
+                self.trace_refresh_id = None
+            # 環境変数で有効にした場合は終了時に書き出すため記録を続ける
+            if not os.getenv(tracing.TRACE_ENV_VAR):
+                tracing.disable()
+    
+    def refresh_trace(self):
+        """直近の操作の処理別の時間を表示"""
+        tracer = tracing.get_tracer()
+        lines = []
+        if tracer is not None and tracer.operation:
+            lines.append(f"直近の操作: {tracer.operation_names[tracer.operation]}")
+            for stage in tracer.breakdown()[:12]:
+                line = f"{stage['name']:<16}{stage['duration_ms']:>10.1f}ms  {stage['count']:>5}回"
+                if stage['rows']:
+                    line += f"  {stage['rows']}行"
+                if stage['bytes']:
+                    line += f"  {stage['bytes'] / 1024:.0f}KB"
+                lines.append(line)
+        self.trace_label.config(text="\n".join(lines) or "計測中（データ取得・保存の内訳を表示します）")
+        self.trace_refresh_id = self.root.after(TRACE_REFRESH_MS, self.refresh_trace)
+    
+    def save_trace(self):
+        """記録した処理時間をファイルに書き出す"""
+        if not tracing.is_enabled():
+            messagebox.showerror("エラー", "先に「処理時間の内訳を表示」を有効にしてください")
+            return
+        
+        path = filedialog.asksaveasfilename(
+            defaultextension=".json",
+            filetypes=[("Chromeトレース", "*.json"), ("JSON Lines", "*.jsonl")])
+        if path:
+            tracing.export(path)
+            self.log_message(f"トレースを保存しました: {path}")
+    
     def toggle_period_widgets(self):
         """期間選択方式に応じてウィジェットの表示/非表示を切り替え"""
         if self.period_mode.get() == "days":
@@ -220,11 +443,27 @@ class HealthPlanetGUI:
                 widget.config(state="disabled")
         else:
             # 期間指定の場合
+            if self.from_date is None:
+                self.create_date_entries()
             for widget in self.days_frame.winfo_children():
                 widget.config(state="disabled")
             for widget in self.range_frame.winfo_children():
                 widget.config(state="normal")
     
+    def create_date_entries(self):
+        """期間指定のカレンダーを作成"""
+        from tkcalendar import DateEntry
+        
+        self.from_date = DateEntry(self.range_frame, width=12, 
+                                   background='darkblue', foreground='white', 
+                                   borderwidth=2, date_pattern='yyyy-mm-dd')
+        self.from_date.grid(row=0, column=1, padx=(10, 20))
+        
+        self.to_date = DateEntry(self.range_frame, width=12, 
+                                 background='darkblue', foreground='white', 
+                                 borderwidth=2, date_pattern='yyyy-mm-dd')
+        self.to_date.grid(row=0, column=3, padx=(10, 0))
+    
     def toggle_filename_entry(self):
         """ファイル名自動生成のチェックボックスに応じて入力欄を制御"""
         if self.auto_filename_var.get():
@@ -276,105 +515,257 @@ class HealthPlanetGUI:
                 token = self.api.get_access_token(auth_code)
                 
                 if token:
-                    self.access_token = token
-                    self.auth_status_var.set("認証完了")
-                    self.auth_status_var.trace_add('write', lambda *args: 
-                        self.root.nametowidget('').winfo_children()[0].nametowidget('!labelframe').winfo_children()[-1].config(foreground="green"))
-                    self.fetch_button.config(state="normal")
+                    self.post(self.set_authenticated, token)
                     self.log_message("アクセストークンの取得に成功しました")
-                    messagebox.showinfo("成功", "認証が完了しました！")
+                    self.post(messagebox.showinfo, "成功", "認証が完了しました！")
                 else:
                     self.log_message("アクセストークンの取得に失敗しました")
-                    messagebox.showerror("エラー", "アクセストークンの取得に失敗しました")
+                    self.post(messagebox.showerror, "エラー", "アクセストークンの取得に失敗しました")
             
             except Exception as e:
                 self.log_message(f"認証エラー: {str(e)}")
-                messagebox.showerror("エラー", f"認証に失敗しました：\n{str(e)}")
+                self.post(messagebox.showerror, "エラー", f"認証に失敗しました：\n{str(e)}")
         
         # 別スレッドで実行
         threading.Thread(target=fetch_token, daemon=True).start()
     
     def fetch_data(self):
-        """データを取得"""
+        """データを取得（取得中に押した場合は中止するか続けるかを選ぶ）"""
+        if self.fetch_job is not None:
+            # 同じ取得を重ねて開始せず、実行中のジョブを中止するか待つ
+            if messagebox.askyesno("取得中", "データを取得中です。中止しますか？\n（「いいえ」で取得を続けます）"):
+                job = self.fetch_job
+                job.cancel()
+                self.finish_fetch(job)
+                self.log_message("データ取得を中止しました")
+            return
+        
         if not self.access_token:
             messagebox.showerror("エラー", "先に認証を完了してください")
             return
         
-        def fetch():
+        # ウィジェットの値はメインスレッドで読み取ってからワーカーに渡す
+        if self.period_mode.get() == "days":
             try:
-                self.fetch_button.config(state="disabled")
-                
-                if self.period_mode.get() == "days":
-                    days_back = int(self.days_var.get())
-                    self.log_message(f"過去{days_back}日分のデータを取得中...")
-                    data = self.api.get_body_composition_data(days_back=days_back)
-                else:
-                    from_date = self.from_date.get_date().strftime("%Y-%m-%d")
-                    to_date = self.to_date.get_date().strftime("%Y-%m-%d")
-                    self.log_message(f"{from_date} ～ {to_date} のデータを取得中...")
-                    data = self.api.get_body_composition_data(from_date=from_date, to_date=to_date)
-                
-                if data and 'data' in data and data['data']:
-                    self.current_data = data
-                    data_count = len(data['data']) // 2  # 体重と体脂肪率でペアなので半分
-                    self.log_message(f"データ取得完了: {data_count}日分")
-                    self.save_button.config(state="normal")
-                    messagebox.showinfo("成功", f"{data_count}日分のデータを取得しました！")
-                else:
-                    self.log_message("指定期間にデータが見つかりませんでした")
-                    messagebox.showwarning("警告", "指定期間にデータが見つかりませんでした")
-                
-            except Exception as e:
-                self.log_message(f"データ取得エラー: {str(e)}")
-                messagebox.showerror("エラー", f"データ取得に失敗しました：\n{str(e)}")
-            
-            finally:
-                self.fetch_button.config(state="normal")
+                days_back = int(self.days_var.get())
+            except ValueError:
+                days_back = 0
+            if not 1 <= days_back <= MAX_DAYS_BACK:
+                self.log_message(f"取得日数が正しくありません: {self.days_var.get()}")
+                messagebox.showerror("エラー", f"取得日数は1～{MAX_DAYS_BACK}の整数で入力してください")
+                return
+            message = f"過去{days_back}日分のデータを取得中..."
+            # 日単位にそろえ、取得し直しても同じ期間（同じリクエスト）になるようにする
+            today = datetime.now().date()
+            from_date = (today - timedelta(days=days_back)).strftime("%Y-%m-%d")
+            to_date = today.strftime("%Y-%m-%d")
+        else:
+            from_date = self.from_date.get_date().strftime("%Y-%m-%d")
+            to_date = self.to_date.get_date().strftime("%Y-%m-%d")
+            message = f"{from_date} ～ {to_date} のデータを取得中..."
+        all_tags = self.all_tags_var.get()
+        
+        self.log_message(message)
+        self.fetch_job = FetchJob(
+            self.api, self.store, from_date, to_date,
+            tags=ALL_TAGS if all_tags else DEFAULT_TAGS,
+            dataset_tags=None if all_tags else DEFAULT_TAGS,
+            previous=self.current_data,
+            on_progress=lambda job, done, total: self.post(self.update_fetch_progress, job, done, total),
+            on_partial=lambda job, dataset: self.post(self.set_current_data, dataset, job),
+            on_done=self.fetch_done,
+        )
+        self.fetch_button.config(text="取得を中止")
+        self.fetch_progress.config(value=0, maximum=1)
+        self.fetch_progress_var.set("")
+        self.fetch_job.start()
+    
+    def fetch_done(self, job):
+        """取得ジョブの終了（ワーカースレッドで呼ばれる）"""
+        if job.cancelled:
+            return
+        
+        dataset = job.result
+        if job.error is not None:
+            self.log_message(f"データ取得エラー: {str(job.error)}")
+            self.post(messagebox.showerror, "エラー", f"データ取得に失敗しました：\n{str(job.error)}")
+        elif job.changed is None:
+            self.log_message("データ取得に失敗しました（取得できた期間までを表示しています）")
+            self.post(messagebox.showerror, "エラー", "データ取得に失敗しました")
+        elif dataset is not None:
+            # 1回の取得につき1度だけ解析し、保存・表示で共有する
+            data_count = len(dataset)
+            self.post(self.set_current_data, dataset, job)
+            self.log_message(f"データ取得完了: {data_count}件")
+            for line in self.exporter.summary_lines(dataset):
+                self.log_message(line)
+            self.post(messagebox.showinfo, "成功", f"{data_count}件のデータを取得しました！")
+        else:
+            self.log_message("指定期間にデータが見つかりませんでした")
+            self.post(messagebox.showwarning, "警告", "指定期間にデータが見つかりませんでした")
+        
+        self.post(self.finish_fetch, job)
+    
+    def update_fetch_progress(self, job, done, total):
+        """取得済みの期間数を表示（メインスレッドで呼ぶ）"""
+        if job is not self.fetch_job:
+            return
+        self.fetch_progress.config(value=done, maximum=max(total, 1))
+        self.fetch_progress_var.set(f"{done}/{total}期間")
+    
+    def finish_fetch(self, job):
+        """取得ボタンを元に戻す（中止・終了したジョブに対して1度だけ、メインスレッドで呼ぶ）"""
+        if job is not self.fetch_job:
+            return
+        self.fetch_job = None
+        self.fetch_button.config(text="データ取得")
+        if job.cancelled:
+            self.fetch_progress_var.set("中止")
+    
+    def set_current_data(self, dataset, job=None):
+        """取得したデータを保持し、保存を有効化（メインスレッドで呼ぶ）
+        
+        jobを指定した場合、中止済みのジョブからのデータは無視する。
+        """
+        if job is not None and job is not self.fetch_job:
+            return
+        self.current_data = dataset
+        self.save_button.config(state="normal")
+        self.preview_button.config(state="normal")
+        self.chart_button.config(state="normal")
+        if self.preview is not None:
+            self.preview.set_dataset(dataset)
+        if self.chart is not None:
+            self.chart.set_dataset(dataset)
+    
+    def show_preview(self):
+        """取得したデータをプレビュー表で表示"""
+        if not self.current_data:
+            messagebox.showerror("エラー", "表示するデータがありません")
+            return
+        
+        if self.preview_window is not None and self.preview_window.winfo_exists():
+            self.preview_window.lift()
+            return
         
-        threading.Thread(target=fetch, daemon=True).start()
+        self.preview_window = tk.Toplevel(self.root)
+        self.preview_window.title("データプレビュー")
+        self.preview_window.geometry("700x500")
+        from preview_table import DataPreview
+        self.preview = DataPreview(self.preview_window, self.current_data, padding="10")
+        self.preview.pack(fill=tk.BOTH, expand=True)
+        self.preview_window.protocol("WM_DELETE_WINDOW", self.close_preview)
+    
+    def close_preview(self):
+        self.preview_window.destroy()
+        self.preview_window = None
+        self.preview = None
+    
+    def show_chart(self):
+        """取得したデータの推移をグラフで表示"""
+        if not self.current_data:
+            messagebox.showerror("エラー", "表示するデータがありません")
+            return
+        
+        if self.chart_window is not None and self.chart_window.winfo_exists():
+            self.chart_window.lift()
+            return
+        
+        self.chart_window = tk.Toplevel(self.root)
+        self.chart_window.title("推移グラフ")
+        self.chart_window.geometry("800x550")
+        try:
+            from trend_chart import TrendChart
+            self.chart = TrendChart(self.chart_window, padding="10")
+        except ImportError:
+            self.close_chart()
+            messagebox.showerror("エラー", "グラフ表示にはmatplotlibが必要です: pip install matplotlib")
+            return
+        self.chart.pack(fill=tk.BOTH, expand=True)
+        # ウィンドウの大きさが決まってから描画する（間引く点数が横幅で決まるため）
+        self.chart_window.update_idletasks()
+        self.chart.set_dataset(self.current_data)
+        self.chart_window.protocol("WM_DELETE_WINDOW", self.close_chart)
+    
+    def close_chart(self):
+        self.chart_window.destroy()
+        self.chart_window = None
+        self.chart = None
     
     def save_data(self):
-        """データをCSVファイルに保存"""
+        """選択した形式でデータを保存（書き出しはバックグラウンドで実行）"""
         if not self.current_data:
             messagebox.showerror("エラー", "保存するデータがありません")
             return
         
-        try:
-            save_path = self.save_path_var.get()
-            
-            if self.auto_filename_var.get():
-                filename = None  # 自動生成
-            else:
-                filename = self.filename_var.get().strip()
-                if not filename:
-                    messagebox.showerror("エラー", "ファイル名を入力してください")
-                    return
-                if not filename.endswith('.csv'):
-                    filename += '.csv'
-            
-            # 保存先ディレクトリを作成
-            if not os.path.exists(save_path):
-                os.makedirs(save_path)
-            
-            # 一時的にdata_dirを変更
-            original_data_dir = self.exporter.data_dir
-            self.exporter.data_dir = save_path
+        formats = [fmt for fmt, _ in SAVE_FORMATS if self.format_vars[fmt].get()]
+        if not formats:
+            messagebox.showerror("エラー", "保存する形式を選択してください")
+            return
+        
+        save_path = self.save_path_var.get()
+        
+        if self.auto_filename_var.get():
+            basename = None  # 自動生成
+        else:
+            basename = self.filename_var.get().strip()
+            if not basename:
+                messagebox.showerror("エラー", "ファイル名を入力してください")
+                return
+            root, ext = os.path.splitext(basename)
+            if ext.lower() in ('.csv', '.xlsx', '.jsonl'):
+                basename = root
+        
+        dataset = self.current_data
+        save_rollups = self.save_rollups_var.get()
+        self.save_button.config(state="disabled")
+        
+        def save():
+            # 保存中に変更されないよう、保存先ごとにエクスポーターを用意
+            from data_exporter import HealthDataExporter
             
             try:
-                filepath = self.exporter.save_to_csv(self.current_data, filename)
-                if filepath:
-                    self.log_message(f"CSVファイルに保存しました: {filepath}")
-                    messagebox.showinfo("成功", f"CSVファイルに保存しました：\n{filepath}")
+                # 保存先ディレクトリを作成
+                if not os.path.exists(save_path):
+                    os.makedirs(save_path)
+                
+                exporter = HealthDataExporter()
+                exporter.data_dir = save_path
+                
+                with tracing.operation('save'):
+                    results = exporter.export(dataset, formats, basename) or {}
+                    if save_rollups and results.get(formats[0], {}).get('path'):
+                        for granularity in ('week', 'month'):
+                            rollup_name = f"{basename}_{granularity}.csv" if basename else None
+                            rollup_path = exporter.save_rollups_to_csv(self.store, granularity, rollup_name)
+                            if rollup_path:
+                                self.log_message(f"集計を保存しました: {rollup_path}")
+                
+                saved = []
+                failed = []
+                for fmt in formats:
+                    result = results.get(fmt)
+                    if result and result['path']:
+                        saved.append(result['path'])
+                        self.log_message(f"保存しました: {result['path']}"
+                                         f"（{result['seconds']:.2f}秒, {result['bytes'] / 1024:.0f}KB）")
+                    else:
+                        failed.append(fmt)
+                        self.log_message(f"{fmt}形式での保存に失敗しました")
+                
+                if failed:
+                    self.post(messagebox.showerror, "エラー", f"保存に失敗した形式があります：\n{', '.join(failed)}")
                 else:
-                    self.log_message("CSVファイルの保存に失敗しました")
-                    messagebox.showerror("エラー", "CSVファイルの保存に失敗しました")
-            finally:
-                # data_dirを元に戻す
-                self.exporter.data_dir = original_data_dir
+                    self.post(messagebox.showinfo, "成功", "保存しました：\n" + "\n".join(saved))
+                
+            except Exception as e:
+                self.log_message(f"保存エラー: {str(e)}")
+                self.post(messagebox.showerror, "エラー", f"保存に失敗しました：\n{str(e)}")
             
-        except Exception as e:
-            self.log_message(f"保存エラー: {str(e)}")
-            messagebox.showerror("エラー", f"保存に失敗しました：\n{str(e)}")
+            finally:
+                self.post(self.save_button.config, {"state": "normal"})
+        
+        threading.Thread(target=save, daemon=True).start()
 
 def main():
     # メインウィンドウを作成
@@ -0,0 +1,104 @@
+import tracing
+from health_stats import HealthStats
+
+
+class HealthDataset:
+    """1回の取得につき1度だけ解析した測定データ
+
+    列指向の測定データとユーザー情報を保持し、展開済みの表や統計などの
+    派生データは初回参照時に計算してキャッシュする。
+    解析処理（pandas）は初めて解析するときに読み込む。
+    """
+
+    __slots__ = ('frame', 'user_info', 'tags', '_wide', '_measurements', '_stats')
+
+    def __init__(self, frame, user_info=None, tags=None):
+        self.frame = frame
+        self.user_info = user_info or {'birth_date': None, 'height': None, 'sex': None}
+        # 展開する測定項目（Noneならデータに含まれる項目すべて）
+        self.tags = tags
+        self._wide = None
+        self._measurements = None
+        self._stats = None
+
+    @classmethod
+    def from_raw(cls, raw_data, tags=None):
+        """APIレスポンスから作成（データがなければNone）"""
+        if not raw_data or 'data' not in raw_data:
+            return None
+
+        from innerscan_parser import parse_innerscan
+
+        with tracing.span('parse', rows=len(raw_data['data'] or [])):
+            frame = parse_innerscan(raw_data)
+        return cls(frame, {
+            'birth_date': raw_data.get('birth_date'),
+            'height': raw_data.get('height'),
+            'sex': raw_data.get('sex')
+        }, tags)
+
+    def __len__(self):
+        return len(self.wide)
+
+    @property
+    def wide(self):
+        """測定日時・機器ごとに1行の表（新しい順）"""
+        if self._wide is None:
+            from innerscan_parser import pivot_measurements
+
+            with tracing.span('pivot', rows=len(self.frame)):
+                self._wide = pivot_measurements(self.frame, self.tags)
+        return self._wide
+
+    @property
+    def value_names(self):
+        """測定項目の列名（weight, body_fat, ...）"""
+        from innerscan_parser import value_names
+
+        return value_names(self.wide)
+
+    @property
+    def measurements(self):
+        """測定データの辞書リスト（新しい順）"""
+        if self._measurements is None:
+            from innerscan_parser import to_measurement_records
+
+            wide = self.wide
+            with tracing.span('to_records', rows=len(wide)):
+                self._measurements = to_measurement_records(wide)
+        return self._measurements
+
+    @property
+    def stats(self):
+        """項目ごとの統計（移動平均・平滑値・週あたりの変化量など）"""
+        if self._stats is None:
+            wide = self.wide
+            with tracing.span('stats', rows=len(wide)):
+                self._stats = HealthStats.from_wide(wide, self.value_names)
+        return self._stats
+
+    @property
+    def summary(self):
+        """項目ごとの最新値・平均・範囲と測定期間"""
+        return self.stats.summary()
+
+    def adopt_stats(self, previous):
+        """前回のデータセットの統計を引き継ぎ、増えた測定だけを追加する
+
+        同じ履歴に新しい測定が追加されただけの場合に限り引き継ぐ。
+        引き継げなかった場合は初回参照時に一括で計算する。
+        """
+        if previous is None or previous._stats is None or self._stats is not None:
+            return False
+        if previous._stats.names != self.value_names:
+            return False
+        wide = self.wide
+        with tracing.span('stats_update', rows=len(wide)):
+            if not previous._stats.update(wide):
+                return False
+        self._stats, previous._stats = previous._stats, None
+        return True
+
+    def to_parsed(self):
+        """parse_health_dataと同じ形式で返す"""
+        return {'measurements': self.measurements, 'user_info': self.user_info}
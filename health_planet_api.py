@@ -1,10 +1,219 @@
 import requests
 import json
 import os
-from datetime import datetime, timedelta
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from datetime import date, datetime, timedelta
+
+from requests.adapters import HTTPAdapter
+
+import tracing
+from innerscan_tags import DEFAULT_TAGS as DEFAULT_TAG_SET, format_tags
+
+# APIエンドポイント
+AUTH_URL = "https://www.healthplanet.jp/oauth/auth"
+TOKEN_URL = "https://www.healthplanet.jp/oauth/token"
+INNERSCAN_URL = "https://www.healthplanet.jp/status/innerscan.json"
+REDIRECT_URI = "https://www.healthplanet.jp/success.html"
+DEFAULT_TAGS = format_tags(DEFAULT_TAG_SET)  # 体重と体脂肪率
+
+# APIで1回に取得できる最大期間（3ヶ月）
+MAX_WINDOW_DAYS = 90
+# ウィンドウの区切りの基準日（ここからMAX_WINDOW_DAYSごとに区切る）
+WINDOW_EPOCH = datetime(2000, 1, 1)
+# 期間一括取得時の同時リクエスト数
+DEFAULT_MAX_WORKERS = 4
+
+# HTTP接続の設定
+DEFAULT_POOL_SIZE = 8
+DEFAULT_TIMEOUT = (5, 30)  # (接続, 読み込み) 秒
+DEFAULT_MAX_RETRIES = 3
+DEFAULT_BACKOFF = 0.5  # 秒
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+# APIの利用制限: 1時間あたり60回
+DEFAULT_RATE_LIMIT = 60
+RATE_LIMIT_PERIOD = 3600  # 秒
+# 有効期限のこの秒数前になったらトークンを更新する
+TOKEN_REFRESH_MARGIN = 24 * 3600
+
+
+def to_datetime(value, end_of_day=False):
+    """datetime / date / 'YYYY-MM-DD' 文字列をdatetimeに変換"""
+    if isinstance(value, datetime):
+        return value
+    if isinstance(value, date):
+        value = datetime(value.year, value.month, value.day)
+    elif isinstance(value, str):
+        value = datetime.strptime(value.strip(), "%Y-%m-%d")
+    else:
+        raise TypeError(f"日付として解釈できません: {value!r}")
+    if end_of_day:
+        value = value.replace(hour=23, minute=59, second=59)
+    return value
+
+
+def split_date_range(from_date, to_date, window_days=MAX_WINDOW_DAYS):
+    """期間をAPIで取得可能な長さのウィンドウ（from, to）に分割
+    
+    ウィンドウはWINDOW_EPOCHからwindow_days日ごとの固定の区切りにそろえる（両端は期間で切る）。
+    開始日が違う取得でも、途中の過去のウィンドウは同じ条件（同じキャッシュキー）になる。
+    """
+    windows = []
+    start = from_date
+    step = timedelta(days=window_days)
+    while start <= to_date:
+        boundary = WINDOW_EPOCH + step * ((start - WINDOW_EPOCH) // step + 1)
+        end = min(boundary - timedelta(seconds=1), to_date)
+        windows.append((start, end))
+        start = end + timedelta(seconds=1)
+    return windows
+
+
+def merge_innerscan_data(payloads):
+    """複数ウィンドウのレスポンスを結合し、重複を除いて日付順に並べる"""
+    merged = None
+    seen = set()
+    items = []
+    for payload in payloads:
+        if not payload:
+            continue
+        if merged is None:
+            merged = {k: v for k, v in payload.items() if k != 'data'}
+        for item in payload.get('data') or []:
+            key = (item.get('date'), item.get('tag'), item.get('model'))
+            if key in seen:
+                continue
+            seen.add(key)
+            items.append(item)
+    if merged is None:
+        return None
+    items.sort(key=lambda x: x.get('date', ''))
+    merged['data'] = items
+    return merged
+
+
+_credentials = None
+_credentials_lock = threading.Lock()
+
+
+def load_credentials(refresh=False):
+    """認証情報を読み込む（見つかった結果はプロセス内で再利用する）
+    
+    refresh=Trueの場合は設定ファイルなどを読み直す。
+    """
+    global _credentials
+    with _credentials_lock:
+        if _credentials is None or refresh:
+            _credentials = discover_credentials()
+        return _credentials
+
+
+def discover_credentials():
+    """認証情報を環境変数・config.json・.envの順に読み込み"""
+    # 環境変数から読み込み
+    client_id = os.getenv('HEALTH_PLANET_CLIENT_ID')
+    client_secret = os.getenv('HEALTH_PLANET_CLIENT_SECRET')
+
+    if client_id and client_secret:
+        print("環境変数から認証情報を読み込みました")
+        return client_id, client_secret
+
+    # config.jsonファイルから読み込み
+    try:
+        with open('config.json', 'r', encoding='utf-8') as f:
+            config = json.load(f)
+            client_id = config.get('client_id')
+            client_secret = config.get('client_secret')
+
+            if client_id and client_secret and client_id != "YOUR_CLIENT_ID":
+                print("config.jsonから認証情報を読み込みました")
+                return client_id, client_secret
+    except FileNotFoundError:
+        print("config.jsonファイルが見つかりません")
+    except json.JSONDecodeError:
+        print("config.jsonの形式が正しくありません")
+
+    # .envファイルから読み込み
+    try:
+        from dotenv import load_dotenv
+        load_dotenv()
+
+        client_id = os.getenv('HEALTH_PLANET_CLIENT_ID')
+        client_secret = os.getenv('HEALTH_PLANET_CLIENT_SECRET')
+
+        if client_id and client_secret:
+            print(".envファイルから認証情報を読み込みました")
+            return client_id, client_secret
+    except ImportError:
+        pass
+
+    raise ValueError("認証情報が見つかりません")
+
+
+class RateLimiter:
+    """トークンバケット方式のレート制限（スレッドセーフ）"""
+
+    def __init__(self, rate=DEFAULT_RATE_LIMIT, period=RATE_LIMIT_PERIOD):
+        self.period = period
+        self.capacity = rate
+        self.fill_rate = rate / period
+        self.tokens = float(rate)
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def set_rate(self, rate):
+        """期間あたりの上限を変更（使用済みの枠は引き継ぐ）"""
+        with self.lock:
+            self.tokens = min(float(rate), self.tokens + rate - self.capacity)
+            self.capacity = rate
+            self.fill_rate = rate / self.period
+
+    def reserve(self):
+        """リクエスト1回分の枠を予約し、送信まで待つべき秒数を返す"""
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.fill_rate)
+            self.updated = now
+            self.tokens -= 1
+            if self.tokens >= 0:
+                return 0.0
+            return -self.tokens / self.fill_rate
+
+    def acquire(self):
+        """リクエスト1回分の枠を確保し、待機した秒数を返す"""
+        wait = self.reserve()
+        if wait:
+            time.sleep(wait)
+        return wait
+
+
+_rate_limiters = {}
+_rate_limiters_lock = threading.Lock()
+
+
+def get_rate_limiter(account, rate=DEFAULT_RATE_LIMIT):
+    """アカウントごとに共有されるレート制限を取得
+    
+    既存のレート制限と上限が異なる場合は、指定された上限に変更する。
+    """
+    with _rate_limiters_lock:
+        limiter = _rate_limiters.get(account)
+        if limiter is None:
+            limiter = _rate_limiters[account] = RateLimiter(rate)
+        elif limiter.capacity != rate:
+            limiter.set_rate(rate)
+        return limiter
+
 
 class HealthPlanetAPI:
-    def __init__(self, client_id=None, client_secret=None):
+    def __init__(self, client_id=None, client_secret=None, account="default",
+                 pool_size=DEFAULT_POOL_SIZE, timeout=DEFAULT_TIMEOUT,
+                 max_retries=DEFAULT_MAX_RETRIES, backoff=DEFAULT_BACKOFF,
+                 rate_limit=DEFAULT_RATE_LIMIT, cache=None, token_store=None, tags=None,
+                 archive=None):
         if client_id and client_secret:
             self.client_id = client_id
             self.client_secret = client_secret
@@ -12,53 +221,45 @@ class HealthPlanetAPI:
             self.client_id, self.client_secret = self._load_credentials()
         
         self.access_token = None
+        self.refresh_token = None
+        self.token_expires_at = None  # エポック秒
+        self.account = account
+        # トークンの保存先（TokenStore、任意）と更新処理の排他制御
+        self.token_store = token_store
+        self._token_lock = threading.Lock()
+        # 取得する測定項目（1回のリクエストでまとめて取得）と日付の指定方法（1: 測定日付）
+        self.tags = format_tags(tags) if tags else DEFAULT_TAGS
+        self.date_mode = '1'
+        # レスポンスキャッシュ（ResponseCache、任意）
+        self.cache = cache
+        # 取得したレスポンスをそのまま保存するアーカイブ（RawArchive、任意）
+        self.archive = archive
+        # 実行中のリクエスト（同じウィンドウの取得は1回のリクエストを共有する）
+        self._inflight = {}
+        self._inflight_lock = threading.Lock()
+        
+        # 接続を再利用するHTTPセッション
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.rate_limiter = get_rate_limiter(account, rate_limit) if rate_limit else None
+        
+        # リクエストごとの計測結果（直近1000件）
+        self.request_stats = deque(maxlen=1000)
         
         # APIエンドポイント
-        self.auth_url = "https://www.healthplanet.jp/oauth/auth"
-        self.token_url = "https://www.healthplanet.jp/oauth/token"
-        self.innerscan_url = "https://www.healthplanet.jp/status/innerscan.json"
-        self.redirect_uri = "https://www.healthplanet.jp/success.html"
+        self.auth_url = AUTH_URL
+        self.token_url = TOKEN_URL
+        self.innerscan_url = INNERSCAN_URL
+        self.redirect_uri = REDIRECT_URI
     
     def _load_credentials(self):
         """設定を複数の方法で読み込み"""
-        # 環境変数から読み込み
-        client_id = os.getenv('HEALTH_PLANET_CLIENT_ID')
-        client_secret = os.getenv('HEALTH_PLANET_CLIENT_SECRET')
-        
-        if client_id and client_secret:
-            print("環境変数から認証情報を読み込みました")
-            return client_id, client_secret
-        
-        # config.jsonファイルから読み込み
-        try:
-            with open('config.json', 'r', encoding='utf-8') as f:
-                config = json.load(f)
-                client_id = config.get('client_id')
-                client_secret = config.get('client_secret')
-                
-                if client_id and client_secret and client_id != "YOUR_CLIENT_ID":
-                    print("config.jsonから認証情報を読み込みました")
-                    return client_id, client_secret
-        except FileNotFoundError:
-            print("config.jsonファイルが見つかりません")
-        except json.JSONDecodeError:
-            print("config.jsonの形式が正しくありません")
-        
-        # .envファイルから読み込み
-        try:
-            from dotenv import load_dotenv
-            load_dotenv()
-            
-            client_id = os.getenv('HEALTH_PLANET_CLIENT_ID')
-            client_secret = os.getenv('HEALTH_PLANET_CLIENT_SECRET')
-            
-            if client_id and client_secret:
-                print(".envファイルから認証情報を読み込みました")
-                return client_id, client_secret
-        except ImportError:
-            pass
-        
-        raise ValueError("認証情報が見つかりません")
+        return load_credentials()
     
     def get_authorization_url(self):
         """認証URLを生成"""
@@ -85,11 +286,11 @@ class HealthPlanetAPI:
         }
         
         try:
-            response = requests.post(self.token_url, data=data)
+            # 認証コードは1回しか使えないため、失敗しても再試行しない
+            response = self._request('POST', self.token_url, retry=False, data=data)
             response.raise_for_status()
             
-            token_data = response.json()
-            self.access_token = token_data['access_token']
+            self._set_token(response.json())
             
             return self.access_token
             
@@ -97,33 +298,294 @@ class HealthPlanetAPI:
             print(f"アクセストークンの取得に失敗しました: {e}")
             return None
     
-    def get_body_composition_data(self, days_back=7):
-        """体組成データを取得"""
-        if not self.access_token:
+    def refresh_access_token(self):
+        """リフレッシュトークンでアクセストークンを更新"""
+        if not self.refresh_token:
+            print("エラー: リフレッシュトークンがありません")
+            return None
+        
+        data = {
+            'client_id': self.client_id,
+            'client_secret': self.client_secret,
+            'redirect_uri': self.redirect_uri,
+            'refresh_token': self.refresh_token,
+            'grant_type': 'refresh_token'
+        }
+        
+        try:
+            response = self._request('POST', self.token_url, data=data)
+            response.raise_for_status()
+            
+            self._set_token(response.json())
+            print("アクセストークンを更新しました")
+            
+            return self.access_token
+            
+        except requests.exceptions.RequestException as e:
+            print(f"アクセストークンの更新に失敗しました: {e}")
+            return None
+    
+    def ensure_access_token(self):
+        """有効期限が近ければ更新し、使用可能なアクセストークンを返す
+        
+        複数スレッドから同時に呼ばれても更新リクエストは1回だけ送信される。
+        """
+        if not self._token_expiring():
+            return self.access_token
+        
+        with self._token_lock:
+            # 待っている間に他のスレッドが更新済みならそのまま使う
+            if self._token_expiring() and self.refresh_token:
+                self.refresh_access_token()
+        
+        if self.token_expires_at is not None and self.token_expires_at <= time.time():
+            print("エラー: アクセストークンの有効期限が切れています")
+            return None
+        return self.access_token
+    
+    def _token_expiring(self):
+        if self.token_expires_at is None:
+            return False
+        return self.token_expires_at - time.time() < TOKEN_REFRESH_MARGIN
+    
+    def _set_token(self, token_data):
+        """トークンレスポンスを反映し、ストアがあれば保存"""
+        self.access_token = token_data['access_token']
+        self.refresh_token = token_data.get('refresh_token', self.refresh_token)
+        expires_in = token_data.get('expires_in')
+        self.token_expires_at = time.time() + int(expires_in) if expires_in else None
+        
+        if self.token_store:
+            self.token_store.set(self.account, {
+                'access_token': self.access_token,
+                'refresh_token': self.refresh_token,
+                'expires_at': self.token_expires_at,
+            })
+    
+    def load_saved_token(self):
+        """保存済みのトークンを読み込み、使用可能なアクセストークンを返す"""
+        if not self.token_store:
+            return None
+        
+        token = self.token_store.get(self.account)
+        if not token:
+            return None
+        
+        self.access_token = token['access_token']
+        self.refresh_token = token.get('refresh_token')
+        self.token_expires_at = token.get('expires_at')
+        
+        return self.ensure_access_token()
+    
+    def get_body_composition_data(self, days_back=7, from_date=None, to_date=None):
+        """体組成データを取得（from_date/to_date指定時はその期間）"""
+        if not self.ensure_access_token():
             print("エラー: アクセストークンが設定されていません")
             return None
         
         # 日付範囲を設定
-        to_date = datetime.now()
-        from_date = to_date - timedelta(days=days_back)
+        if from_date is not None or to_date is not None:
+            to_dt = to_datetime(to_date, end_of_day=True) if to_date else datetime.now()
+            from_dt = to_datetime(from_date) if from_date else to_dt - timedelta(days=days_back)
+        else:
+            to_dt = datetime.now()
+            from_dt = to_dt - timedelta(days=days_back)
         
+        # APIの上限を超える期間はウィンドウに分割して取得
+        if to_dt - from_dt > timedelta(days=MAX_WINDOW_DAYS):
+            return self.get_body_composition_data_range(from_dt, to_dt)
+        
+        return self._fetch_window(from_dt, to_dt)
+    
+    def get_body_composition_data_range(self, from_date, to_date, max_workers=DEFAULT_MAX_WORKERS):
+        """長期間のデータをウィンドウに分割して並列取得し、結合して返す"""
+        if not self.ensure_access_token():
+            print("エラー: アクセストークンが設定されていません")
+            return None
+        
+        from_dt = to_datetime(from_date)
+        to_dt = to_datetime(to_date, end_of_day=True)
+        if from_dt > to_dt:
+            print("エラー: 開始日が終了日より後になっています")
+            return None
+        
+        windows = split_date_range(from_dt, to_dt)
+        workers = max(1, min(max_workers, len(windows)))
+        with tracing.span('fetch_windows', windows=len(windows)):
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                results = list(executor.map(lambda w: self._fetch_window(*w), windows))
+        
+        if any(result is None for result in results):
+            print("一部の期間のデータ取得に失敗しました")
+            return None
+        
+        with tracing.span('merge') as span:
+            merged = merge_innerscan_data(results)
+            span.set(rows=len(merged['data']))
+        return merged
+    
+    def iter_body_composition_data(self, from_date, to_date, max_workers=DEFAULT_MAX_WORKERS, cancel=None, tags=None):
+        """ウィンドウごとのレスポンスを取得でき次第yieldする（順不同）
+        
+        同時に保持するのは実行中のウィンドウ分だけなので、期間の長さに関わらず
+        メモリ使用量は一定。取得に失敗したウィンドウはNoneをyieldする。
+        cancel（threading.Event）がセットされると、未開始のウィンドウを取り消し、
+        実行中のウィンドウの結果を返してから終了する。
+        tagsを指定した場合はself.tagsの代わりにその項目を取得する。
+        """
+        if not self.ensure_access_token():
+            print("エラー: アクセストークンが設定されていません")
+            return
+        
+        windows = iter(split_date_range(to_datetime(from_date), to_datetime(to_date, end_of_day=True)))
+        with ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+            pending = set()
+            for window in windows:
+                if cancel is not None and cancel.is_set():
+                    break
+                pending.add(executor.submit(self._fetch_window, *window, tags=tags))
+                if len(pending) < max_workers:
+                    continue
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield future.result()
+            
+            while pending:
+                if cancel is not None and cancel.is_set():
+                    # 未開始のウィンドウは取り消し、実行中のウィンドウは結果を返す
+                    pending = {future for future in pending if not future.cancel()}
+                    if not pending:
+                        break
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield future.result()
+    
+    def _fetch_window(self, from_date, to_date, tags=None):
+        """1ウィンドウ分の体組成データを取得（tagsを省略した場合はself.tags）"""
+        tags = format_tags(tags) if tags else self.tags
         from_str = from_date.strftime("%Y%m%d%H%M%S")
         to_str = to_date.strftime("%Y%m%d%H%M%S")
         
+        # 過去のウィンドウはキャッシュから返す
+        cache_key = None
+        if self.cache:
+            cache_key = self.cache.make_key(self.account, from_str, to_str, tags, self.date_mode)
+            with tracing.span('cache_get') as span:
+                cached = self.cache.get(cache_key)
+                span.set(hit=cached is not None)
+            if cached is not None:
+                return cached
+        
+        # 同じウィンドウを取得中のリクエストがあれば、その結果を待つ
+        key = (from_str, to_str, tags, self.date_mode)
+        with self._inflight_lock:
+            shared = self._inflight.get(key)
+            if shared is None:
+                shared = self._inflight[key] = Future()
+                owner = True
+            else:
+                owner = False
+        if not owner:
+            with tracing.span('inflight_wait'):
+                return shared.result()
+        
+        data = None
+        try:
+            data = self._download_window(to_date, from_str, to_str, tags, cache_key)
+        finally:
+            with self._inflight_lock:
+                del self._inflight[key]
+            shared.set_result(data)
+        return data
+    
+    def _download_window(self, to_date, from_str, to_str, tags, cache_key):
+        """1ウィンドウ分をAPIから取得し、キャッシュ・アーカイブに保存"""
         params = {
             'access_token': self.access_token,
-            'date': '1',  # 測定日付で指定
+            'date': self.date_mode,
             'from': from_str,
             'to': to_str,
-            'tag': '6021,6022'  # 体重と体脂肪率
+            'tag': tags
         }
         
         try:
-            response = requests.get(self.innerscan_url, params=params)
+            response = self._request('GET', self.innerscan_url, params=params)
             response.raise_for_status()
             
-            return response.json()
+            with tracing.span('json_decode', bytes=len(response.content)) as span:
+                data = response.json()
+                span.set(rows=len(data.get('data') or []))
+            if cache_key:
+                self.cache.put(cache_key, data, immutable=self.cache.is_immutable(to_date))
+            if self.archive:
+                try:
+                    self.archive.append(self.account, params, data, self.innerscan_url)
+                except OSError as e:
+                    print(f"レスポンスのアーカイブに失敗しました: {e}")
+            
+            return data
             
         except requests.exceptions.RequestException as e:
             print(f"データ取得に失敗しました: {e}")
             return None
+    
+    def _request(self, method, url, retry=True, **kwargs):
+        """レート制限・リトライ付きでHTTPリクエストを送信（retry=Falseなら再試行しない）"""
+        max_retries = self.max_retries if retry else 0
+        retries = 0
+        throttled = 0.0
+        start = time.perf_counter()
+        
+        while True:
+            if self.rate_limiter:
+                with tracing.span('rate_limit_wait'):
+                    throttled += self.rate_limiter.acquire()
+            
+            response = None
+            try:
+                with tracing.span('http', method=method, url=url, attempt=retries) as span:
+                    response = self.session.request(method, url, timeout=self.timeout, **kwargs)
+                    span.set(status=response.status_code, bytes=len(response.content))
+                retryable = response.status_code in RETRY_STATUS_CODES
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout):
+                if retries >= max_retries:
+                    self._record_stats(method, url, None, start, retries, throttled)
+                    raise
+                retryable = True
+            
+            if not retryable or retries >= max_retries:
+                self._record_stats(method, url, response.status_code, start, retries, throttled)
+                return response
+            
+            # 指数バックオフ（ジッター付き）。429の場合はRetry-Afterを優先
+            delay = self.backoff * (2 ** retries) * random.uniform(0.5, 1.5)
+            if response is not None and response.headers.get('Retry-After', '').isdigit():
+                delay = max(delay, int(response.headers['Retry-After']))
+            retries += 1
+            print(f"リクエストを再試行します（{retries}/{max_retries}回目, {delay:.1f}秒後）")
+            time.sleep(delay)
+    
+    def _record_stats(self, method, url, status, start, retries, throttled):
+        self.request_stats.append({
+            'method': method,
+            'url': url,
+            'status': status,
+            'elapsed': time.perf_counter() - start,
+            'retries': retries,
+            'throttled': throttled,
+        })
+    
+    def get_request_stats(self):
+        """リクエストのレイテンシとリトライ回数の集計を返す"""
+        stats = list(self.request_stats)
+        if not stats:
+            return {'count': 0, 'retries': 0, 'errors': 0, 'avg_latency': 0.0, 'max_latency': 0.0}
+        
+        latencies = [s['elapsed'] for s in stats]
+        return {
+            'count': len(stats),
+            'retries': sum(s['retries'] for s in stats),
+            'errors': sum(1 for s in stats if s['status'] is None or s['status'] >= 400),
+            'avg_latency': sum(latencies) / len(latencies),
+            'max_latency': max(latencies),
+        }
@@ -0,0 +1,234 @@
+import math
+from collections import deque
+
+import numpy as np
+
+# 移動平均の期間（日）
+DEFAULT_WINDOWS = (7, 30, 90)
+# 指数平滑化の半減期（日）
+DEFAULT_HALFLIFE_DAYS = 7
+# 週あたりの変化量を求める回帰の期間（日）
+DEFAULT_RATE_DAYS = 28
+
+DAY_SECONDS = 86400
+
+
+class RollingSeries:
+    """1項目分の統計を測定1件ごとに更新する
+
+    移動平均・回帰用の合計値は期間内の点を持つdequeと一緒に更新するので、
+    1件の追加は償却O(1)で済む。期間は最新の測定日時を基準にする。
+    """
+
+    __slots__ = ('windows', 'halflife', 'rate_window', 'count', 'total', 'minimum', 'maximum',
+                 'latest', 'last_time', 'ewma', 'points', 'sums', 'rate_points', 'rate_sums')
+
+    def __init__(self, windows=DEFAULT_WINDOWS, halflife_days=DEFAULT_HALFLIFE_DAYS,
+                 rate_days=DEFAULT_RATE_DAYS):
+        self.windows = tuple(windows)
+        self.halflife = halflife_days * DAY_SECONDS
+        self.rate_window = rate_days * DAY_SECONDS
+        self.reset()
+
+    def reset(self):
+        self.count = 0
+        self.total = 0.0
+        self.minimum = math.inf
+        self.maximum = -math.inf
+        self.latest = None
+        self.last_time = None
+        self.ewma = None
+        self.points = {days: deque() for days in self.windows}  # (測定日時, 値)
+        self.sums = {days: 0.0 for days in self.windows}
+        # 回帰用: (経過日数, 値) と [件数, Σt, Σv, Σt², Σtv]
+        self.rate_points = deque()
+        self.rate_sums = [0, 0.0, 0.0, 0.0, 0.0]
+
+    def append(self, timestamp, value):
+        """測定を1件追加（測定日時の昇順で追加すること）"""
+        if self.last_time is not None and timestamp < self.last_time:
+            raise ValueError("測定日時の古いデータは追加できません。recomputeで再計算してください")
+
+        if self.ewma is None:
+            self.ewma = value
+        else:
+            decay = math.exp(-math.log(2) * (timestamp - self.last_time) / self.halflife)
+            self.ewma = value + (self.ewma - value) * decay
+
+        self.count += 1
+        self.total += value
+        self.minimum = min(self.minimum, value)
+        self.maximum = max(self.maximum, value)
+        self.latest = value
+        self.last_time = timestamp
+
+        for days in self.windows:
+            points = self.points[days]
+            points.append((timestamp, value))
+            self.sums[days] += value
+            limit = timestamp - days * DAY_SECONDS
+            while points[0][0] <= limit:
+                self.sums[days] -= points.popleft()[1]
+
+        t = timestamp / DAY_SECONDS
+        self.rate_points.append((t, value))
+        self._add_rate(t, value, 1)
+        limit = t - self.rate_window / DAY_SECONDS
+        while self.rate_points[0][0] <= limit:
+            self._add_rate(*self.rate_points.popleft(), -1)
+
+    def _add_rate(self, t, value, sign):
+        sums = self.rate_sums
+        sums[0] += sign
+        sums[1] += sign * t
+        sums[2] += sign * value
+        sums[3] += sign * t * t
+        sums[4] += sign * t * value
+
+    def recompute(self, timestamps, values):
+        """保存済みの履歴（昇順の配列）からまとめて再計算"""
+        self.reset()
+        timestamps = np.asarray(timestamps, dtype=np.int64)
+        values = np.asarray(values, dtype=np.float64)
+        if not len(values):
+            return
+
+        last_time = int(timestamps[-1])
+        self.count = len(values)
+        self.total = float(values.sum())
+        self.minimum = float(values.min())
+        self.maximum = float(values.max())
+        self.latest = float(values[-1])
+        self.last_time = last_time
+
+        # 逐次更新 s_i = v_i + (s_{i-1} - v_i)·exp(-k·Δt_i) を展開した重み付き和
+        k = math.log(2) / self.halflife
+        decay = np.exp(-k * (last_time - timestamps))
+        weights = np.empty(len(values))
+        weights[0] = decay[0]
+        weights[1:] = -np.expm1(-k * np.diff(timestamps)) * decay[1:]
+        self.ewma = float(weights @ values)
+
+        for days in self.windows:
+            start = np.searchsorted(timestamps, last_time - days * DAY_SECONDS, side='right')
+            self.points[days].extend(zip(timestamps[start:].tolist(), values[start:].tolist()))
+            self.sums[days] = float(values[start:].sum())
+
+        start = np.searchsorted(timestamps, last_time - self.rate_window, side='right')
+        t = timestamps[start:] / DAY_SECONDS
+        v = values[start:]
+        self.rate_points.extend(zip(t.tolist(), v.tolist()))
+        self.rate_sums = [len(v), float(t.sum()), float(v.sum()), float(t @ t), float(t @ v)]
+
+    def mean(self, days=None):
+        """全期間（daysを指定した場合は直近days日）の平均"""
+        if days is None:
+            return self.total / self.count if self.count else None
+        points = self.points[days]
+        return self.sums[days] / len(points) if points else None
+
+    def weekly_rate(self):
+        """直近の回帰直線の傾き（1週間あたりの変化量）"""
+        n, st, sv, stt, stv = self.rate_sums
+        if n < 2:
+            return None
+        variance = n * stt - st * st
+        if variance <= 1e-12:
+            return None
+        return (n * stv - st * sv) / variance * 7
+
+    def to_dict(self):
+        if not self.count:
+            return None
+        stats = {
+            'latest': self.latest,
+            'mean': self.mean(),
+            'min': self.minimum,
+            'max': self.maximum,
+            'ewma': self.ewma,
+            'weekly_rate': self.weekly_rate(),
+        }
+        for days in self.windows:
+            stats[f'mean_{days}d'] = self.mean(days)
+        return stats
+
+
+class HealthStats:
+    """測定項目ごとの統計（HealthDataset.summaryの計算元）
+
+    初回は保存済みの履歴から一括で計算し、同期で増えた分は
+    update() で新しい測定だけを追加して更新する。
+    """
+
+    def __init__(self, names, **options):
+        self.names = list(names)
+        self.series = {name: RollingSeries(**options) for name in self.names}
+        self.rows = 0
+        self.first_time = None
+        self.last_time = None
+
+    @classmethod
+    def from_wide(cls, wide, names, **options):
+        stats = cls(names, **options)
+        stats.recompute(wide)
+        return stats
+
+    def recompute(self, wide):
+        """展開済みの表（新しい順）から全項目を再計算"""
+        timestamps = wide['timestamp'].to_numpy()[::-1]
+        self.rows = len(timestamps)
+        self.first_time = int(timestamps[0]) if self.rows else None
+        self.last_time = int(timestamps[-1]) if self.rows else None
+
+        for name, series in self.series.items():
+            values = wide[name].to_numpy(dtype=np.float64, na_value=np.nan)[::-1]
+            valid = ~np.isnan(values)
+            series.recompute(timestamps[valid], values[valid])
+
+    def append(self, timestamp, values):
+        """1回分の測定（列名 → 値）を追加"""
+        for name, value in values.items():
+            series = self.series.get(name)
+            if series is not None and value is not None and not math.isnan(value):
+                series.append(timestamp, value)
+        if self.first_time is None:
+            self.first_time = timestamp
+        self.last_time = timestamp
+        self.rows += 1
+
+    def update(self, wide):
+        """前回以降に追加された測定だけを反映する
+
+        表が前回の内容を先頭から含んでいない場合（期間や項目が変わった場合）は
+        何もせずFalseを返すので、呼び出し側でrecomputeすること。
+        """
+        if any(name not in wide.columns for name in self.names):
+            return False
+        timestamps = wide['timestamp'].to_numpy()[::-1]
+        if not self.rows or not len(timestamps) or int(timestamps[0]) != self.first_time:
+            return False
+        known = int(np.searchsorted(timestamps, self.last_time, side='right'))
+        if known != self.rows:
+            return False
+
+        # 新しい行は表の先頭側にある
+        new_rows = len(timestamps) - known
+        if new_rows:
+            columns = {name: wide[name].to_numpy(dtype=np.float64, na_value=np.nan)[new_rows - 1::-1]
+                       for name in self.names}
+            for i, timestamp in enumerate(timestamps[known:].tolist()):
+                self.append(timestamp, {name: float(values[i]) for name, values in columns.items()})
+        return True
+
+    def summary(self):
+        """項目ごとの統計と測定件数・期間"""
+        summary = {'count': self.rows, 'period': None}
+        if self.rows:
+            iso = np.datetime_as_string(
+                np.array([self.first_time, self.last_time], dtype='datetime64[s]').astype('datetime64[D]'))
+            summary['period'] = (str(iso[0]), str(iso[1]))
+        for name, series in self.series.items():
+            stats = series.to_dict()
+            if stats:
+                summary[name] = stats
+        return summary
@@ -0,0 +1,128 @@
+import numpy as np
+import pandas as pd
+
+from innerscan_tags import DEFAULT_TAGS, TAG_REGISTRY, normalize_tags, tag_info_by_name
+
+COLUMNS = ['timestamp', 'tag', 'keydata', 'model']
+
+
+def parse_innerscan(raw_data):
+    """innerscan.jsonのレスポンスを列指向のDataFrameに変換
+
+    列: timestamp（測定日時のエポック秒, int64）, tag（category）,
+    keydata（float32）, model（category）。すべての測定を保持する。
+    """
+    items = (raw_data or {}).get('data') or []
+    if not items:
+        return pd.DataFrame({
+            'timestamp': np.empty(0, dtype=np.int64),
+            'tag': pd.Categorical([]),
+            'keydata': np.empty(0, dtype=np.float32),
+            'model': pd.Categorical([]),
+        })
+
+    dates = np.array([item['date'] for item in items], dtype='U12')
+    tags = [item['tag'] for item in items]
+    values = np.fromiter((float(item['keydata']) for item in items), dtype=np.float32, count=len(items))
+    models = [item.get('model') or '' for item in items]
+
+    return pd.DataFrame({
+        'timestamp': parse_dates(dates),
+        'tag': pd.Categorical(tags),
+        'keydata': values,
+        'model': pd.Categorical(models),
+    })
+
+
+def parse_dates(dates):
+    """YYYYMMDDHHMM形式の文字列配列をエポック秒（int64）に一括変換"""
+    digits = dates.view(np.uint32).reshape(-1, 12).astype(np.int64) - ord('0')
+
+    def field(start, length):
+        value = np.zeros(len(digits), dtype=np.int64)
+        for i in range(start, start + length):
+            value = value * 10 + digits[:, i]
+        return value
+
+    months = (field(0, 4) - 1970) * 12 + field(4, 2) - 1
+    days = months.astype('datetime64[M]').astype('datetime64[D]').astype(np.int64) + field(6, 2) - 1
+    return days * 86400 + field(8, 2) * 3600 + field(10, 2) * 60
+
+
+def pivot_measurements(frame, tags=None):
+    """測定日時・機器ごとに1行となるよう、タグを列に展開する（新しい順）
+
+    tagsを省略した場合は、体重・体脂肪率に加えてデータに含まれる登録済みの
+    項目をすべて列にする。各列は登録された型に変換する。
+    同じ日時・機器・タグの測定が重複する場合は後のものを採用する。
+    """
+    categories = list(frame['tag'].cat.categories)
+    if tags is None:
+        tags = set(DEFAULT_TAGS) | (set(categories) & set(TAG_REGISTRY))
+    tags = normalize_tags(tags)
+
+    tag_codes = frame['tag'].cat.codes.to_numpy()
+    known = np.isin(tag_codes, [categories.index(tag) for tag in tags if tag in categories])
+
+    model_codes = frame['model'].cat.codes.to_numpy().astype(np.int64)
+    models = np.asarray(frame['model'].cat.categories, dtype=object)
+    stride = len(models) + 1
+
+    # 日時と機器を1つのキーにまとめ、行番号を一括で割り当てる
+    keys = frame['timestamp'].to_numpy()[known] * stride + model_codes[known]
+    unique_keys, rows = np.unique(keys, return_inverse=True)
+    unique_keys = unique_keys[::-1]
+    rows = len(unique_keys) - 1 - rows
+
+    wide = {
+        'timestamp': unique_keys // stride,
+        'model': models[unique_keys % stride] if len(models) else np.empty(0, dtype=object),
+    }
+    known_tags = tag_codes[known]
+    values = frame['keydata'].to_numpy()[known]
+    for tag in tags:
+        info = TAG_REGISTRY[tag]
+        column = np.full(len(unique_keys), np.nan, dtype=np.float32)
+        if tag in categories:
+            selected = known_tags == categories.index(tag)
+            column[rows[selected]] = values[selected]
+        if info['dtype'] == 'float32':
+            wide[info['name']] = column
+        else:
+            wide[info['name']] = pd.array(np.round(column), dtype='Float32').astype(info['dtype'])
+
+    return pd.DataFrame(wide)
+
+
+def value_names(wide):
+    """展開済みの表に含まれる測定項目の列名"""
+    return [name for name in wide.columns if name not in ('timestamp', 'model')]
+
+
+def to_measurement_records(wide):
+    """展開済みの表を測定データの辞書リストに変換"""
+    if wide.empty:
+        return []
+
+    iso = np.datetime_as_string(wide['timestamp'].to_numpy().astype('datetime64[s]'), unit='s').tolist()
+    models = wide['model'].tolist()
+
+    # float32の誤差を表示に持ち込まないよう小数第2位で丸める（整数の項目は整数のまま）
+    value_columns = []
+    for name in value_names(wide):
+        values = np.round(wide[name].to_numpy(dtype=np.float64, na_value=np.nan), 2)
+        if tag_info_by_name(name)['dtype'] != 'float32':
+            values = [int(v) if v == v else v for v in values.tolist()]
+        else:
+            values = values.tolist()
+        value_columns.append((name, values))
+
+    records = []
+    for i, stamp in enumerate(iso):
+        record = {'date': stamp[:10], 'datetime': f"{stamp[:10]} {stamp[11:]}", 'model': models[i]}
+        for name, values in value_columns:
+            value = values[i]
+            if value == value:  # NaN（未測定）は除外
+                record[name] = value
+        records.append(record)
+    return records
@@ -0,0 +1,50 @@
+# 体組成計（innerscan）の測定項目タグ
+#
+# 体重・体脂肪率以外の項目は、Health Planet側の仕様により
+# 2020年6月29日までの測定分のみ取得できる。
+TAG_REGISTRY = {
+    '6021': {'name': 'weight', 'label': '体重', 'unit': 'kg', 'dtype': 'float32'},
+    '6022': {'name': 'body_fat', 'label': '体脂肪率', 'unit': '%', 'dtype': 'float32'},
+    '6023': {'name': 'muscle_mass', 'label': '筋肉量', 'unit': 'kg', 'dtype': 'float32'},
+    '6024': {'name': 'muscle_score', 'label': '筋肉スコア', 'unit': '', 'dtype': 'Int16'},
+    '6025': {'name': 'visceral_fat_level_precise', 'label': '内臓脂肪レベル2', 'unit': '', 'dtype': 'float32'},
+    '6026': {'name': 'visceral_fat_level', 'label': '内臓脂肪レベル', 'unit': '', 'dtype': 'Int16'},
+    '6027': {'name': 'basal_metabolism', 'label': '基礎代謝量', 'unit': 'kcal', 'dtype': 'Int16'},
+    '6028': {'name': 'metabolic_age', 'label': '体内年齢', 'unit': '歳', 'dtype': 'Int16'},
+    '6029': {'name': 'bone_mass', 'label': '推定骨量', 'unit': 'kg', 'dtype': 'float32'},
+}
+
+DEFAULT_TAGS = ('6021', '6022')  # 体重と体脂肪率
+ALL_TAGS = tuple(TAG_REGISTRY)
+
+
+def normalize_tags(tags):
+    """タグ指定（'6021,6022' またはリスト）を登録順のタプルに変換"""
+    if tags is None:
+        return DEFAULT_TAGS
+    if isinstance(tags, str):
+        tags = tags.split(',')
+
+    tags = {str(tag).strip() for tag in tags if str(tag).strip()}
+    unknown = tags - set(TAG_REGISTRY)
+    if unknown:
+        raise ValueError(f"未対応の測定項目タグです: {', '.join(sorted(unknown))}")
+    return tuple(tag for tag in TAG_REGISTRY if tag in tags)
+
+
+def format_tags(tags):
+    """APIのtagパラメータ用にカンマ区切りにする（1回のリクエストで全項目を取得）"""
+    return ','.join(normalize_tags(tags))
+
+
+def tag_names(tags):
+    """タグ → 列名の対応"""
+    return {tag: TAG_REGISTRY[tag]['name'] for tag in normalize_tags(tags)}
+
+
+def tag_info_by_name(name):
+    """列名から項目情報を返す"""
+    for info in TAG_REGISTRY.values():
+        if info['name'] == name:
+            return info
+    return None
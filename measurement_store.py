@@ -0,0 +1,416 @@
+import contextlib
+import os
+import sqlite3
+from datetime import datetime, timedelta
+
+import tracing
+from health_planet_api import split_date_range, to_datetime
+from innerscan_tags import DEFAULT_TAGS, TAG_REGISTRY, format_tags, normalize_tags
+
+DEFAULT_ACCOUNT = "default"
+# 初回同期時に遡る日数
+DEFAULT_INITIAL_DAYS = 365
+
+# 集計の単位と、測定日時（YYYYMMDDHHMM）から集計期間を求めるSQL式
+# 週は月曜始まり。期間は日・週が 'YYYY-MM-DD'、月が 'YYYY-MM'
+_ISO_DATE = "substr(date, 1, 4) || '-' || substr(date, 5, 2) || '-' || substr(date, 7, 2)"
+ROLLUP_BUCKETS = {
+    'day': _ISO_DATE,
+    'week': f"date({_ISO_DATE}, 'weekday 0', '-6 days')",
+    'month': "substr(date, 1, 4) || '-' || substr(date, 5, 2)",
+}
+
+
+def rollup_bounds(granularity, dt):
+    """日時を含む集計期間の開始日時と、次の期間の開始日時を返す"""
+    start = dt.replace(hour=0, minute=0, second=0, microsecond=0)
+    if granularity == 'day':
+        return start, start + timedelta(days=1)
+    if granularity == 'week':
+        start -= timedelta(days=start.weekday())
+        return start, start + timedelta(days=7)
+    start = start.replace(day=1)
+    return start, (start + timedelta(days=32)).replace(day=1)
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS measurements (
+    account TEXT NOT NULL,
+    date TEXT NOT NULL,
+    tag TEXT NOT NULL,
+    model TEXT NOT NULL,
+    keydata TEXT NOT NULL,
+    PRIMARY KEY (account, date, tag, model)
+);
+CREATE TABLE IF NOT EXISTS sync_state (
+    account TEXT PRIMARY KEY,
+    synced_from TEXT NOT NULL,
+    last_date TEXT,
+    synced_at TEXT NOT NULL,
+    tags TEXT
+);
+CREATE TABLE IF NOT EXISTS sync_tags (
+    account TEXT NOT NULL,
+    tag TEXT NOT NULL,
+    synced_from TEXT NOT NULL,
+    last_date TEXT,
+    PRIMARY KEY (account, tag)
+);
+CREATE TABLE IF NOT EXISTS rollups (
+    account TEXT NOT NULL,
+    granularity TEXT NOT NULL,
+    bucket TEXT NOT NULL,
+    tag TEXT NOT NULL,
+    count INTEGER NOT NULL,
+    mean REAL,
+    min REAL,
+    max REAL,
+    last REAL,
+    last_date TEXT,
+    PRIMARY KEY (account, granularity, bucket, tag)
+);
+CREATE TABLE IF NOT EXISTS user_info (
+    account TEXT PRIMARY KEY,
+    birth_date TEXT,
+    height TEXT,
+    sex TEXT
+);
+"""
+
+
+def _parse_state(row):
+    """(同期済み開始日時, 最終測定日時) の文字列をdatetimeに変換"""
+    synced_from = datetime.strptime(row[0], "%Y%m%d%H%M%S")
+    last_date = datetime.strptime(row[1], "%Y%m%d%H%M") if row[1] else None
+    return synced_from, last_date
+
+
+class MeasurementStore:
+    """測定データをSQLiteに保存し、差分同期を行うローカルストア"""
+
+    def __init__(self, db_path=os.path.join("data", "health_data.db")):
+        self.db_path = db_path
+        db_dir = os.path.dirname(db_path)
+        if db_dir and not os.path.exists(db_dir):
+            os.makedirs(db_dir)
+
+        with self._connect() as conn:
+            has_rollups = conn.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'rollups'"
+            ).fetchone() is not None
+            conn.executescript(SCHEMA)
+            # 旧バージョンのデータベースに取得項目の列を追加
+            columns = [row[1] for row in conn.execute("PRAGMA table_info(sync_state)")]
+            if 'tags' not in columns:
+                conn.execute("ALTER TABLE sync_state ADD COLUMN tags TEXT")
+            # 項目ごとの同期状態がないアカウントは、アカウントの同期状態から作成
+            legacy = conn.execute(
+                "SELECT account, synced_from, last_date, tags FROM sync_state "
+                "WHERE account NOT IN (SELECT account FROM sync_tags)"
+            ).fetchall()
+            for account, synced_from, last_date, tags in legacy:
+                conn.executemany(
+                    "INSERT INTO sync_tags (account, tag, synced_from, last_date) VALUES (?, ?, ?, ?)",
+                    [(account, tag, synced_from, last_date) for tag in normalize_tags(tags or DEFAULT_TAGS)],
+                )
+            # 集計テーブルがなかったデータベースは保存済みの測定から作成
+            if not has_rollups:
+                self._update_rollups(conn, None)
+
+    @contextlib.contextmanager
+    def _connect(self):
+        """接続を開き、ブロックの終了時にコミット（例外時はロールバック）して閉じる"""
+        conn = sqlite3.connect(self.db_path)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def upsert(self, raw_data, account=DEFAULT_ACCOUNT):
+        """APIレスポンスを保存し、新規・更新された行数を返す"""
+        if not raw_data:
+            return 0
+
+        rows = [
+            (account, item['date'], item['tag'], item.get('model', ''), item['keydata'])
+            for item in raw_data.get('data') or []
+        ]
+
+        with tracing.span('store_upsert', rows=len(rows)), self._connect() as conn:
+            # 保存済みと同じ行を除き、追加・更新される行だけを書き込む
+            changed_rows = rows
+            if rows:
+                dates = [row[1] for row in rows]
+                existing = set(conn.execute(
+                    "SELECT account, date, tag, model, keydata FROM measurements "
+                    "WHERE account = ? AND date BETWEEN ? AND ?",
+                    (account, min(dates), max(dates)),
+                ))
+                changed_rows = [row for row in rows if row not in existing]
+
+            before = conn.total_changes
+            conn.executemany(
+                "INSERT INTO measurements (account, date, tag, model, keydata) VALUES (?, ?, ?, ?, ?) "
+                "ON CONFLICT (account, date, tag, model) DO UPDATE SET keydata = excluded.keydata "
+                "WHERE keydata != excluded.keydata",
+                changed_rows,
+            )
+            changed = conn.total_changes - before
+
+            # 変更された測定を含む期間の集計だけを計算し直す
+            if changed:
+                dates = [row[1] for row in changed_rows]
+                self._update_rollups(conn, account, min(dates), max(dates))
+
+            if raw_data.get('birth_date') or raw_data.get('height') or raw_data.get('sex'):
+                conn.execute(
+                    "INSERT OR REPLACE INTO user_info (account, birth_date, height, sex) VALUES (?, ?, ?, ?)",
+                    (account, raw_data.get('birth_date'), raw_data.get('height'), raw_data.get('sex')),
+                )
+
+        return changed
+
+    def _update_rollups(self, conn, account=None, first_date=None, last_date=None):
+        """測定日時の範囲を含む集計期間（日・週・月）の集計を計算し直す
+
+        範囲を指定しない場合は全期間、accountを指定しない場合は全アカウントを計算する。
+        """
+        for granularity, bucket in ROLLUP_BUCKETS.items():
+            conditions = []
+            params = [granularity]
+            if account is not None:
+                conditions.append("account = ?")
+                params.append(account)
+            if first_date is not None:
+                # 範囲の両端を含む期間の全体を計算する（主キーの索引で絞り込む）
+                low = rollup_bounds(granularity, datetime.strptime(first_date, "%Y%m%d%H%M"))[0]
+                high = rollup_bounds(granularity, datetime.strptime(last_date, "%Y%m%d%H%M"))[1]
+                conditions.append("date >= ? AND date < ?")
+                params.extend([low.strftime("%Y%m%d%H%M"), high.strftime("%Y%m%d%H%M")])
+            where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+
+            conn.execute(
+                "INSERT OR REPLACE INTO rollups "
+                "(account, granularity, bucket, tag, count, mean, min, max, last, last_date) "
+                "SELECT account, ?, bucket, tag, COUNT(*), AVG(value), MIN(value), MAX(value), "
+                "MAX(CASE WHEN latest = 1 THEN value END), MAX(date) "
+                f"FROM (SELECT account, {bucket} AS bucket, tag, date, CAST(keydata AS REAL) AS value, "
+                f"ROW_NUMBER() OVER (PARTITION BY account, {bucket}, tag ORDER BY date DESC) AS latest "
+                f"FROM measurements {where}) "
+                "GROUP BY account, bucket, tag",
+                params,
+            )
+
+    def rebuild_rollups(self, account=None):
+        """集計をすべて作り直す"""
+        with self._connect() as conn:
+            if account is None:
+                conn.execute("DELETE FROM rollups")
+            else:
+                conn.execute("DELETE FROM rollups WHERE account = ?", (account,))
+            self._update_rollups(conn, account)
+
+    def get_rollups(self, granularity='week', account=DEFAULT_ACCOUNT, from_date=None, to_date=None, tags=None):
+        """集計済みの統計（件数・平均・最小・最大・最新値）を期間の古い順に返す
+
+        granularityは 'day'・'week'・'month'。from_date・to_dateを含む期間が対象。
+        """
+        if granularity not in ROLLUP_BUCKETS:
+            raise ValueError(f"未対応の集計単位です: {granularity}")
+
+        query = ("SELECT bucket, tag, count, mean, min, max, last, last_date FROM rollups "
+                 "WHERE account = ? AND granularity = ?")
+        params = [account, granularity]
+        bucket_format = "%Y-%m" if granularity == 'month' else "%Y-%m-%d"
+        if from_date:
+            query += " AND bucket >= ?"
+            params.append(rollup_bounds(granularity, to_datetime(from_date))[0].strftime(bucket_format))
+        if to_date:
+            query += " AND bucket <= ?"
+            params.append(to_datetime(to_date).strftime(bucket_format))
+        if tags is not None:
+            tags = normalize_tags(tags)
+            query += f" AND tag IN ({', '.join('?' for _ in tags)})"
+            params.extend(tags)
+        query += " ORDER BY bucket, tag"
+
+        with self._connect() as conn:
+            rows = conn.execute(query, params).fetchall()
+
+        return [
+            {
+                'bucket': row[0],
+                'tag': row[1],
+                'name': TAG_REGISTRY[row[1]]['name'] if row[1] in TAG_REGISTRY else row[1],
+                'count': row[2],
+                'mean': row[3],
+                'min': row[4],
+                'max': row[5],
+                'last': row[6],
+                'last_date': row[7],
+            }
+            for row in rows
+        ]
+
+    def get_sync_state(self, account=DEFAULT_ACCOUNT, tags=None):
+        """同期状態（同期済み開始日時, 最終測定日時）を返す
+
+        tagsを指定した場合は項目ごとの同期状態から、全項目が同期済みの期間を返す。
+        同期していない項目がある場合や、項目ごとの同期済み期間が重ならない場合は
+        未同期として扱う。
+        """
+        if tags is None:
+            with self._connect() as conn:
+                row = conn.execute(
+                    "SELECT synced_from, last_date FROM sync_state WHERE account = ?", (account,)
+                ).fetchone()
+            return _parse_state(row) if row else (None, None)
+
+        with self._connect() as conn:
+            states = self._tag_states(conn, account)
+        selected = [states.get(tag) for tag in normalize_tags(tags)]
+        if not selected or None in selected:
+            return None, None
+
+        synced_from = max(state[0] for state in selected)
+        # 最も古い項目の最終測定日時から取り直す
+        last_date = min(state[1] or state[0] for state in selected)
+        if last_date < synced_from:
+            return None, None
+        return synced_from, last_date
+
+    @staticmethod
+    def _tag_states(conn, account):
+        """{タグ: (同期済み開始日時, 最終測定日時)}"""
+        rows = conn.execute(
+            "SELECT tag, synced_from, last_date FROM sync_tags WHERE account = ?", (account,)
+        ).fetchall()
+        return {tag: _parse_state((synced_from, last_date)) for tag, synced_from, last_date in rows}
+
+    def get_watermark(self, account=DEFAULT_ACCOUNT):
+        """保存済みの最新測定日時（ハイウォーターマーク）を返す"""
+        return self.get_sync_state(account)[1]
+
+    def sync(self, api, from_date=None, to_date=None, account=DEFAULT_ACCOUNT, progress=None, cancel=None,
+             tags=None):
+        """未取得の期間だけAPIから取得してストアに保存し、保存した行数を返す
+
+        ウォーターマーク以降のみを取得する。最終測定と同じ時刻から取り直すため
+        数行の重複は発生するが、主キーで除外される。
+        ウィンドウごとに届き次第保存し、progress(完了数, ウィンドウ数, 保存した行数) を呼ぶ。
+        cancel（threading.Event）がセットされた場合は中断してNoneを返す
+        （保存済みのウィンドウは残るが、同期状態は更新しない）。
+        tagsを指定した場合はapi.tagsの代わりにその項目を取得する（apiは変更しない）。
+        """
+        to_dt = to_datetime(to_date, end_of_day=True) if to_date else datetime.now()
+        if from_date:
+            from_dt = to_datetime(from_date)
+        else:
+            from_dt = to_dt - timedelta(days=DEFAULT_INITIAL_DAYS)
+
+        tags = format_tags(tags) if tags else api.tags
+        synced_from, last_date = self.get_sync_state(account, tags)
+
+        # 取得が必要な期間を決定
+        windows = []
+        if synced_from is None:
+            windows.append((from_dt, to_dt))
+        else:
+            if from_dt < synced_from:
+                windows.append((from_dt, synced_from - timedelta(seconds=1)))
+            start = max(last_date or synced_from, synced_from)
+            if start <= to_dt:
+                windows.append((start, to_dt))
+
+        total = sum(len(split_date_range(start, end)) for start, end in windows)
+        done = 0
+        changed = 0
+        for start, end in windows:
+            for raw_data in api.iter_body_composition_data(start, end, cancel=cancel, tags=tags):
+                if raw_data is None:
+                    print("ストアの同期に失敗しました")
+                    return None
+                rows = self.upsert(raw_data, account)
+                changed += rows
+                done += 1
+                if progress:
+                    progress(done, total, rows)
+
+        if done < total:
+            if cancel is not None and cancel.is_set():
+                print(f"ストアの同期を中止しました: {done}/{total}期間を保存")
+            else:
+                print("ストアの同期に失敗しました")
+            return None
+
+        self._update_sync_state(account, from_dt if synced_from is None else min(from_dt, synced_from),
+                                to_dt, tags)
+        print(f"ストアを同期しました: {changed}件を更新")
+        return changed
+
+    def _update_sync_state(self, account, fetched_from, fetched_to, tags):
+        """取得した期間（fetched_from～fetched_to）を取得した項目の同期状態に反映
+
+        項目ごとに記録するので、一部の項目だけの同期で他の項目の同期状態は変わらない。
+        """
+        with self._connect() as conn:
+            last_date = conn.execute(
+                "SELECT MAX(date) FROM measurements WHERE account = ?", (account,)
+            ).fetchone()[0]
+            states = self._tag_states(conn, account)
+            rows = []
+            for tag in normalize_tags(tags):
+                synced_from, synced_to = fetched_from, fetched_to
+                state = states.get(tag)
+                # 同期済みの期間と続いていれば、その期間も引き継ぐ
+                if state and state[0] <= fetched_to and (state[1] or state[0]) >= fetched_from:
+                    synced_from = min(state[0], fetched_from)
+                    synced_to = max(state[1] or state[0], fetched_to)
+                # 他の項目の測定が新しくても、この項目は取得した期間の終わりまでとする
+                tag_last_date = min(last_date, synced_to.strftime("%Y%m%d%H%M")) if last_date else None
+                rows.append((account, tag, synced_from.strftime("%Y%m%d%H%M%S"), tag_last_date))
+            conn.executemany(
+                "INSERT OR REPLACE INTO sync_tags (account, tag, synced_from, last_date) VALUES (?, ?, ?, ?)",
+                rows,
+            )
+
+            # アカウント全体の同期状態（同期済みの全項目と最新の測定日時）
+            synced_from, synced_tags = conn.execute(
+                "SELECT MIN(synced_from), group_concat(tag) FROM sync_tags WHERE account = ?", (account,)
+            ).fetchone()
+            conn.execute(
+                "INSERT OR REPLACE INTO sync_state (account, synced_from, last_date, synced_at, tags) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (account, synced_from, last_date,
+                 datetime.now().strftime("%Y%m%d%H%M%S"), format_tags(synced_tags)),
+            )
+
+    def to_raw_data(self, from_date=None, to_date=None, account=DEFAULT_ACCOUNT):
+        """保存済みデータをAPIレスポンスと同じ形式で返す"""
+        query = "SELECT date, keydata, model, tag FROM measurements WHERE account = ?"
+        params = [account]
+        if from_date:
+            query += " AND date >= ?"
+            params.append(to_datetime(from_date).strftime("%Y%m%d%H%M"))
+        if to_date:
+            query += " AND date <= ?"
+            params.append(to_datetime(to_date, end_of_day=True).strftime("%Y%m%d%H%M"))
+        query += " ORDER BY date, tag"
+
+        with tracing.span('store_read') as span, self._connect() as conn:
+            rows = conn.execute(query, params).fetchall()
+            span.set(rows=len(rows))
+            info = conn.execute(
+                "SELECT birth_date, height, sex FROM user_info WHERE account = ?", (account,)
+            ).fetchone() or (None, None, None)
+
+        return {
+            'birth_date': info[0],
+            'height': info[1],
+            'sex': info[2],
+            'data': [
+                {'date': row[0], 'keydata': row[1], 'model': row[2], 'tag': row[3]}
+                for row in rows
+            ],
+        }
@@ -0,0 +1,206 @@
+import tkinter as tk
+from tkinter import ttk
+
+import numpy as np
+
+import tracing
+from health_planet_api import to_datetime
+from innerscan_tags import tag_info_by_name
+
+# 1行の高さ（ピクセル）の目安。表示行数の計算に使う
+ROW_HEIGHT = 20
+
+
+class DataPreview(ttk.Frame):
+    """測定データのプレビュー表
+
+    Treeviewには画面に見えている行だけを挿入し、スクロールに合わせて
+    入れ替える。並べ替えと期間の絞り込みは元の配列に対して行うので、
+    数万件のデータでもすぐに表示できる。
+    """
+
+    def __init__(self, master, dataset=None, **kwargs):
+        super().__init__(master, **kwargs)
+        self.columns = []
+        self.arrays = {}
+        self.view = np.empty(0, dtype=np.int64)  # 表示順の行番号
+        self.filtered = np.empty(0, dtype=np.int64)
+        self.sort_column = 'datetime'
+        self.sort_descending = True
+        self.first_row = 0
+        self.visible_rows = 20
+
+        self.create_widgets()
+        if dataset is not None:
+            self.set_dataset(dataset)
+
+    def create_widgets(self):
+        # 期間の絞り込み
+        filter_frame = ttk.Frame(self)
+        filter_frame.grid(row=0, column=0, columnspan=2, sticky=(tk.W, tk.E), pady=(0, 5))
+
+        ttk.Label(filter_frame, text="開始日:").grid(row=0, column=0)
+        self.filter_from_var = tk.StringVar()
+        ttk.Entry(filter_frame, textvariable=self.filter_from_var, width=12).grid(row=0, column=1, padx=(5, 10))
+        ttk.Label(filter_frame, text="終了日:").grid(row=0, column=2)
+        self.filter_to_var = tk.StringVar()
+        ttk.Entry(filter_frame, textvariable=self.filter_to_var, width=12).grid(row=0, column=3, padx=(5, 10))
+        ttk.Button(filter_frame, text="絞り込み", command=self.apply_filter).grid(row=0, column=4)
+        ttk.Button(filter_frame, text="解除", command=self.clear_filter).grid(row=0, column=5, padx=(5, 0))
+
+        self.count_var = tk.StringVar()
+        ttk.Label(filter_frame, textvariable=self.count_var).grid(row=0, column=6, padx=(10, 0))
+
+        # 表とスクロールバー（スクロールバーは全行数に対応させる）
+        self.tree = ttk.Treeview(self, show="headings", height=self.visible_rows, selectmode="browse")
+        self.scrollbar = ttk.Scrollbar(self, orient="vertical", command=self.on_scroll)
+        self.tree.grid(row=1, column=0, sticky=(tk.W, tk.E, tk.N, tk.S))
+        self.scrollbar.grid(row=1, column=1, sticky=(tk.N, tk.S))
+
+        self.columnconfigure(0, weight=1)
+        self.rowconfigure(1, weight=1)
+
+        self.tree.bind("<Configure>", self.on_resize)
+        self.tree.bind("<MouseWheel>", self.on_mousewheel)
+        self.tree.bind("<Button-4>", lambda e: self.scroll_to(self.first_row - 3))
+        self.tree.bind("<Button-5>", lambda e: self.scroll_to(self.first_row + 3))
+
+    def set_dataset(self, dataset):
+        """表示するデータセットを設定（並べ替え・絞り込み・スクロール位置は維持）"""
+        # 先頭に表示していた行（測定日時・機器）を、新しいデータでも先頭に表示する
+        anchor = None
+        if len(self.view):
+            row = self.view[min(self.first_row, len(self.view) - 1)]
+            anchor = (self.arrays['datetime'][row], self.arrays['model'][row])
+
+        wide = dataset.wide
+        self.arrays = {'datetime': wide['timestamp'].to_numpy()}
+        for name in dataset.value_names:
+            self.arrays[name] = wide[name].to_numpy(dtype=np.float64, na_value=np.nan)
+        self.arrays['model'] = wide['model'].to_numpy(dtype=object)
+
+        columns = list(self.arrays)
+        if columns != self.columns:
+            self.columns = columns
+            self.tree.configure(columns=columns)
+            for name in columns:
+                info = tag_info_by_name(name)
+                label = info['label'] if info else {'datetime': '測定日時', 'model': '機器'}[name]
+                self.tree.heading(name, text=label, command=lambda c=name: self.sort_by(c))
+                self.tree.column(name, width=150 if name == 'datetime' else 90, anchor=tk.E if info else tk.W)
+
+        self.apply_filter(keep_position=True)
+        if anchor is not None and self.first_row:
+            matches = np.flatnonzero((self.arrays['datetime'][self.view] == anchor[0])
+                                     & (self.arrays['model'][self.view] == anchor[1]))
+            if len(matches):
+                self.scroll_to(int(matches[0]))
+
+    def apply_filter(self, keep_position=False):
+        """期間で絞り込み（測定日時の配列に対する一括比較）"""
+        timestamps = self.arrays.get('datetime')
+        if timestamps is None:
+            return
+
+        mask = np.ones(len(timestamps), dtype=bool)
+        try:
+            if self.filter_from_var.get().strip():
+                start = to_datetime(self.filter_from_var.get())
+                mask &= timestamps >= np.datetime64(start, 's').astype(np.int64)
+            if self.filter_to_var.get().strip():
+                end = to_datetime(self.filter_to_var.get(), end_of_day=True)
+                mask &= timestamps <= np.datetime64(end, 's').astype(np.int64)
+        except ValueError:
+            self.count_var.set("日付はYYYY-MM-DD形式で入力してください")
+            return
+
+        self.filtered = np.flatnonzero(mask)
+        self.sort_by(self.sort_column, toggle=False, keep_position=keep_position)
+
+    def clear_filter(self):
+        self.filter_from_var.set("")
+        self.filter_to_var.set("")
+        self.apply_filter()
+
+    def sort_by(self, column, toggle=True, keep_position=False):
+        """列で並べ替え（見出しをクリックするたびに昇順・降順を切り替え）
+
+        keep_position=Trueの場合は先頭に戻らず、表示中の行番号を維持する。
+        """
+        if toggle:
+            if column == self.sort_column:
+                self.sort_descending = not self.sort_descending
+            else:
+                self.sort_column = column
+                self.sort_descending = False
+
+        values = self.arrays[self.sort_column][self.filtered]
+        if self.sort_column == 'model':
+            values = values.astype(str)
+        order = np.argsort(values, kind='stable')
+        if self.sort_descending:
+            # 欠損値（NaN）は昇順・降順どちらでも末尾にする
+            if values.dtype.kind == 'f':
+                missing = np.isnan(values[order])
+                order = np.concatenate([order[~missing][::-1], order[missing]])
+            else:
+                order = order[::-1]
+
+        self.view = self.filtered[order]
+        self.count_var.set(f"{len(self.view)}件 / 全{len(self.arrays['datetime'])}件")
+        self.scroll_to(self.first_row if keep_position else 0)
+
+    def on_resize(self, event):
+        rows = max(1, event.height // ROW_HEIGHT - 1)
+        if rows != self.visible_rows:
+            self.visible_rows = rows
+            self.scroll_to(self.first_row)
+
+    def on_mousewheel(self, event):
+        """ホイールで3行ずつスクロール（Windowsは120単位、macOSは小さな値で届く）"""
+        if not event.delta:
+            return
+        steps = int(event.delta / 120) or (1 if event.delta > 0 else -1)
+        self.scroll_to(self.first_row - steps * 3)
+
+    def on_scroll(self, action, value, unit=None):
+        """スクロールバーの操作を行番号に変換"""
+        if action == "moveto":
+            self.scroll_to(int(float(value) * len(self.view)))
+        elif action == "scroll":
+            step = self.visible_rows if unit == "pages" else 1
+            self.scroll_to(self.first_row + int(value) * step)
+
+    def scroll_to(self, first_row):
+        """指定した行から画面に収まる分だけを描画"""
+        max_first = max(0, len(self.view) - self.visible_rows)
+        self.first_row = min(max(0, first_row), max_first)
+        self.render()
+
+    def render(self):
+        with tracing.span('preview_render', rows=self.visible_rows):
+            self._render()
+
+    def _render(self):
+        self.tree.delete(*self.tree.get_children())
+
+        rows = self.view[self.first_row:self.first_row + self.visible_rows]
+        if len(rows):
+            stamps = np.datetime_as_string(self.arrays['datetime'][rows].astype('datetime64[s]'), unit='s')
+            for i, row in enumerate(rows):
+                values = []
+                for name in self.columns:
+                    if name == 'datetime':
+                        values.append(str(stamps[i]).replace('T', ' '))
+                    elif name == 'model':
+                        values.append(self.arrays[name][row])
+                    else:
+                        value = self.arrays[name][row]
+                        values.append('' if np.isnan(value) else f"{value:g}")
+                self.tree.insert('', tk.END, values=values)
+
+        total = len(self.view)
+        if total:
+            self.scrollbar.set(self.first_row / total, min(1.0, (self.first_row + self.visible_rows) / total))
+        else:
+            self.scrollbar.set(0.0, 1.0)
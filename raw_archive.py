@@ -0,0 +1,217 @@
+"""innerscan.json のレスポンスをそのまま保存する追記専用のアーカイブ
+
+取得したレスポンスをリクエスト条件とともに月ごとの gzip 圧縮 JSON Lines
+（data/archive/innerscan-YYYY-MM.jsonl.gz）に追記する。1件ごとに独立した
+gzip メンバーとして書き込み、その位置をインデックス（index.jsonl）に記録
+するので、解析や保存の処理を変えたときに必要な期間のレスポンスだけを
+APIを呼ばずに読み直せる。アクセストークンは保存しない。
+
+使い方（保存済みのレスポンスから作り直す）:
+    python raw_archive.py --from 2024-01-01 --to 2024-12-31 --formats csv xlsx
+    python raw_archive.py --rebuild-index   # インデックスをアーカイブから作り直す
+"""
+import argparse
+import gzip
+import json
+import os
+import sys
+import threading
+import zlib
+from datetime import datetime
+
+import tracing
+from health_planet_api import merge_innerscan_data, to_datetime
+
+DEFAULT_ARCHIVE_DIR = os.path.join("data", "archive")
+INDEX_NAME = "index.jsonl"
+# gzipの圧縮レベル（1件ずつ圧縮するため既定の9より速い6）
+COMPRESS_LEVEL = 6
+# インデックスに記録するリクエストパラメータ
+ARCHIVED_PARAMS = ('date', 'from', 'to', 'tag')
+
+
+class RawArchive:
+    """APIレスポンスの追記専用アーカイブ（月ごとに分割、gzip圧縮）"""
+
+    def __init__(self, archive_dir=DEFAULT_ARCHIVE_DIR):
+        self.archive_dir = archive_dir
+        self.index_path = os.path.join(archive_dir, INDEX_NAME)
+        os.makedirs(archive_dir, exist_ok=True)
+        self.lock = threading.Lock()
+
+    def _archive_path(self, name):
+        return os.path.join(self.archive_dir, name)
+
+    def append(self, account, params, payload, url=None):
+        """レスポンスを1件追記し、インデックスのエントリを返す"""
+        now = datetime.now()
+        record = {
+            'account': account,
+            'url': url,
+            'params': {key: params[key] for key in ARCHIVED_PARAMS if key in params},
+            'archived_at': now.isoformat(timespec='seconds'),
+            'payload': payload,
+        }
+        member = gzip.compress(json.dumps(record, ensure_ascii=False).encode('utf-8'),
+                               compresslevel=COMPRESS_LEVEL)
+        name = f"innerscan-{now:%Y-%m}.jsonl.gz"
+
+        with tracing.span('archive_append', bytes=len(member)), self.lock:
+            with open(self._archive_path(name), 'ab') as f:
+                offset = f.seek(0, os.SEEK_END)
+                f.write(member)
+            entry = self._index_entry(record, name, offset, len(member))
+            with open(self.index_path, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+        return entry
+
+    @staticmethod
+    def _index_entry(record, name, offset, length):
+        params = record['params']
+        return {
+            'file': name,
+            'offset': offset,
+            'length': length,
+            'account': record['account'],
+            'from': params.get('from'),
+            'to': params.get('to'),
+            'tag': params.get('tag'),
+            'rows': len(record['payload'].get('data') or []),
+            'archived_at': record['archived_at'],
+        }
+
+    def entries(self, account=None, from_date=None, to_date=None, latest_only=True):
+        """条件に合うインデックスのエントリを新しく保存した順に返す
+
+        期間は取得したウィンドウが重なるものを対象にする。latest_only=Trueの場合、
+        同じ条件（アカウント・期間・項目）で何度も取得したウィンドウは最新の1件だけ返す。
+        """
+        low = to_datetime(from_date).strftime("%Y%m%d%H%M%S") if from_date else None
+        high = to_datetime(to_date, end_of_day=True).strftime("%Y%m%d%H%M%S") if to_date else None
+
+        try:
+            with open(self.index_path, encoding='utf-8') as f:
+                entries = [json.loads(line) for line in f if line.strip()]
+        except FileNotFoundError:
+            return []
+
+        selected = []
+        seen = set()
+        for entry in reversed(entries):
+            if account is not None and entry['account'] != account:
+                continue
+            if low and entry['to'] and entry['to'] < low:
+                continue
+            if high and entry['from'] and entry['from'] > high:
+                continue
+            if latest_only:
+                key = (entry['account'], entry['from'], entry['to'], entry['tag'])
+                if key in seen:
+                    continue
+                seen.add(key)
+            selected.append(entry)
+        return selected
+
+    def read(self, entry):
+        """エントリの位置にあるレコード（リクエスト条件とレスポンス）を読み込む"""
+        with open(self._archive_path(entry['file']), 'rb') as f:
+            f.seek(entry['offset'])
+            member = f.read(entry['length'])
+        return json.loads(gzip.decompress(member))
+
+    def iter_payloads(self, account=None, from_date=None, to_date=None, latest_only=True):
+        """条件に合うレスポンスを新しく保存した順にyieldする（ファイルは1度ずつ開く）"""
+        selected = self.entries(account, from_date, to_date, latest_only)
+        by_file = {}
+        for entry in selected:
+            by_file.setdefault(entry['file'], []).append(entry)
+
+        for name, file_entries in by_file.items():
+            with open(self._archive_path(name), 'rb') as f:
+                for entry in file_entries:
+                    f.seek(entry['offset'])
+                    with tracing.span('archive_read', bytes=entry['length'], rows=entry['rows']):
+                        record = json.loads(gzip.decompress(f.read(entry['length'])))
+                    yield record['payload']
+
+    def load(self, account=None, from_date=None, to_date=None):
+        """期間のレスポンスを結合し、APIレスポンスと同じ形式で返す（なければNone）
+
+        同じ測定が複数のレスポンスにある場合は、新しく保存した方を使う。
+        """
+        merged = merge_innerscan_data(self.iter_payloads(account, from_date, to_date))
+        if merged is None:
+            return None
+
+        low = to_datetime(from_date).strftime("%Y%m%d%H%M") if from_date else None
+        high = to_datetime(to_date, end_of_day=True).strftime("%Y%m%d%H%M") if to_date else None
+        if low or high:
+            merged['data'] = [item for item in merged['data']
+                              if (not low or item['date'] >= low) and (not high or item['date'] <= high)]
+        return merged
+
+    def rebuild_index(self):
+        """アーカイブファイルを先頭から読み、インデックスを作り直す
+
+        gzipメンバーの境界は展開しながら求める。末尾の書きかけのメンバーは無視する。
+        """
+        names = sorted(name for name in os.listdir(self.archive_dir)
+                       if name.startswith("innerscan-") and name.endswith(".jsonl.gz"))
+        entries = []
+        for name in names:
+            with open(self._archive_path(name), 'rb') as f:
+                data = f.read()
+            offset = 0
+            while offset < len(data):
+                decompressor = zlib.decompressobj(wbits=31)
+                try:
+                    text = decompressor.decompress(data[offset:])
+                except zlib.error:
+                    break
+                if not decompressor.eof:
+                    break
+                length = len(data) - offset - len(decompressor.unused_data)
+                entries.append(self._index_entry(json.loads(text), name, offset, length))
+                offset += length
+
+        with self.lock:
+            tmp_path = f"{self.index_path}.tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                f.writelines(json.dumps(entry, ensure_ascii=False) + "\n" for entry in entries)
+            os.replace(tmp_path, self.index_path)
+        return len(entries)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="保存済みのレスポンスからデータを作り直す")
+    parser.add_argument("--archive-dir", default=DEFAULT_ARCHIVE_DIR, help="アーカイブのディレクトリ")
+    parser.add_argument("--account", default="default", help="アカウント")
+    parser.add_argument("--from", dest="from_date", help="開始日（YYYY-MM-DD）")
+    parser.add_argument("--to", dest="to_date", help="終了日（YYYY-MM-DD）")
+    parser.add_argument("--formats", nargs="+", default=['csv'], help="保存する形式（csv, xlsx, jsonl, parquet）")
+    parser.add_argument("--output-dir", default="data", help="保存先のディレクトリ")
+    parser.add_argument("--rebuild-index", action="store_true", help="インデックスを作り直す")
+    options = parser.parse_args(argv)
+
+    archive = RawArchive(options.archive_dir)
+    if options.rebuild_index:
+        print(f"インデックスを作り直しました: {archive.rebuild_index()}件")
+        if options.from_date is None and options.to_date is None:
+            return 0
+
+    data = archive.load(options.account, options.from_date, options.to_date)
+    if not data or not data['data']:
+        print("指定期間のレスポンスが保存されていません")
+        return 1
+
+    from data_exporter import HealthDataExporter
+
+    exporter = HealthDataExporter()
+    exporter.data_dir = options.output_dir
+    os.makedirs(options.output_dir, exist_ok=True)
+    results = exporter.export(data, options.formats, account=options.account)
+    return 0 if results and all(result['path'] for result in results.values()) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,143 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+
+DEFAULT_CACHE_DIR = os.path.join("data", "cache")
+DEFAULT_MAX_BYTES = 50 * 1024 * 1024
+# 今日を含むウィンドウの有効期間（秒）
+DEFAULT_RECENT_TTL = 600
+# この日数より前に終わるウィンドウは変更されないものとして扱う
+IMMUTABLE_AFTER_DAYS = 2
+
+
+class ResponseCache:
+    """innerscan.jsonのレスポンスをディスクに保存するLRUキャッシュ"""
+
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR, max_bytes=DEFAULT_MAX_BYTES,
+                 recent_ttl=DEFAULT_RECENT_TTL):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.recent_ttl = recent_ttl
+        if not os.path.exists(self.cache_dir):
+            os.makedirs(self.cache_dir)
+
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.total_bytes = sum(size for _, size, _ in self._entries())
+
+    @staticmethod
+    def make_key(account, from_str, to_str, tags, date_mode):
+        """リクエスト条件からキャッシュキーを生成"""
+        tag_set = ",".join(sorted(str(tags).split(",")))
+        source = json.dumps([account, from_str, to_str, tag_set, str(date_mode)])
+        return hashlib.sha256(source.encode("utf-8")).hexdigest()
+
+    @staticmethod
+    def is_immutable(to_date):
+        """ウィンドウの終了日時が十分過去であれば変更されないとみなす"""
+        return to_date < datetime.now() - timedelta(days=IMMUTABLE_AFTER_DAYS)
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.json")
+
+    def _entries(self):
+        """(パス, サイズ, 最終アクセス時刻) の一覧"""
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            if not name.endswith(".json"):
+                continue
+            path = os.path.join(self.cache_dir, name)
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            entries.append((path, stat.st_size, stat.st_mtime))
+        return entries
+
+    def get(self, key):
+        """キャッシュされたレスポンスを返す（なければNone）"""
+        path = self._path(key)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                entry = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            with self.lock:
+                self.misses += 1
+            return None
+
+        if not entry["immutable"] and time.time() - entry["stored_at"] > self.recent_ttl:
+            self._remove(path)
+            with self.lock:
+                self.misses += 1
+            return None
+
+        # 最終アクセス時刻を更新（LRU）
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            pass
+        with self.lock:
+            self.hits += 1
+        return entry["payload"]
+
+    def put(self, key, payload, immutable):
+        """レスポンスを保存し、上限を超えた分を古い順に削除"""
+        path = self._path(key)
+        entry = {"stored_at": time.time(), "immutable": immutable, "payload": payload}
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(entry, f, ensure_ascii=False)
+
+        old_size = os.path.getsize(path) if os.path.exists(path) else 0
+        os.replace(tmp_path, path)
+        with self.lock:
+            self.total_bytes += os.path.getsize(path) - old_size
+            over_limit = self.total_bytes > self.max_bytes
+
+        if over_limit:
+            self._evict()
+
+    def _remove(self, path):
+        try:
+            size = os.path.getsize(path)
+            os.remove(path)
+        except FileNotFoundError:
+            return
+        with self.lock:
+            self.total_bytes -= size
+
+    def _evict(self):
+        entries = sorted(self._entries(), key=lambda e: e[2])
+        total = sum(size for _, size, _ in entries)
+        for path, size, _ in entries:
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                continue
+            total -= size
+            with self.lock:
+                self.evictions += 1
+        with self.lock:
+            self.total_bytes = total
+
+    def clear(self):
+        """キャッシュをすべて削除"""
+        for path, _, _ in self._entries():
+            self._remove(path)
+
+    def get_stats(self):
+        """ヒット・ミス回数とキャッシュサイズを返す"""
+        with self.lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "bytes": self.total_bytes,
+            }
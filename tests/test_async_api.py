@@ -0,0 +1,64 @@
+import asyncio
+import contextlib
+import io
+import threading
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+pytest.importorskip("aiohttp")
+
+from async_health_planet_api import AsyncHealthPlanetAPI  # noqa: E402
+
+
+class MaintenancePage(BaseHTTPRequestHandler):
+    """200でHTMLを返す（メンテナンス画面・プロキシのエラー画面）"""
+
+    def do_GET(self):
+        self.reply()
+
+    def do_POST(self):
+        self.reply()
+
+    def reply(self):
+        body = b"<html><body>maintenance</body></html>"
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), MaintenancePage)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{httpd.server_address[1]}"
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def test_non_json_response_is_reported_as_failure(server):
+    api = AsyncHealthPlanetAPI("id", "secret", rate_limit=None)
+    api.innerscan_url = f"{server}/status/innerscan.json"
+    api.token_url = f"{server}/oauth/token"
+    api.tokens = {'alice': 'token'}
+
+    async def fetch():
+        async with api:
+            window = await api._fetch_window('alice', datetime(2024, 1, 1), datetime(2024, 1, 31))
+            token = await api.get_access_token('code', 'bob')
+        return window, token
+
+    output = io.StringIO()
+    with contextlib.redirect_stdout(output):
+        window, token = asyncio.run(fetch())
+
+    assert window is None
+    assert token is None
+    assert "[alice] データ取得に失敗しました" in output.getvalue()
@@ -0,0 +1,73 @@
+import contextlib
+import io
+import json
+
+import async_health_planet_api
+import batch_runner
+import health_planet_api
+
+
+def missing_credentials(refresh=False):
+    raise ValueError("認証情報が見つかりません")
+
+
+def payload():
+    return {
+        'birth_date': '19850401', 'height': '170.0', 'sex': 'male',
+        'data': [{'date': '202401100700', 'keydata': '65.2', 'model': '01000145', 'tag': '6021'}],
+    }
+
+
+def manifest(output_dir):
+    return {
+        'from_date': '2024-01-01', 'to_date': '2024-01-31',
+        'output_dir': str(output_dir), 'formats': ['csv'],
+        'accounts': [{'name': 'alice', 'access_token': 'token-a'}, {'name': 'bob'}],
+    }
+
+
+def test_account_without_credentials_is_reported(tmp_path, monkeypatch):
+    monkeypatch.setattr(health_planet_api, 'load_credentials', missing_credentials)
+    monkeypatch.setattr(async_health_planet_api, 'load_credentials', missing_credentials)
+    monkeypatch.setattr(batch_runner, 'TokenStore', lambda: None)
+
+    fetched_accounts = []
+
+    async def fetch_all(api, accounts, from_date, to_date):
+        fetched_accounts.extend(account['name'] for account in accounts)
+        return {name: (payload(), 0.0, None) for name in fetched_accounts}
+
+    monkeypatch.setattr(batch_runner, 'fetch_all', fetch_all)
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        report = batch_runner.run(manifest(tmp_path), workers=1)
+
+    accounts = {result['name']: result for result in report['accounts']}
+    assert fetched_accounts == ['alice']
+    assert accounts['alice']['status'] == 'ok'
+    assert accounts['bob']['status'] == 'error'
+    assert "認証情報が見つかりません" in accounts['bob']['error']
+    assert report['succeeded'] == 1
+    assert report['failed'] == 1
+
+
+def test_unexpected_fetch_error_fails_only_that_account(tmp_path, monkeypatch):
+    async def get_range(self, account, from_date, to_date):
+        if account == 'bob':
+            raise json.JSONDecodeError("Expecting value", "<html>", 0)
+        return payload()
+
+    monkeypatch.setattr(async_health_planet_api.AsyncHealthPlanetAPI,
+                        'get_body_composition_data_range', get_range)
+    config = manifest(tmp_path)
+    config['accounts'][1]['access_token'] = 'token-b'
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        report = batch_runner.run(config, workers=1)
+
+    accounts = {result['name']: result for result in report['accounts']}
+    assert accounts['alice']['status'] == 'ok'
+    assert accounts['alice']['files']
+    assert accounts['bob']['status'] == 'error'
+    assert "JSONDecodeError" in accounts['bob']['error']
+    assert report['failed'] == 1
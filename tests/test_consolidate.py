@@ -0,0 +1,13 @@
+from consolidate import merge_ranges
+
+
+def test_merge_ranges_joins_overlapping_and_adjacent_days():
+    ranges = [('2024-01-01', '2024-01-10'), ('2024-01-11', '2024-01-20'),
+              ('2024-01-15', '2024-01-25'), ('2024-01-27', '2024-01-31')]
+
+    assert merge_ranges(ranges) == [['2024-01-01', '2024-01-25'], ['2024-01-27', '2024-01-31']]
+
+
+def test_merge_ranges_joins_across_month_boundary():
+    assert merge_ranges([('2024-03-01', '2024-03-31'), ('2024-02-01', '2024-02-29')]) == [
+        ['2024-02-01', '2024-03-31']]
@@ -0,0 +1,39 @@
+from datetime import datetime, timedelta
+
+from fetch_job import FetchJob
+
+
+class GrowingStore:
+    """ウィンドウごとに100行ずつ保存されるストア"""
+
+    def __init__(self, windows=100, rows_per_window=100):
+        self.windows = windows
+        self.rows_per_window = rows_per_window
+        self.saved = 0
+        self.loads = 0
+
+    def sync(self, api, from_date, to_date, progress=None, cancel=None, tags=None):
+        for done in range(1, self.windows + 1):
+            self.saved += self.rows_per_window
+            progress(done, self.windows, self.rows_per_window)
+        return self.saved
+
+    def to_raw_data(self, from_date, to_date):
+        self.loads += 1
+        start = datetime(2020, 1, 1)
+        return {'data': [{'date': (start + timedelta(hours=i)).strftime("%Y%m%d%H%M"), 'keydata': '65.0',
+                          'model': '01000145', 'tag': '6021'} for i in range(self.saved)]}
+
+
+def test_partial_datasets_are_rebuilt_only_as_rows_grow():
+    store = GrowingStore()
+    partials = []
+    job = FetchJob(None, store, "2020-01-01", "2021-01-01", partial_interval=0,
+                   on_partial=lambda job, dataset: partials.append(len(dataset)))
+    job.run()
+
+    assert job.error is None
+    assert len(job.result) == store.saved
+    # 毎ウィンドウではなく、行数が一定の割合増えたときだけ作り直す
+    assert len(partials) < 20
+    assert store.loads == len(partials) + 2  # 開始時（空）と完了時
@@ -0,0 +1,49 @@
+import queue
+
+import gui_app
+
+
+class FakeText:
+    """ログ表示のtk.Textの代わり（行の挿入・削除のみ）"""
+
+    def __init__(self):
+        self.lines = []
+
+    def insert(self, index, text):
+        self.lines.extend(text.splitlines())
+
+    def index(self, index):
+        return f"{len(self.lines) + 1}.0"
+
+    def delete(self, start, end):
+        del self.lines[:int(end.split('.')[0]) - 1]
+
+    def see(self, index):
+        pass
+
+
+class FakeRoot:
+    def after(self, ms, callback):
+        pass
+
+
+def make_gui():
+    gui = gui_app.HealthPlanetGUI.__new__(gui_app.HealthPlanetGUI)
+    gui.root = FakeRoot()
+    gui.events = queue.Queue()
+    gui.pending_log_lines = []
+    gui.log_text = FakeText()
+    return gui
+
+
+def test_log_lines_beyond_one_poll_are_rendered():
+    gui = make_gui()
+    count = gui_app.MAX_EVENTS_PER_POLL * 2 + 500
+    for i in range(count):
+        gui.log_message(f"msg {i}")
+
+    while not gui.events.empty():
+        gui.process_events()
+
+    assert gui.log_text.lines[-1].endswith(f"msg {count - 1}")
+    assert len(gui.log_text.lines) == gui_app.LOG_MAX_LINES
@@ -0,0 +1,23 @@
+import contextlib
+import io
+
+from benchmarks.mock_server import MockHealthPlanet
+from benchmarks.payloads import generate_payload
+from health_planet_api import RATE_LIMIT_PERIOD, HealthPlanetAPI, get_rate_limiter
+
+
+def test_code_exchange_is_not_retried():
+    with MockHealthPlanet(generate_payload(years=0.1), error_rate=1.0) as server:
+        api = HealthPlanetAPI("id", "secret", rate_limit=None, backoff=0.01)
+        server.configure_api(api)
+        with contextlib.redirect_stdout(io.StringIO()):
+            assert api.get_access_token("code") is None
+
+    assert server.requests == 1
+
+
+def test_rate_limiter_follows_the_latest_rate():
+    limiter = get_rate_limiter("rate-test", 60)
+    assert get_rate_limiter("rate-test", 120) is limiter
+    assert limiter.capacity == 120
+    assert limiter.fill_rate == 120 / RATE_LIMIT_PERIOD
@@ -0,0 +1,64 @@
+import contextlib
+import io
+import sqlite3
+from datetime import datetime
+
+import measurement_store
+from benchmarks.mock_server import MockHealthPlanet
+from benchmarks.payloads import generate_payload
+from health_planet_api import HealthPlanetAPI
+from innerscan_tags import ALL_TAGS
+from measurement_store import MeasurementStore
+
+
+def payload(date, tags):
+    values = {'6021': '65.2', '6022': '21.5', '6023': '48.1'}
+    return {
+        'birth_date': '19850401', 'height': '170.0', 'sex': 'male',
+        'data': [{'date': date, 'keydata': values[tag], 'model': '01000145', 'tag': tag} for tag in tags],
+    }
+
+
+def test_connections_are_closed(tmp_path, monkeypatch):
+    opened = []
+    original = sqlite3.connect
+
+    def connect(path):
+        conn = original(path)
+        opened.append(conn)
+        return conn
+
+    monkeypatch.setattr(measurement_store.sqlite3, 'connect', connect)
+    store = MeasurementStore(str(tmp_path / "store.db"))
+    with contextlib.redirect_stdout(io.StringIO()):
+        store.upsert(payload('202401100700', ['6021', '6022']))
+    store.to_raw_data()
+
+    assert len(opened) >= 3
+    for conn in opened:
+        # 閉じた接続はProgrammingErrorになる
+        try:
+            conn.execute("SELECT 1")
+        except sqlite3.ProgrammingError:
+            continue
+        raise AssertionError("接続が閉じられていません")
+
+
+def test_narrower_sync_keeps_other_tags_synced(tmp_path):
+    store = MeasurementStore(str(tmp_path / "store.db"))
+    with MockHealthPlanet(generate_payload(years=2, end=datetime(2025, 1, 1))) as server, \
+            contextlib.redirect_stdout(io.StringIO()):
+        api = HealthPlanetAPI("id", "secret", rate_limit=None)
+        server.configure_api(api)
+        api.get_access_token("code")
+
+        assert store.sync(api, "2023-01-01", "2024-12-31", tags=ALL_TAGS) > 0
+        full_requests = server.requests
+        assert store.sync(api, "2023-01-01", "2024-12-31", tags=['6021']) is not None
+        narrow_requests = server.requests
+        assert store.sync(api, "2023-01-01", "2024-12-31", tags=ALL_TAGS) is not None
+
+    # 体重だけの同期の後でも、全項目を最初から取り直さない
+    assert full_requests > 2
+    assert server.requests - narrow_requests == 1
+    assert store.get_sync_state(tags=ALL_TAGS)[0] == datetime(2023, 1, 1)
@@ -0,0 +1,62 @@
+import contextlib
+import io
+
+import pytest
+
+from data_exporter import HealthDataExporter
+
+pytest.importorskip("pyarrow")
+
+
+def payload(date, tags):
+    values = {'6021': '65.2', '6022': '21.5', '6023': '48.1', '6027': '1450'}
+    return {
+        'birth_date': '19850401', 'height': '170.0', 'sex': 'male',
+        'data': [{'date': date, 'keydata': values[tag], 'model': '01000145', 'tag': tag} for tag in tags],
+    }
+
+
+def test_partitions_with_different_tags_round_trip(tmp_path):
+    exporter = HealthDataExporter()
+    exporter.data_dir = str(tmp_path)
+    with contextlib.redirect_stdout(io.StringIO()):
+        assert exporter.save_to_parquet(payload('202401100700', ['6021', '6022']))
+        assert exporter.save_to_parquet(payload('202402100700', ['6021', '6022', '6023', '6027']))
+
+    frame = exporter.load_from_parquet()
+
+    assert len(frame) == 2
+    latest = frame.iloc[-1]
+    assert latest['muscle_mass'] == pytest.approx(48.1)
+    assert latest['basal_metabolism'] == 1450
+    assert frame['muscle_mass'].isna().iloc[0]
+
+
+def test_export_reports_only_written_partition_bytes(tmp_path):
+    exporter = HealthDataExporter()
+    exporter.data_dir = str(tmp_path)
+    with contextlib.redirect_stdout(io.StringIO()):
+        exporter.export(payload('202401100700', ['6021', '6022']), ['parquet'])
+        results = exporter.export(payload('202402100700', ['6021', '6022']), ['parquet'])
+
+    written = tmp_path / "parquet" / "account=default" / "year_month=2024-02" / "part-0.parquet"
+    assert results['parquet']['bytes'] == written.stat().st_size
+
+
+def test_appending_fewer_tags_keeps_stored_values(tmp_path):
+    exporter = HealthDataExporter()
+    exporter.data_dir = str(tmp_path)
+    with contextlib.redirect_stdout(io.StringIO()):
+        assert exporter.save_to_parquet(payload('202401100700', ['6021', '6022', '6023', '6027']))
+        weight_only = payload('202401100700', ['6021'])
+        weight_only['data'][0]['keydata'] = '65.0'
+        assert exporter.save_to_parquet(weight_only)
+
+    frame = exporter.load_from_parquet()
+
+    assert len(frame) == 1
+    row = frame.iloc[0]
+    assert row['weight'] == pytest.approx(65.0)
+    assert row['body_fat'] == pytest.approx(21.5)
+    assert row['muscle_mass'] == pytest.approx(48.1)
+    assert row['basal_metabolism'] == 1450
@@ -0,0 +1,35 @@
+import contextlib
+import io
+from datetime import datetime
+
+from benchmarks.mock_server import MockHealthPlanet
+from benchmarks.payloads import generate_payload
+from health_planet_api import MAX_WINDOW_DAYS, HealthPlanetAPI, split_date_range
+from response_cache import ResponseCache
+
+
+def test_windows_follow_a_fixed_grid():
+    first = split_date_range(datetime(2020, 1, 1), datetime(2021, 6, 30, 23, 59, 59))
+    second = split_date_range(datetime(2020, 2, 15), datetime(2021, 3, 31, 23, 59, 59))
+
+    assert all((end - start).days < MAX_WINDOW_DAYS for start, end in first + second)
+    assert second[1:-1] == [window for window in first if window in second[1:-1]]
+    assert len(second[1:-1]) > 0
+
+
+def test_overlapping_ranges_reuse_cached_windows(tmp_path):
+    payload = generate_payload(years=2, end=datetime(2021, 7, 1))
+    with MockHealthPlanet(payload) as server, contextlib.redirect_stdout(io.StringIO()):
+        cache = ResponseCache(str(tmp_path))
+        api = HealthPlanetAPI("id", "secret", rate_limit=None, cache=cache)
+        server.configure_api(api)
+        api.get_access_token("code")
+
+        assert api.get_body_composition_data_range("2020-01-01", "2021-06-30")
+        requests_before = server.requests
+        assert api.get_body_composition_data_range("2020-02-15", "2021-03-31")
+
+    windows = split_date_range(datetime(2020, 2, 15), datetime(2021, 3, 31, 23, 59, 59))
+    # 両端の切られたウィンドウだけを取得し、途中はキャッシュから返す
+    assert server.requests - requests_before == 2
+    assert cache.hits == len(windows) - 2
@@ -0,0 +1,27 @@
+import json
+
+import tracing
+
+
+def test_chrome_trace_export_survives_concurrent_disable(tmp_path, monkeypatch):
+    tracer = tracing.enable()
+    try:
+        with tracing.operation('fetch'), tracing.span('http'):
+            pass
+        snapshot = tracer.snapshot
+
+        def snapshot_then_disable():
+            spans = snapshot()
+            # 書き出し中に別スレッドから無効化された場合
+            tracing.disable()
+            return spans
+
+        monkeypatch.setattr(tracer, 'snapshot', snapshot_then_disable)
+        path = tracing.export_chrome_trace(str(tmp_path / "trace.json"))
+    finally:
+        tracing.disable()
+
+    with open(path, encoding='utf-8') as f:
+        events = json.load(f)['traceEvents']
+    assert {event['name'] for event in events} == {'fetch', 'http'}
+    assert {event['cat'] for event in events} == {'fetch'}
@@ -0,0 +1,85 @@
+import json
+import os
+import threading
+
+DEFAULT_TOKEN_PATH = os.path.join("data", "tokens.enc")
+DEFAULT_KEY_PATH = os.path.join("data", ".token_key")
+KEY_ENV_VAR = "HEALTH_PLANET_TOKEN_KEY"
+
+
+class TokenStore:
+    """アカウントごとのトークンを暗号化してファイルに保存するストア
+
+    暗号鍵は環境変数 HEALTH_PLANET_TOKEN_KEY、なければ鍵ファイルから読み込み、
+    どちらもなければ新しく生成して鍵ファイル（所有者のみ読み書き可）に保存する。
+    """
+
+    def __init__(self, path=DEFAULT_TOKEN_PATH, key_path=DEFAULT_KEY_PATH):
+        try:
+            from cryptography.fernet import Fernet
+        except ImportError:
+            raise ImportError("トークンの保存にはcryptographyが必要です: pip install cryptography")
+
+        self.path = path
+        self.key_path = key_path
+        self.fernet = Fernet(self._load_key(Fernet))
+        self.lock = threading.Lock()
+
+    def _load_key(self, fernet_class):
+        key = os.getenv(KEY_ENV_VAR)
+        if key:
+            return key.encode("ascii")
+
+        if os.path.exists(self.key_path):
+            with open(self.key_path, "rb") as f:
+                return f.read().strip()
+
+        key = fernet_class.generate_key()
+        key_dir = os.path.dirname(self.key_path)
+        if key_dir and not os.path.exists(key_dir):
+            os.makedirs(key_dir)
+        fd = os.open(self.key_path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+        with os.fdopen(fd, "wb") as f:
+            f.write(key)
+        return key
+
+    def _read_all(self):
+        if not os.path.exists(self.path):
+            return {}
+        with open(self.path, "rb") as f:
+            return json.loads(self.fernet.decrypt(f.read()).decode("utf-8"))
+
+    def _write_all(self, tokens):
+        token_dir = os.path.dirname(self.path)
+        if token_dir and not os.path.exists(token_dir):
+            os.makedirs(token_dir)
+
+        tmp_path = f"{self.path}.tmp"
+        fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, "wb") as f:
+            f.write(self.fernet.encrypt(json.dumps(tokens).encode("utf-8")))
+        os.replace(tmp_path, self.path)
+
+    def get(self, account):
+        """保存済みのトークン情報（access_token, refresh_token, expires_at）を返す"""
+        with self.lock:
+            return self._read_all().get(account)
+
+    def set(self, account, token):
+        """トークン情報を保存"""
+        with self.lock:
+            tokens = self._read_all()
+            tokens[account] = token
+            self._write_all(tokens)
+
+    def delete(self, account):
+        """トークン情報を削除"""
+        with self.lock:
+            tokens = self._read_all()
+            if tokens.pop(account, None) is not None:
+                self._write_all(tokens)
+
+    def accounts(self):
+        """トークンが保存されているアカウントの一覧"""
+        with self.lock:
+            return list(self._read_all())
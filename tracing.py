@@ -0,0 +1,231 @@
+"""処理ごとの所要時間を記録する計測機能
+
+    import tracing
+    tracing.enable()
+    with tracing.span('parse', rows=len(data)) as s:
+        ...
+        s.set(bytes=size)
+    tracing.export_chrome_trace('trace.json')  # chrome://tracing や Perfetto で表示
+
+無効のとき span() は何もしない共有オブジェクトを返すだけなので、
+計測箇所を残したままでもほとんど負荷にならない。
+環境変数 HEALTH_PLANET_TRACE にファイル名を指定すると起動時から記録し、
+終了時に書き出す（拡張子が .jsonl ならJSON Lines、それ以外はChromeトレース形式）。
+"""
+import atexit
+import json
+import os
+import threading
+import time
+from collections import deque
+
+TRACE_ENV_VAR = "HEALTH_PLANET_TRACE"
+# 保持するスパンの上限（古いものから捨てる）
+MAX_SPANS = 100000
+# 処理別の集計を保持する操作の数
+MAX_OPERATIONS = 20
+
+_tracer = None
+
+
+class _NullSpan:
+    """無効時に返すスパン（何もしない）"""
+
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+    def set(self, **attrs):
+        pass
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class Span:
+    __slots__ = ('tracer', 'name', 'attrs', 'operation', 'thread', 'start', 'duration')
+
+    def __init__(self, tracer, name, attrs):
+        self.tracer = tracer
+        self.name = name
+        self.attrs = attrs
+        self.operation = tracer.operation
+        self.thread = threading.get_ident()
+        self.start = 0
+        self.duration = 0
+
+    def __enter__(self):
+        self.start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.duration = time.perf_counter_ns() - self.start
+        if exc_type is not None:
+            self.attrs['error'] = exc_type.__name__
+        self.tracer.record(self)
+        return False
+
+    def set(self, **attrs):
+        """行数・バイト数などを後から追加"""
+        self.attrs.update(attrs)
+
+    def to_dict(self):
+        return {
+            'name': self.name,
+            'operation': self.operation,
+            'thread': self.thread,
+            'start_us': (self.start - self.tracer.origin) / 1000,
+            'duration_ms': self.duration / 1e6,
+            **self.attrs,
+        }
+
+
+class Tracer:
+    def __init__(self, max_spans=MAX_SPANS):
+        self.spans = deque(maxlen=max_spans)
+        self.lock = threading.Lock()
+        self.origin = time.perf_counter_ns()
+        self.operation = 0
+        self.operation_names = {}
+        self.stages = {}  # 操作ID → 処理名 → 集計
+        self.listeners = []
+
+    def record(self, span):
+        with self.lock:
+            self.spans.append(span)
+            # 内訳は記録時に集計しておき、表示のたびに全スパンを走査しない
+            stages = self.stages.setdefault(span.operation, {})
+            stage = stages.get(span.name)
+            if stage is None:
+                stage = stages[span.name] = {'name': span.name, 'count': 0, 'duration_ms': 0.0,
+                                             'rows': 0, 'bytes': 0}
+            stage['count'] += 1
+            stage['duration_ms'] += span.duration / 1e6
+            stage['rows'] += span.attrs.get('rows') or 0
+            stage['bytes'] += span.attrs.get('bytes') or 0
+        # 操作全体のスパンが終わったら通知する
+        if span.attrs.get('operation_root'):
+            for listener in list(self.listeners):
+                listener(span.operation)
+
+    def begin_operation(self, name):
+        with self.lock:
+            self.operation += 1
+            self.operation_names[self.operation] = name
+            for old in [op for op in self.stages if op <= self.operation - MAX_OPERATIONS]:
+                del self.stages[old]
+            return self.operation
+
+    def breakdown(self, operation=None):
+        """操作ごとの処理別の合計時間・回数・行数・バイト数（時間の長い順）"""
+        with self.lock:
+            operation = operation or self.operation
+            stages = [dict(stage) for stage in self.stages.get(operation, {}).values()]
+        return sorted(stages, key=lambda stage: stage['duration_ms'], reverse=True)
+
+    def snapshot(self):
+        with self.lock:
+            return list(self.spans)
+
+
+def enable(max_spans=MAX_SPANS):
+    """記録を開始（すでに有効ならそのまま）"""
+    global _tracer
+    if _tracer is None:
+        _tracer = Tracer(max_spans)
+    return _tracer
+
+
+def disable():
+    """記録を停止し、記録済みのスパンを破棄"""
+    global _tracer
+    _tracer = None
+
+
+def is_enabled():
+    return _tracer is not None
+
+
+def get_tracer():
+    return _tracer
+
+
+def span(name, **attrs):
+    """処理1回分のスパン（with文で使う）"""
+    tracer = _tracer  # disable()と並行して呼ばれても同じトレーサーを使う
+    if tracer is None:
+        return _NULL_SPAN
+    return Span(tracer, name, attrs)
+
+
+def operation(name, **attrs):
+    """GUIの操作1回（取得・保存など）にまとめるスパン"""
+    tracer = _tracer
+    if tracer is None:
+        return _NULL_SPAN
+    tracer.begin_operation(name)
+    return Span(tracer, name, dict(attrs, operation_root=True))
+
+
+def add_listener(callback):
+    """操作が終わるたびに callback(操作ID) を呼ぶ（記録中のスレッドから呼ばれる）"""
+    tracer = _tracer
+    if tracer is not None:
+        tracer.listeners.append(callback)
+
+
+def breakdown(operation=None):
+    tracer = _tracer
+    return tracer.breakdown(operation) if tracer is not None else []
+
+
+def export_jsonl(path):
+    """1行に1スパンのJSON Linesで書き出し"""
+    tracer = _tracer
+    spans = tracer.snapshot() if tracer is not None else []
+    with open(path, 'w', encoding='utf-8') as f:
+        for span in spans:
+            f.write(json.dumps(span.to_dict(), ensure_ascii=False) + "\n")
+    return path
+
+
+def export_chrome_trace(path):
+    """Chromeのトレース形式（chrome://tracing・Perfettoで表示可能）で書き出し"""
+    # disable()と並行して呼ばれても途中でNoneにならないよう、1度だけ読む
+    tracer = _tracer
+    if tracer is None:
+        spans, names, origin = [], {}, 0
+    else:
+        spans, names, origin = tracer.snapshot(), tracer.operation_names, tracer.origin
+    pid = os.getpid()
+    events = []
+    for span in spans:
+        events.append({
+            'name': span.name,
+            'cat': names.get(span.operation, 'default'),
+            'ph': 'X',
+            'ts': (span.start - origin) / 1000,
+            'dur': span.duration / 1000,
+            'pid': pid,
+            'tid': span.thread,
+            'args': span.attrs,
+        })
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump({'traceEvents': events, 'displayTimeUnit': 'ms'}, f, ensure_ascii=False)
+    return path
+
+
+def export(path):
+    """拡張子に応じた形式で書き出し"""
+    if path.endswith('.jsonl'):
+        return export_jsonl(path)
+    return export_chrome_trace(path)
+
+
+if os.getenv(TRACE_ENV_VAR):
+    enable()
+    atexit.register(export, os.environ[TRACE_ENV_VAR])
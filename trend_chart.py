@@ -0,0 +1,211 @@
+import tkinter as tk
+from tkinter import ttk
+
+import numpy as np
+
+import tracing
+from innerscan_tags import tag_info_by_name
+
+# 描画する点数の上限（画面の横幅ピクセル数に対する倍率）
+POINTS_PER_PIXEL = 1
+# ズーム範囲ごとの間引き結果をいくつまで保持するか
+MAX_CACHED_LEVELS = 32
+
+
+def lttb(x, y, threshold):
+    """Largest-Triangle-Three-Bucketsで点数をthreshold個に間引く
+
+    x は昇順に並んでいること。NaNを含む点は事前に取り除いておく。
+    戻り値は選ばれた点のインデックス。
+    """
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+
+    # 最初と最後の点は必ず残し、残りを threshold-2 個のバケットに分ける
+    edges = np.linspace(1, n - 1, threshold - 1).astype(np.int64)
+    selected = np.empty(threshold, dtype=np.int64)
+    selected[0] = 0
+    selected[-1] = n - 1
+
+    # 各バケットの次のバケットの平均点（ベクトル化して事前に計算）
+    cum_x = np.concatenate(([0.0], np.cumsum(x)))
+    cum_y = np.concatenate(([0.0], np.cumsum(y)))
+    counts = np.diff(edges)
+    avg_x = np.append((cum_x[edges[1:]] - cum_x[edges[:-1]]) / counts, x[-1])
+    avg_y = np.append((cum_y[edges[1:]] - cum_y[edges[:-1]]) / counts, y[-1])
+
+    previous = 0
+    for i in range(threshold - 2):
+        start, end = edges[i], edges[i + 1]
+        bx, by = x[start:end], y[start:end]
+        # 前回選んだ点・バケット内の点・次のバケットの平均点がなす三角形の面積
+        area = np.abs(
+            (x[previous] - avg_x[i + 1]) * (by - y[previous])
+            - (x[previous] - bx) * (avg_y[i + 1] - y[previous])
+        )
+        previous = start + int(np.argmax(area))
+        selected[i + 1] = previous
+
+    return selected
+
+
+class TrendChart(ttk.Frame):
+    """体重・体脂肪率などの推移グラフ（matplotlib埋め込み）
+
+    表示範囲の横幅に合わせてLTTBで間引いた点だけを描画し、
+    ズーム範囲ごとの間引き結果はキャッシュして再利用する。
+    """
+
+    def __init__(self, master, dataset=None, **kwargs):
+        super().__init__(master, **kwargs)
+
+        from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg, NavigationToolbar2Tk
+        from matplotlib.figure import Figure
+
+        self.series = {}  # 列名 → (x, y)
+        self.cache = {}   # (列名, 表示範囲, 点数) → インデックス
+        self.lines = {}
+        self.axes = {}
+        self.redrawing = False
+
+        self.figure = Figure(figsize=(7, 4), dpi=100)
+        self.canvas = FigureCanvasTkAgg(self.figure, master=self)
+        toolbar = NavigationToolbar2Tk(self.canvas, self, pack_toolbar=False)
+        toolbar.update()
+
+        self.canvas.get_tk_widget().pack(side=tk.TOP, fill=tk.BOTH, expand=True)
+        toolbar.pack(side=tk.BOTTOM, fill=tk.X)
+        # 横幅が変わったら間引く点数も変える（既存のリサイズ処理は残す）
+        self.canvas.get_tk_widget().bind("<Configure>", lambda e: self.after_idle(self.redraw), add="+")
+
+        if dataset is not None:
+            self.set_dataset(dataset)
+
+    def set_dataset(self, dataset, names=('weight', 'body_fat')):
+        """データセットを表示。同じ項目で期間が延びただけなら線の更新のみ行う
+
+        取得中の途中結果で繰り返し呼ばれるため、ズーム・移動した表示範囲は維持する。
+        """
+        wide = dataset.wide
+        names = [name for name in names if name in dataset.value_names]
+
+        series = {}
+        timestamps = wide['timestamp'].to_numpy()
+        order = np.argsort(timestamps, kind='stable')
+        # matplotlibの日付（1970-01-01からの日数）に変換
+        days = timestamps[order] / 86400.0
+        for name in names:
+            values = wide[name].to_numpy(dtype=np.float64, na_value=np.nan)[order]
+            valid = ~np.isnan(values)
+            series[name] = (days[valid], values[valid])
+
+        rebuild = sorted(series) != sorted(self.series)
+        # ズーム・移動していなければ、追加されたデータに合わせて全体表示を広げる
+        full_range = self.at_full_range()
+        previous = self.series
+        self.series = series
+
+        # 間引き結果は値が変わった項目の分だけ捨てる
+        changed = {name for name, (x, y) in series.items()
+                   if name not in previous
+                   or not (np.array_equal(x, previous[name][0]) and np.array_equal(y, previous[name][1]))}
+        for key in [key for key in self.cache if key[0] in changed]:
+            del self.cache[key]
+
+        if rebuild:
+            self.build_axes()
+        else:
+            if full_range:
+                self.fit_limits()
+            self.redraw()
+
+    def data_range(self):
+        """全項目を合わせた測定日時の範囲（データがなければNone）"""
+        ranges = [(x[0], x[-1]) for x, _ in self.series.values() if len(x)]
+        if not ranges:
+            return None
+        return min(start for start, _ in ranges), max(end for _, end in ranges)
+
+    def at_full_range(self):
+        """表示範囲がデータ全体のままか（初回表示も含む）"""
+        data_range = self.data_range()
+        if not self.axes or data_range is None:
+            return True
+        x_min, x_max = next(iter(self.axes.values())).get_xlim()
+        tolerance = (data_range[1] - data_range[0]) * 1e-3 + 1e-9
+        return abs(x_min - data_range[0]) <= tolerance and abs(x_max - data_range[1]) <= tolerance
+
+    def fit_limits(self):
+        """データ全体が収まるよう表示範囲を設定"""
+        data_range = self.data_range()
+        for name, ax in self.axes.items():
+            x, y = self.series[name]
+            if len(x):
+                ax.set_xlim(*data_range)
+                ax.set_ylim(y.min() - 0.5, y.max() + 0.5)
+
+    def build_axes(self):
+        import matplotlib.dates as mdates
+
+        self.figure.clear()
+        self.axes = {}
+        self.lines = {}
+
+        shared = None
+        for i, name in enumerate(self.series):
+            ax = self.figure.add_subplot(len(self.series), 1, i + 1, sharex=shared)
+            shared = shared or ax
+            info = tag_info_by_name(name)
+            ax.set_ylabel(f"{name} ({info['unit']})" if info['unit'] else name)
+            ax.grid(True, alpha=0.3)
+            self.lines[name], = ax.plot([], [], linewidth=1)
+            self.axes[name] = ax
+        self.fit_limits()
+
+        if shared is not None:
+            shared.xaxis.set_major_formatter(mdates.DateFormatter('%Y-%m'))
+            shared.callbacks.connect('xlim_changed', lambda ax: self.after_idle(self.redraw))
+        self.figure.tight_layout()
+        self.redraw()
+
+    def redraw(self):
+        """現在の表示範囲に合わせて間引いた点で線を更新"""
+        if self.redrawing or not self.axes:
+            return
+        self.redrawing = True
+        try:
+            with tracing.span('chart_redraw') as span:
+                width = max(100, self.canvas.get_tk_widget().winfo_width())
+                threshold = int(width * POINTS_PER_PIXEL)
+
+                points = 0
+                for name, line in self.lines.items():
+                    x, y = self.series[name]
+                    x_min, x_max = self.axes[name].get_xlim()
+                    indices = self.downsample(name, x, y, x_min, x_max, threshold)
+                    line.set_data(x[indices], y[indices])
+                    points += len(indices)
+
+                self.canvas.draw_idle()
+                span.set(rows=points)
+        finally:
+            self.redrawing = False
+
+    def downsample(self, name, x, y, x_min, x_max, threshold):
+        """表示範囲内の点を間引いたインデックス（範囲ごとにキャッシュ）"""
+        # 範囲の端が少し動いただけで再計算しないよう、範囲幅の1%単位に丸める
+        step = max((x_max - x_min) / 100, 1e-9)
+        key = (name, round(x_min / step), round(x_max / step), threshold)
+        if key in self.cache:
+            return self.cache[key]
+
+        # 範囲外の隣接点も1つずつ含め、線が端で途切れないようにする
+        start = max(0, np.searchsorted(x, x_min) - 1)
+        end = min(len(x), np.searchsorted(x, x_max, side='right') + 1)
+        indices = start + lttb(x[start:end], y[start:end], threshold)
+
+        if len(self.cache) >= MAX_CACHED_LEVELS:
+            self.cache.pop(next(iter(self.cache)))
+        self.cache[key] = indices
+        return indices